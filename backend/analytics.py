@@ -0,0 +1,298 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import itertools
+import numpy as np
+import models
+import fx
+import snapshots
+
+# julianday() of 1970-01-01, converts SQLite julian days to numpy day numbers
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+def _day_numbers(julian_days) -> np.ndarray:
+    """SQLite julianday() floats -> int64 days since 1970-01-01"""
+    return np.rint(np.asarray(julian_days, dtype=np.float64) - UNIX_EPOCH_JULIAN_DAY).astype(np.int64)
+
+def _float_columns(rows, width: int) -> np.ndarray:
+    """Rows of numbers -> (n, width) float array without per-row numpy conversion"""
+    flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.float64, count=len(rows) * width)
+    return flat.reshape(-1, width)
+
+def bucket_days(days: np.ndarray, interval: str) -> np.ndarray:
+    """Map day numbers to the first day of their day/week (Monday)/month bucket"""
+    if interval == "day":
+        return days
+    if interval == "week":
+        # 1970-01-01 was a Thursday, shift so weeks start on Monday
+        return days - (days + 3) % 7
+    if interval == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    raise ValueError(f"Unknown interval: {interval}")
+
+def load_daily(db: Session, user_id: int) -> dict:
+    """
+    Load a user's daily rollup (models.DailyPnl) as columnar arrays.
+    One row per active day, so the cost does not grow with the number of trades.
+    """
+    rows = db.query(
+        func.julianday(models.DailyPnl.date), models.DailyPnl.realized_pl,
+        models.DailyPnl.trade_count, models.DailyPnl.wins, models.DailyPnl.deposits,
+    ).filter(models.DailyPnl.user_id == user_id).order_by(models.DailyPnl.date).all()
+
+    data = _float_columns(rows, 5)
+    return {
+        "days": _day_numbers(data[:, 0]),
+        "realized_pl": data[:, 1],
+        "trades": data[:, 2].astype(np.int64),
+        "wins": data[:, 3].astype(np.int64),
+        "deposits": data[:, 4],
+    }
+
+def rolling_win_rate(trades: np.ndarray, wins: np.ndarray, window: int) -> np.ndarray:
+    """
+    Win rate (%) over the most recent `window` trades as of each row, where rows
+    hold per-period trade/win counts. Whole periods are kept, so the span can
+    hold slightly more than `window` trades.
+    """
+    trades_cum = np.concatenate([[0], np.cumsum(trades)])
+    wins_cum = np.concatenate([[0], np.cumsum(wins)])
+
+    # Latest boundary with at least `window` trades after it
+    start = np.searchsorted(trades_cum, trades_cum[1:] - window, side="right") - 1
+    start = np.maximum(start, 0)
+
+    counted = trades_cum[1:] - trades_cum[start]
+    won = wins_cum[1:] - wins_cum[start]
+    return np.divide(won, counted, out=np.zeros(len(counted)), where=counted > 0) * 100
+
+def equity_curve(daily: dict, interval: str = "day", window: int = 20) -> dict:
+    """
+    Bucket daily realized P&L and deposits by interval and derive cumulative
+    P&L, account value, drawdown and a rolling win rate, all with array ops.
+    """
+    buckets, inverse = np.unique(bucket_days(daily["days"], interval), return_inverse=True)
+    n = len(buckets)
+
+    realized = np.bincount(inverse, weights=daily["realized_pl"], minlength=n)
+    deposited = np.bincount(inverse, weights=daily["deposits"], minlength=n)
+    trade_counts = np.bincount(inverse, weights=daily["trades"], minlength=n).astype(np.int64)
+    win_counts = np.bincount(inverse, weights=daily["wins"], minlength=n).astype(np.int64)
+
+    cumulative_pl = np.cumsum(realized)
+    cumulative_deposits = np.cumsum(deposited)
+    account_value = cumulative_deposits + cumulative_pl
+
+    # Drawdown of cumulative P&L from its running peak (deposits are not gains)
+    peak = np.maximum.accumulate(np.concatenate([[0.0], cumulative_pl]))[1:]
+    drawdown = cumulative_pl - peak
+    peak_value = cumulative_deposits + peak
+    drawdown_pct = np.divide(drawdown, peak_value, out=np.zeros(n), where=peak_value > 0) * 100
+
+    # Days since the last bucket at a peak
+    at_peak = np.where(drawdown >= 0, np.arange(n), 0)
+    drawdown_days = buckets - buckets[np.maximum.accumulate(at_peak)]
+
+    win_rate = rolling_win_rate(trade_counts, win_counts, window)
+
+    dates = buckets.astype("datetime64[D]").tolist()
+    points = [
+        {
+            "date": d, "realized_pl": r, "deposits": dep, "trades": t,
+            "cumulative_pl": cpl, "cumulative_deposits": cdep, "account_value": av,
+            "drawdown": dd, "drawdown_pct": ddp, "drawdown_days": ddd, "win_rate": wr,
+        }
+        for d, r, dep, t, cpl, cdep, av, dd, ddp, ddd, wr in zip(
+            dates, realized.tolist(), deposited.tolist(), trade_counts.tolist(),
+            cumulative_pl.tolist(), cumulative_deposits.tolist(), account_value.tolist(),
+            drawdown.tolist(), drawdown_pct.tolist(), drawdown_days.tolist(), win_rate.tolist(),
+        )
+    ]
+
+    return {
+        "interval": interval,
+        "points": points,
+        "max_drawdown": float(drawdown.min()) if n else 0.0,
+        "max_drawdown_pct": float(drawdown_pct.min()) if n else 0.0,
+        "max_drawdown_days": int(drawdown_days.max()) if n else 0,
+        "current_drawdown": float(drawdown[-1]) if n else 0.0,
+    }
+
+def breakdown(db: Session, user_id: int, period: str = "month", date_from=None, date_to=None) -> list:
+    """Monthly or yearly totals as range sums over the daily rollup"""
+    fmt = "%Y-%m" if period == "month" else "%Y"
+    label = func.strftime(fmt, models.DailyPnl.date)
+    query = db.query(
+        label.label("period"),
+        func.sum(models.DailyPnl.realized_pl).label("realized_pl"),
+        func.sum(models.DailyPnl.deposits).label("deposits"),
+        func.sum(models.DailyPnl.trade_count).label("trades"),
+        func.sum(models.DailyPnl.wins).label("wins"),
+        func.sum(models.DailyPnl.losses).label("losses"),
+    ).filter(models.DailyPnl.user_id == user_id)
+
+    if date_from:
+        query = query.filter(models.DailyPnl.date >= date_from)
+    if date_to:
+        query = query.filter(models.DailyPnl.date <= date_to)
+
+    return [
+        {**row._asdict(), "win_rate": (row.wins / row.trades) * 100 if row.trades else 0}
+        for row in query.group_by(label).order_by(label)
+    ]
+
+# Trading days per year, annualizes daily Sharpe/Sortino ratios
+TRADING_DAYS_PER_YEAR = 252
+
+# Holding period buckets as (label, first day, last day or None)
+HOLDING_BUCKETS = [
+    ("Same day", 0, 0), ("1 day", 1, 1), ("2-5 days", 2, 5),
+    ("6-20 days", 6, 20), ("21-60 days", 21, 60), ("61+ days", 61, None),
+]
+
+def load_risk_trades(db: Session, user_id: int, date_from=None, date_to=None, symbol=None) -> dict:
+    """
+    Select closed trades (optionally by exit date range and symbol) from the
+    user's snapshot as columnar arrays ordered by exit, with P&L in both the
+    trade and base currency and the initial risk (1R) in the trade currency,
+    0 where no stop is set. A date range is a slice of the mapped arrays.
+    """
+    snapshot = snapshots.get(db, user_id)
+    rows = snapshot.exit_range(
+        fx.day_numbers([date_from])[0] if date_from else None,
+        fx.day_numbers([date_to])[0] if date_to else None,
+    )
+    columns = {name: snapshot[name][rows] for name in (
+        "entry_day", "exit_day", "entry_price", "stop_price", "shares", "profit_loss", "currency",
+    )}
+    if symbol:
+        code = snapshot.symbol_code(symbol)
+        mask = snapshot["symbol"][rows] == code if code is not None else np.zeros(rows.stop - rows.start, dtype=bool)
+        columns = {name: values[mask] for name, values in columns.items()}
+
+    exit_days = columns["exit_day"].astype(np.int64)
+    # 1R; a missing stop falls back to the entry price, i.e. no risk
+    entry = columns["entry_price"]
+    stop = np.where(np.isnan(columns["stop_price"]), entry, columns["stop_price"])
+    return {
+        "entry_days": columns["entry_day"].astype(np.int64),
+        "exit_days": exit_days,
+        "native_pl": columns["profit_loss"],
+        "profit_loss": columns["profit_loss"] * fx.coded_factors(
+            db, user_id, columns["currency"], snapshot.currencies, exit_days
+        ),
+        "risk": np.abs(entry - stop) * columns["shares"],
+    }
+
+def streaks(profit_loss: np.ndarray) -> tuple:
+    """(longest win streak, longest loss streak, current streak: + wins / - losses), breakevens end a streak"""
+    if not len(profit_loss):
+        return 0, 0, 0
+    sign = np.sign(profit_loss)
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(sign)) + 1])
+    lengths = np.diff(np.concatenate([starts, [len(sign)]]))
+    values = sign[starts]
+    longest_win = int(lengths[values > 0].max(initial=0))
+    longest_loss = int(lengths[values < 0].max(initial=0))
+    return longest_win, longest_loss, int(lengths[-1] * values[-1])
+
+def daily_returns(exit_days: np.ndarray, profit_loss: np.ndarray, daily: dict) -> np.ndarray:
+    """
+    Realized P&L per weekday from the first to the last exit (quiet days
+    count as 0) over the account value at the start of that day: deposits
+    plus realized P&L of the whole account from the daily rollup. Days with
+    no positive account value are left out.
+    """
+    if not len(exit_days):
+        return np.zeros(0)
+    span = np.arange(exit_days[0], exit_days[-1] + 1)
+    active, pl = np.unique(exit_days, return_inverse=True)
+    pl = np.bincount(pl, weights=profit_loss)
+    # 1970-01-01 was a Thursday, so (day + 3) % 7 is 0 on Mondays; weekend exits are kept
+    span = span[((span + 3) % 7 < 5) | np.isin(span, active)]
+    pnl = np.zeros(len(span))
+    pnl[np.searchsorted(span, active)] = pl
+
+    flows = np.concatenate([[0.0], np.cumsum(daily["deposits"] + daily["realized_pl"])])
+    account = flows[np.searchsorted(daily["days"], span, side="left")]
+    valid = account > 0
+    return pnl[valid] / account[valid]
+
+def _ratio(numerator: float, denominator: float):
+    return float(numerator / denominator) if denominator > 0 else None
+
+def risk_metrics(trades: dict, daily: dict) -> dict:
+    """
+    Expectancy, profit factor, R-multiples, Sharpe/Sortino, streaks and the
+    holding period distribution in one pass of array ops over load_risk_trades.
+    """
+    pl = trades["profit_loss"]
+    n = len(pl)
+    wins, losses = pl > 0, pl < 0
+    gross_profit = float(pl[wins].sum())
+    gross_loss = float(-pl[losses].sum())
+    avg_win = float(pl[wins].mean()) if wins.any() else 0.0
+    avg_loss = float(pl[losses].mean()) if losses.any() else 0.0
+
+    # R-multiples are currency-free: trade-currency P&L over trade-currency risk
+    with_stop = trades["risk"] > 0
+    r = trades["native_pl"][with_stop] / trades["risk"][with_stop]
+
+    returns = daily_returns(trades["exit_days"], pl, daily)
+    enough = len(returns) > 1
+    volatility = float(returns.std(ddof=1)) if enough else 0.0
+    downside = float(np.sqrt(np.mean(np.minimum(returns, 0) ** 2))) if enough else 0.0
+    annualize = np.sqrt(TRADING_DAYS_PER_YEAR)
+    mean_return = float(returns.mean()) if enough else 0.0
+
+    longest_win, longest_loss, current = streaks(pl)
+
+    held = trades["exit_days"] - trades["entry_days"]
+    firsts = np.array([first for _, first, _ in HOLDING_BUCKETS])
+    bucket = np.maximum(np.searchsorted(firsts, held, side="right") - 1, 0)
+    counts = np.bincount(bucket, minlength=len(firsts))
+    bucket_wins = np.bincount(bucket, weights=wins, minlength=len(firsts))
+    bucket_pl = np.bincount(bucket, weights=pl, minlength=len(firsts))
+    percentiles = np.percentile(held, [25, 50, 75, 90]).tolist() if n else [None] * 4
+
+    return {
+        "trades": n,
+        "wins": int(wins.sum()),
+        "losses": int(losses.sum()),
+        "win_rate": float(wins.mean()) * 100 if n else 0.0,
+        "net_pl": float(pl.sum()),
+        "gross_profit": gross_profit,
+        "gross_loss": gross_loss,
+        "expectancy": float(pl.mean()) if n else 0.0,
+        "profit_factor": _ratio(gross_profit, gross_loss),
+        "avg_win": avg_win,
+        "avg_loss": avg_loss,
+        "payoff_ratio": _ratio(avg_win, -avg_loss),
+        "r_multiples": {
+            "trades": len(r),
+            "expectancy": float(r.mean()) if len(r) else None,
+            "median": float(np.median(r)) if len(r) else None,
+            "total": float(r.sum()),
+            "best": float(r.max()) if len(r) else None,
+            "worst": float(r.min()) if len(r) else None,
+        },
+        "sharpe": _ratio(mean_return * annualize, volatility),
+        "sortino": _ratio(mean_return * annualize, downside),
+        "return_days": len(returns),
+        "longest_win_streak": longest_win,
+        "longest_loss_streak": longest_loss,
+        "current_streak": current,
+        "holding": {
+            "mean": float(held.mean()) if n else None,
+            "p25": percentiles[0], "median": percentiles[1], "p75": percentiles[2], "p90": percentiles[3],
+            "max": int(held.max()) if n else None,
+            "buckets": [
+                {
+                    "label": label, "min_days": first, "max_days": last, "trades": int(count),
+                    "win_rate": won / count * 100 if count else 0.0, "avg_pl": total / count if count else 0.0,
+                }
+                for (label, first, last), count, won, total in zip(
+                    HOLDING_BUCKETS, counts.tolist(), bucket_wins.tolist(), bucket_pl.tolist()
+                )
+            ],
+        },
+    }
@@ -1,11 +1,14 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Optional, NamedTuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, route, run
+from passwords import get_pwd_context, verify_password, get_password_hash  # Re-exported for existing callers
+import threading
+import time
 import models
 
 # Secret key for JWT (change this to something random in production!)
@@ -13,19 +16,66 @@ SECRET_KEY = "your-secret-key-change-this-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 
-# Password hashing
-pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
-
 # OAuth2 scheme for token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+# Authenticated principals are cached so most requests skip the user lookup
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL_SECONDS = 300
+
+class CurrentUser(NamedTuple):
+    """The authenticated user as seen by routes (detached from any DB session)"""
+    id: int
+    email: str
+
+class UserCache:
+    """Thread-safe LRU of CurrentUser by user id, with per-entry TTL"""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def put(self, user: CurrentUser):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[user.id] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
 
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache()
+
+def invalidate_user(user_id: int):
+    """Drop a user from the auth cache (call whenever a user changes)"""
+    user_cache.invalidate(user_id)
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.id)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
@@ -35,25 +85,63 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    from jose import jwt  # Deferred to first use, keeps it out of startup
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get the current authenticated user from JWT token"""
-    credentials_exception = HTTPException(
+def create_user_token(user) -> str:
+    """Create an access token carrying the user's id (uid) and email (sub)"""
+    return create_access_token(data={"sub": user.email, "uid": user.id})
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str) -> tuple:
+    """(uid or None for tokens issued before the uid claim, email) of a valid token"""
+    from jose import JWTError, jwt  # Deferred to first use, keeps it out of startup
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.email == email).first()
+        raise credentials_exception()
+    email: str = payload.get("sub")
+    if email is None:
+        raise credentials_exception()
+    return payload.get("uid"), email
+
+def load_user(db: Session, user_id: Optional[int], email: str) -> CurrentUser:
+    """Look a token's user up and cache it"""
+    if user_id is not None:
+        query = db.query(models.User.id, models.User.email).filter(models.User.id == user_id)
+    else:
+        query = db.query(models.User.id, models.User.email).filter(models.User.email == email)
+
+    row = query.first()
+    if row is None:
+        raise credentials_exception()
+
+    user = CurrentUser(id=row.id, email=row.email)
+    user_cache.put(user)
+    return user
+
+def authenticate(token: str, db: Session) -> CurrentUser:
+    """get_current_user for callers holding their own sync session"""
+    user_id, email = decode_token(token)
+    user = user_cache.get(user_id) if user_id is not None else None
+    return user or load_user(db, user_id, email)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)) -> CurrentUser:
+    """Get the current authenticated user from JWT token"""
+    user_id, email = decode_token(token)
+
+    # Fast path: token carries the user id and the principal is cached
+    user = user_cache.get(user_id) if user_id is not None else None
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        user = await run(db, load_user, user_id, email)
+
+    # The route's session (the same get_db dependency) now reads and writes this user's data
+    route(db, user.id)
+    return user
@@ -0,0 +1,290 @@
+"""
+Latency percentiles and throughput for every API endpoint, driven in-process over ASGI.
+
+Run from backend/:
+    python -m benchmarks.api [--users 100] [--trades 100000] [--requests 500] [--concurrency 8]
+    python -m benchmarks.api --db bench.db                  # reuse a benchmarks.synthetic database
+    python -m benchmarks.api --compare bench-abc1234.json   # exit 1 on p95 regressions
+    python -m benchmarks.api --db bench.db --shards user    # per-user shard files (bench.db.shards/)
+    python -m benchmarks.api --db bench.db --async-db       # routes on the asyncio engine (aiosqlite)
+
+Without --db a throwaway synthetic database is generated (never tradetracker.db).
+Requests rotate over the synthetic users, so heavy and light traders are
+both represented. Per-user response caching is off unless --response-cache is
+passed, so reads measure the query and serialization work. Write scenarios run
+last. Results are saved as JSON (--out) for comparison between commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, NamedTuple, Optional
+import numpy as np
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    path: str  # Formatted with the user context ({trade_id}, {symbol})
+    body: Optional[Callable] = None  # (user, i) -> request kwargs
+    max_requests: Optional[int] = None  # Cap for expensive endpoints
+    write: bool = False
+
+def new_trade(user, i: int) -> dict:
+    return {"json": {
+        "symbol": user.symbol, "entry_date": "2025-09-01", "exit_date": "2025-09-05",
+        "entry_price": 100.0, "exit_price": 100.0 + i % 7 - 3, "shares": 10, "brokerage_fee": 6.0,
+    }}
+
+SCENARIOS = [
+    Scenario("auth.me", "GET", "/api/auth/me"),
+    Scenario("trades.page", "GET", "/api/trades/?limit=100"),
+    Scenario("trades.page_1000", "GET", "/api/trades/?limit=1000"),
+    Scenario("trades.by_symbol", "GET", "/api/trades/?symbol={symbol}&status=closed"),
+    Scenario("trades.get", "GET", "/api/trades/{trade_id}"),
+    Scenario("trades.search", "GET", "/api/trades/search?q=stop"),
+    Scenario("trades.search_prefix", "GET", "/api/trades/search?q=ea%20ru"),
+    Scenario("trades.export", "GET", "/api/trades/export?format=ndjson", max_requests=50),
+    Scenario("deposits.list", "GET", "/api/deposits/"),
+    Scenario("stats.summary", "GET", "/api/stats/summary"),
+    Scenario("stats.by_symbol", "GET", "/api/stats/by-symbol"),
+    Scenario("analytics.equity_curve", "GET", "/api/analytics/equity-curve?interval=day"),
+    Scenario("analytics.breakdown", "GET", "/api/analytics/breakdown?period=month"),
+    Scenario("analytics.symbols", "GET", "/api/analytics/symbols?top=5"),
+    Scenario("analytics.risk", "GET", "/api/analytics/risk", max_requests=50),
+    Scenario("analytics.risk_symbol", "GET", "/api/analytics/risk?symbol={symbol}"),
+    Scenario("positions", "GET", "/api/positions/"),
+    Scenario("fills.lots", "GET", "/api/fills/lots"),
+    Scenario("auth.login", "POST", "/api/auth/login", max_requests=50,
+             body=lambda user, i: {"data": {"username": user.email, "password": user.password}}),
+    Scenario("trades.create", "POST", "/api/trades/", body=new_trade, write=True),
+    Scenario("trades.update", "PUT", "/api/trades/{trade_id}", write=True,
+             body=lambda user, i: {"json": {"notes": f"bench {i}"}}),
+    Scenario("deposits.create", "POST", "/api/deposits/", write=True,
+             body=lambda user, i: {"json": {"amount": 100.0, "deposit_date": "2025-09-01"}}),
+]
+
+def load_users(password: str) -> list:
+    """Context for every user with trades: token headers, one of their trades and its symbol, row counts"""
+    from sqlalchemy import func
+    from database import SessionLocal, user_session
+    import auth
+    import models
+
+    with SessionLocal() as directory:
+        accounts = directory.query(models.User.id, models.User.email).order_by(models.User.id).all()
+
+    users = []
+    for user_id, email in accounts:
+        # Per-user sessions, so sharded databases are read from each user's shard
+        with user_session(user_id) as db:
+            first = db.query(models.Trade.id, models.Trade.symbol).filter(
+                models.Trade.user_id == user_id
+            ).order_by(models.Trade.id).first()
+            if first is None:
+                continue
+            trades = db.query(func.count(models.Trade.id)).filter(models.Trade.user_id == user_id).scalar()
+            deposits = db.query(func.count(models.Deposit.id)).filter(models.Deposit.user_id == user_id).scalar()
+        users.append(SimpleNamespace(
+            id=user_id, email=email, password=password, trade_id=first.id, symbol=first.symbol,
+            trades=trades, deposits=deposits,
+            headers={"Authorization": f"Bearer {auth.create_user_token(SimpleNamespace(id=user_id, email=email))}"},
+        ))
+    return users
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3),
+            "mean": round(float(ms.mean()), 3), "max": round(float(ms.max()), 3),
+        },
+    }
+
+async def run_scenario(client, scenario: Scenario, users: list, requests: int, concurrency: int, warmup: int) -> dict:
+    """`requests` calls spread over `concurrency` workers, users in rotation"""
+    if scenario.max_requests is not None:
+        requests = min(requests, scenario.max_requests)
+        warmup = min(warmup, scenario.max_requests // 10)
+
+    def build(i: int):
+        user = users[i % len(users)]
+        kwargs = scenario.body(user, i) if scenario.body else {}
+        return scenario.path.format(trade_id=user.trade_id, symbol=user.symbol), user.headers, kwargs
+
+    for i in range(warmup):
+        path, headers, kwargs = build(i)
+        await client.request(scenario.method, path, headers=headers, **kwargs)
+
+    latencies, errors, failures = [], 0, {}
+    calls = iter(range(warmup, warmup + requests))
+
+    async def worker():
+        nonlocal errors
+        for i in calls:
+            path, headers, kwargs = build(i)
+            start = time.perf_counter()
+            response = await client.request(scenario.method, path, headers=headers, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+                failures.setdefault(response.status_code, response.text[:200])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = summarize(latencies, errors, time.perf_counter() - start)
+    if failures:
+        result["failures"] = {str(status): text for status, text in failures.items()}
+    return result
+
+async def run_all(app, scenarios: list, users: list, args) -> dict:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scenario in scenarios:
+            result = await run_scenario(client, scenario, users, args.requests, args.concurrency, args.warmup)
+            results[scenario.name] = result
+            latency = result["latency_ms"]
+            print(f"  {scenario.name:24} p50 {latency['p50']:8.2f}  p95 {latency['p95']:8.2f}  "
+                  f"p99 {latency['p99']:8.2f} ms  {result['throughput_rps']:8.1f} req/s"
+                  + (f"  {result['errors']} errors" if result["errors"] else ""))
+    return results
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True)
+        return commit.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Print p50/p95/p99 changes per endpoint, returns the endpoints whose p95 regressed"""
+    print(f"vs {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+    regressions = []
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        changes = {
+            p: result["latency_ms"][p] / old["latency_ms"][p] - 1 if old["latency_ms"][p] else 0.0
+            for p in ("p50", "p95", "p99")
+        }
+        regressed = changes["p95"] > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:24} " + "  ".join(f"{p} {c:+7.1%}" for p, c in changes.items())
+              + ("  REGRESSION" if regressed else ""))
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", help="Existing database from benchmarks.synthetic (default: generate one)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--trades", type=int, default=100_000, help="Total trades when generating")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="Scenario names or prefixes (e.g. trades.)")
+    parser.add_argument("--reads-only", action="store_true", help="Skip write scenarios")
+    parser.add_argument("--response-cache", action="store_true", help="Keep the per-user response cache on")
+    parser.add_argument("--shards", metavar="MODE", help='Serve from per-user shards ("user" or a count), split on first use')
+    parser.add_argument("--async-db", action="store_true", help="Serve routes from the asyncio engine (TRADETRACKER_ASYNC_DB)")
+    parser.add_argument("--out", help="Results file (default: bench-<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 slowdown counted as a regression")
+    args = parser.parse_args()
+
+    # The app's engine is bound on import, so point it at the benchmark database first
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["TRADETRACKER_DATABASE_URL"] = f"sqlite:///{path}"
+    if args.shards:
+        # Split into <db>.shards/ on first use
+        os.environ["TRADETRACKER_SHARDS"] = args.shards
+        os.environ["TRADETRACKER_SHARD_DIR"] = path + ".shards"
+    if args.async_db:
+        os.environ["TRADETRACKER_ASYNC_DB"] = "1"
+
+    from benchmarks import synthetic
+    dataset = {"db": args.db}
+    if args.db is None:
+        print(f"generating {args.trades:,} trades for {args.users} users (seed {args.seed})")
+        dataset = synthetic.populate(os.environ["TRADETRACKER_DATABASE_URL"],
+                                     users=args.users, trades=args.trades, seed=args.seed)
+
+    import caching
+    import main
+
+    if args.shards:
+        import shards
+        dataset["shards"] = args.shards
+        if not main.shard_pool.existing():
+            print(f"splitting into shards ({args.shards}) under {main.shard_pool.directory}")
+            shards.split(quiet=True)
+
+    if not args.response_cache:
+        caching.response_cache = caching.ResponseCache(max_bytes=0)
+
+    users = load_users(synthetic.PASSWORD)
+    dataset["rows"] = {
+        "users": len(users),
+        "trades": sum(user.trades for user in users),
+        "deposits": sum(user.deposits for user in users),
+    }
+    if not users:
+        parser.error("The database has no users with trades")
+
+    scenarios = [
+        s for s in SCENARIOS
+        if not (args.reads_only and s.write)
+        and (not args.only or any(s.name == name or s.name.startswith(name) for name in args.only))
+    ]
+    print(f"{len(scenarios)} endpoints x {args.requests} requests, concurrency {args.concurrency}, "
+          f"{dataset['rows']['trades']:,} trades over {len(users)} users")
+    try:
+        results = asyncio.run(run_all(main.app, scenarios, users, args))
+    finally:
+        main.shutdown()
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "response_cache": args.response_cache,
+            "async_db": args.async_db,
+            "dataset": dataset,
+        },
+        "results": results,
+    }
+    out = args.out or f"bench-{commit or 'nocommit'}.json"
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"saved {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,57 @@
+"""
+Requests/sec on GET /api/trades/{id} with and without the auth user cache.
+
+Run from backend/:  python -m benchmarks.auth_cache [--requests 5000]
+Uses a throwaway SQLite database, never tradetracker.db.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault(
+    "TRADETRACKER_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}",
+)
+
+from fastapi.testclient import TestClient
+import auth
+import main
+
+def run(client: TestClient, path: str, headers: dict, requests: int) -> float:
+    """Issue `requests` sequential GETs and return requests/sec"""
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, response.text
+    return requests / (time.perf_counter() - start)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    client = TestClient(main.app)
+    token = client.post("/api/auth/register", json={"email": "bench@test.com", "password": "bench"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    trade = client.post("/api/trades/", headers=headers, json={
+        "symbol": "NVDA", "entry_date": "2025-06-18", "exit_date": "2025-06-26",
+        "entry_price": 145.40, "exit_price": 155.53, "shares": 3.07, "brokerage_fee": 6.0,
+    }).json()
+    path = f"/api/trades/{trade['id']}"
+
+    # Warm up both paths once
+    run(client, path, headers, 100)
+
+    original = auth.user_cache
+    auth.user_cache = auth.UserCache(maxsize=0)
+    uncached = run(client, path, headers, args.requests)
+    auth.user_cache = original
+    cached = run(client, path, headers, args.requests)
+
+    print(f"GET {path} x {args.requests}")
+    print(f"  DB lookup per request: {uncached:8.1f} req/s")
+    print(f"  cached principal:      {cached:8.1f} req/s ({cached / uncached:.2f}x)")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,126 @@
+"""
+Mixed read/write SQLite throughput: default settings vs tuned pragmas vs asyncio engine.
+
+Run from backend/:  python -m benchmarks.db_load [--workers 8] [--seconds 5] [--write-ratio 0.3]
+Each mode gets its own throwaway database file, never tradetracker.db.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from database import Base, create_db_engine, create_async_db_engine
+import models
+
+SYMBOLS = ["NVDA", "AMD", "AMZN", "TSLA", "CRWD", "MU", "PLTR", "INTC"]
+
+def new_trade(user_id: int) -> models.Trade:
+    """A closed trade with random prices"""
+    entry = random.uniform(10, 500)
+    return models.Trade(
+        user_id=user_id, symbol=random.choice(SYMBOLS),
+        entry_date=date(2025, 6, 18), exit_date=date(2025, 6, 26),
+        entry_price=entry, exit_price=entry * random.uniform(0.9, 1.1), shares=10,
+    )
+
+def prepare(url: str, users: int = 10):
+    """Create the schema and a few users in a fresh database"""
+    engine = create_db_engine(url, tuned=False)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [
+            {"email": f"user{i}@bench.test", "hashed_password": "x"} for i in range(1, users + 1)
+        ])
+    engine.dispose()
+
+def run_sync(url: str, tuned: bool, workers: int, seconds: float, write_ratio: float):
+    """Threads sharing one engine, like sync routes on Starlette's threadpool"""
+    engine = create_db_engine(url, tuned=tuned)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        ops = errors = 0
+        while time.perf_counter() < deadline:
+            db = Session()
+            try:
+                user_id = random.randint(1, 10)
+                if random.random() < write_ratio:
+                    db.add(new_trade(user_id))
+                    db.commit()
+                else:
+                    db.query(models.Trade).filter(models.Trade.user_id == user_id).limit(100).all()
+                ops += 1
+            except OperationalError:
+                db.rollback()
+                errors += 1
+            finally:
+                db.close()
+        return ops, errors
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda _: worker(), range(workers)))
+    engine.dispose()
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+async def run_async(url: str, workers: int, seconds: float, write_ratio: float):
+    """Concurrent tasks on one event loop using AsyncSession + aiosqlite"""
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    engine = create_async_db_engine(url)
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        ops = errors = 0
+        while time.perf_counter() < deadline:
+            async with Session() as db:
+                try:
+                    user_id = random.randint(1, 10)
+                    if random.random() < write_ratio:
+                        db.add(new_trade(user_id))
+                        await db.commit()
+                    else:
+                        result = await db.execute(
+                            select(models.Trade).where(models.Trade.user_id == user_id).limit(100)
+                        )
+                        result.scalars().all()
+                    ops += 1
+                except OperationalError:
+                    await db.rollback()
+                    errors += 1
+        return ops, errors
+
+    results = await asyncio.gather(*(worker() for _ in range(workers)))
+    await engine.dispose()
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    modes = {
+        "sync, default settings": lambda url: run_sync(url, False, args.workers, args.seconds, args.write_ratio),
+        "sync, tuned pragmas": lambda url: run_sync(url, True, args.workers, args.seconds, args.write_ratio),
+        "async (aiosqlite), tuned": lambda url: asyncio.run(run_async(url, args.workers, args.seconds, args.write_ratio)),
+    }
+
+    print(f"{args.workers} workers, {args.seconds:g}s each, {args.write_ratio:.0%} writes")
+    for i, (name, run) in enumerate(modes.items()):
+        url = f"sqlite:///{os.path.join(tmp, f'load{i}.db')}"
+        prepare(url)
+        ops, errors = run(url)
+        print(f"  {name:26} {ops / args.seconds:9.1f} ops/s   {errors} lock errors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Fills/sec through the lot engine (lots.LotBook) vs rescanning the lot history per sell.
+
+Run from backend/:  python -m benchmarks.lots [--fills 1000000] [--symbols 100] [--rescan-fills 200000]
+Synthetic fills only, no database involved.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from lots import LotBook, take_lots
+
+class BenchLot:
+    """Minimal buy fill, what LotBook needs from models.Fill"""
+    __slots__ = ("id", "quantity", "price", "fee", "executed_at", "remaining")
+
+    def __init__(self, id, quantity, price, executed_at):
+        self.id, self.quantity, self.price, self.fee = id, quantity, price, 0.0
+        self.executed_at = executed_at
+        self.remaining = quantity
+
+def generate(fills: int, symbols: int, seed: int = 42) -> list:
+    """
+    Random scale-ins and partial exits: ("buy", symbol, lot) or
+    ("sell", symbol, quantity, price), never selling more than is open.
+    """
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    open_quantity = [0.0] * symbols
+    events = []
+    for i in range(fills):
+        symbol = rng.randrange(symbols)
+        price = rng.uniform(10, 500)
+        if open_quantity[symbol] > 1 and rng.random() < 0.45:
+            quantity = open_quantity[symbol] * rng.uniform(0.05, 0.6)
+            open_quantity[symbol] -= quantity
+            events.append(("sell", symbol, quantity, price))
+        else:
+            quantity = float(rng.randint(1, 100))
+            open_quantity[symbol] += quantity
+            events.append(("buy", symbol, BenchLot(i, quantity, price, start + timedelta(minutes=i))))
+    return events
+
+def reset(events):
+    for event in events:
+        if event[0] == "buy":
+            event[2].remaining = event[2].quantity
+
+def run_book(events, symbols: int, method: str) -> float:
+    """Match with one LotBook per symbol, returns realized P&L"""
+    books = [LotBook() for _ in range(symbols)]
+    realized = 0.0
+    for event in events:
+        if event[0] == "buy":
+            books[event[1]].buy(event[2])
+        else:
+            _, symbol, quantity, price = event
+            for lot, taken in books[symbol].sell(quantity, method):
+                realized += (price - lot.price) * taken
+    return realized
+
+def run_rescan(events, symbols: int) -> float:
+    """FIFO by walking every lot ever opened for the symbol on each sell"""
+    history = [[] for _ in range(symbols)]
+    realized = 0.0
+    for event in events:
+        if event[0] == "buy":
+            history[event[1]].append(event[2])
+        else:
+            _, symbol, quantity, price = event
+            open_lots = (lot for lot in history[symbol] if lot.remaining > 0)
+            for lot, taken in take_lots(open_lots, quantity):
+                realized += (price - lot.price) * taken
+    return realized
+
+def timed(label: str, fills: int, run):
+    start = time.perf_counter()
+    realized = run()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:28} {fills / elapsed:12,.0f} fills/s   {elapsed:7.2f}s   realized {realized:,.2f}")
+    return realized
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fills", type=int, default=1_000_000)
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--rescan-fills", type=int, default=200_000, help="Smaller run for the O(n) baseline")
+    args = parser.parse_args()
+
+    events = generate(args.fills, args.symbols)
+    sells = sum(event[0] == "sell" for event in events)
+    print(f"{args.fills:,} fills ({sells:,} sells) over {args.symbols} symbols")
+    for method in ("fifo", "lifo"):
+        reset(events)
+        timed(f"LotBook {method}", args.fills, lambda: run_book(events, args.symbols, method))
+
+    small = generate(args.rescan_fills, args.symbols)
+    print(f"{args.rescan_fills:,} fills, engine vs rescanning history")
+    expected = timed("LotBook fifo", args.rescan_fills, lambda: run_book(small, args.symbols, "fifo"))
+    reset(small)
+    got = timed("rescan fifo", args.rescan_fills, lambda: run_rescan(small, args.symbols))
+    assert abs(expected - got) < 1e-6 * max(1.0, abs(expected)), "engines disagree"
+
+if __name__ == "__main__":
+    main()
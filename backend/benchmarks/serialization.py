@@ -0,0 +1,78 @@
+"""
+Per-row cost of the trade list response: ORM instances + pydantic vs column rows + orjson.
+
+Run from backend/:  python -m benchmarks.serialization [--rows 1000] [--trades 100000] [--note-length 400]
+Uses a throwaway synthetic database (benchmarks.synthetic), never tradetracker.db.
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import List
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from database import create_db_engine
+from routers.trades import TradeResponse, TRADE_FIELDS
+from benchmarks import synthetic
+import models
+
+TradeList = TypeAdapter(List[TradeResponse])
+
+def orm_pydantic(db, user_id: int, rows: int) -> bytes:
+    """The previous get_trades path"""
+    trades = db.query(models.Trade).filter(models.Trade.user_id == user_id).order_by(
+        models.Trade.entry_date.desc(), models.Trade.id.desc()
+    ).limit(rows).all()
+    return TradeList.dump_json(TradeList.validate_python(trades, from_attributes=True))
+
+def column_rows(db, user_id: int, rows: int, names: list) -> bytes:
+    """The current get_trades path (caching.ConditionalGet.respond_rows)"""
+    result = db.query(*(getattr(models.Trade, name) for name in names)).filter(
+        models.Trade.user_id == user_id
+    ).order_by(models.Trade.entry_date.desc(), models.Trade.id.desc()).limit(rows).all()
+    return orjson.dumps([dict(zip(names, row)) for row in result])
+
+def timed(label: str, rows: int, repeat: int, run, baseline=None) -> float:
+    run()  # Warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = run()
+    per_row = (time.perf_counter() - start) / (repeat * rows) * 1e6
+    speedup = f"  {baseline / per_row:5.1f}x" if baseline else ""
+    print(f"  {label:40} {per_row:7.2f} us/row   {len(body) / rows:6.0f} B/row{speedup}")
+    return per_row
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per response (the list endpoint's max page)")
+    parser.add_argument("--trades", type=int, default=100_000)
+    parser.add_argument("--note-length", type=int, default=400, help="Pad existing notes to this many characters")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'serialization.db')}"
+    synthetic.populate(url, users=10, trades=args.trades, quiet=True)
+    engine = create_db_engine(url)
+    with engine.begin() as conn:
+        # Journal-style notes, the unbounded column the list used to always load
+        conn.execute(text("UPDATE trades SET notes = substr(notes || ' ' || :pad, 1, :length) WHERE notes IS NOT NULL"),
+                     {"pad": "lorem ipsum dolor sit amet " * (args.note_length // 27 + 1), "length": args.note_length})
+        user_id = conn.execute(text("SELECT user_id FROM trades GROUP BY user_id ORDER BY count(*) DESC LIMIT 1")).scalar()
+
+    db = sessionmaker(bind=engine, autoflush=False)()
+    lean = [name for name in TRADE_FIELDS if name != "notes"]
+    assert orjson.loads(orm_pydantic(db, user_id, args.rows)) == orjson.loads(column_rows(db, user_id, args.rows, TRADE_FIELDS))
+
+    print(f"{args.rows} trades per response, notes up to {args.note_length} chars, query + serialization")
+    before = timed("ORM + pydantic (previous)", args.rows, args.repeat, lambda: orm_pydantic(db, user_id, args.rows))
+    timed("column rows + orjson", args.rows, args.repeat,
+          lambda: column_rows(db, user_id, args.rows, TRADE_FIELDS), before)
+    timed("column rows + orjson, fields w/o notes", args.rows, args.repeat,
+          lambda: column_rows(db, user_id, args.rows, lean), before)
+    db.close()
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Worker cold start: interpreter + app imports + schema check, in fresh processes.
+
+Run from backend/:  python -m benchmarks.startup [--trades 100000] [--repeat 5]
+Uses a throwaway synthetic database (benchmarks.synthetic), never tradetracker.db.
+The first start migrates the unversioned synthetic database; the rest find it current.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from database import create_db_engine
+from benchmarks import synthetic
+import schema
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child: what `uvicorn main:app` does before serving
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import main
+print(json.dumps({
+    "imports": main.IMPORTS_SECONDS, "schema": main.SCHEMA_SECONDS, "app": time.perf_counter() - start,
+    "deferred": [name for name in ("jose", "passlib") if name in sys.modules],
+}))
+"""
+
+def start_worker(url: str, importtime: bool = False) -> dict:
+    env = dict(os.environ, TRADETRACKER_DATABASE_URL=url)
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - start
+    timings["stderr"] = result.stderr
+    return timings
+
+def heaviest_imports(importtime: str, count: int = 8) -> list:
+    """[(module, cumulative ms)] of main's direct imports, heaviest first"""
+    totals = {}
+    for line in importtime.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match and not match.group(2):
+            if match.group(3) == "main":
+                break
+            totals.clear()  # Interpreter startup (site), not the app
+        elif match and len(match.group(2)) == 2:
+            totals[match.group(3)] = int(match.group(1)) / 1000
+    return sorted(totals.items(), key=lambda item: -item[1])[:count]
+
+def legacy_prepare_seconds(url: str) -> float:
+    """What every start cost before versioning: the reflective baseline on a current database"""
+    engine = create_db_engine(url)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        schema._baseline(conn)
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--trades", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+    synthetic.populate(url, users=10, trades=args.trades, quiet=True)
+    first = start_worker(url)
+    print(f"{args.trades:,} trades, unversioned database")
+    print(f"  first start (migrates to v{schema.SCHEMA_VERSION}) {first['process'] * 1000:8.0f} ms"
+          f"   schema {first['schema'] * 1000:7.0f} ms")
+
+    runs = [start_worker(url) for _ in range(args.repeat)]
+    for key, label in (("process", "process start to app ready"), ("imports", "app imports"), ("schema", "schema check")):
+        print(f"  {label:38} {statistics.median(run[key] for run in runs) * 1000:8.1f} ms median")
+    print(f"  {'reflective prepare (before versioning)':38} {legacy_prepare_seconds(url) * 1000:8.1f} ms")
+    deferred = runs[0]["deferred"]
+    print(f"  jose/passlib imported at startup: {', '.join(deferred) if deferred else 'no (deferred to first use)'}")
+
+    print("heaviest imports (cumulative ms, one run with -X importtime):")
+    for module, ms in heaviest_imports(start_worker(url, importtime=True)["stderr"]):
+        print(f"  {module:38} {ms:8.1f}")
+
+if __name__ == "__main__":
+    main()
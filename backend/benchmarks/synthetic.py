@@ -0,0 +1,186 @@
+"""
+Seeded synthetic users, trades and deposits for benchmarks.
+
+Run from backend/:  python -m benchmarks.synthetic bench.db [--users 100] [--trades 100000] [--seed 42]
+The same seed and sizes always produce the same rows. Aggregates and daily
+rollups are built up front so benchmarks measure the steady state.
+"""
+import argparse
+import math
+import os
+import random
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+from sqlalchemy.orm import sessionmaker
+from database import Base, create_db_engine
+from passwords import get_password_hash
+from routers.trades import calculate_trade_metrics
+import models
+import rollups
+import stats
+
+# Every synthetic user logs in with this password (hashed once)
+PASSWORD = "bench"
+
+# Tickers from the seed data first, so they dominate the Zipf weights
+SEED_SYMBOLS = [
+    "NVDA", "AMD", "TSLA", "PLTR", "SOFI", "AMZN", "MU", "CRWD", "INTC", "AEIS",
+    "META", "AAPL", "MSFT", "GOOGL", "NFLX", "SMCI", "ARM", "AVGO", "COIN", "HOOD",
+]
+
+NOTES = [
+    "", "", "", "Stop hit", "Clean scalp", "set stop loss too tight", "Earnings run-up",
+    "Chased the breakout", "Took profit at resistance", "Held through the gap down",
+    "Sized too big", "Followed the plan",
+]
+
+# Rows per executemany
+INSERT_BATCH_SIZE = 10_000
+
+def symbol_universe(count: int) -> list:
+    """The seed tickers padded with made-up ones, most popular first"""
+    symbols = list(SEED_SYMBOLS[:count])
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    i = 0
+    while len(symbols) < count:
+        n, name = i, ""
+        for _ in range(4):
+            name += letters[n % 26]
+            n //= 26
+        if name not in symbols:
+            symbols.append(name)
+        i += 1
+    return symbols
+
+def zipf_weights(count: int, exponent: float) -> list:
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+def split_counts(rng: random.Random, total: int, users: int) -> list:
+    """Share `total` rows between users with a heavy tail (a few very active traders)"""
+    weights = [rng.paretovariate(1.5) for _ in range(users)]
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    for i in range(total - sum(counts)):
+        counts[i % users] += 1
+    return counts
+
+class Generator:
+    """Deterministic trade/deposit rows for one seed"""
+
+    def __init__(self, seed: int = 42, symbols: int = 500, open_ratio: float = 0.1,
+                 end: date = date(2025, 10, 1), years: int = 3):
+        self.rng = random.Random(seed)
+        # Separate stream, so adding stops left every other column unchanged for a seed
+        self.stop_rng = random.Random(seed + 1)
+        self.symbols = symbol_universe(symbols)
+        self.weights = zipf_weights(symbols, 1.1)
+        self.base_prices = {symbol: math.exp(self.rng.uniform(math.log(5), math.log(800))) for symbol in self.symbols}
+        self.open_ratio = open_ratio
+        self.end = end
+        self.days = years * 365
+
+    def trade(self, user_id: int) -> dict:
+        rng = self.rng
+        symbol = rng.choices(self.symbols, self.weights)[0]
+        entry_date = self.end - timedelta(days=rng.randrange(self.days))
+        entry_price = round(self.base_prices[symbol] * math.exp(rng.gauss(0, 0.25)), 2)
+        trade = SimpleNamespace(
+            user_id=user_id,
+            symbol=symbol,
+            entry_date=entry_date,
+            exit_date=None,
+            entry_price=entry_price,
+            exit_price=None,
+            shares=round(rng.uniform(100, 5000) / entry_price, 4),
+            stop_price=round(entry_price * (1 - self.stop_rng.uniform(0.02, 0.12)), 2) if self.stop_rng.random() < 0.7 else None,
+            notes=rng.choice(NOTES) or None,
+            brokerage_fee=6.0 if rng.random() < 0.8 else 0.0,
+            currency="USD",
+        )
+        # Recent entries are the ones still open
+        if entry_date < self.end - timedelta(days=30) or rng.random() >= self.open_ratio:
+            holding = min(int(rng.expovariate(1 / 8)), (self.end - entry_date).days)
+            trade.exit_date = entry_date + timedelta(days=holding)
+            trade.exit_price = round(entry_price * math.exp(rng.gauss(0.002, 0.06)), 2)
+        calculate_trade_metrics(trade)
+        return vars(trade)
+
+    def deposit(self, user_id: int) -> dict:
+        rng = self.rng
+        return {
+            "user_id": user_id,
+            "amount": round(rng.choice([500, 641.31, 1000, 2000, 5000]) * rng.uniform(0.95, 1.05), 2),
+            "currency": "USD",
+            "deposit_date": self.end - timedelta(days=rng.randrange(self.days)),
+            "notes": rng.choice([None, "1000 AUD converted", "Monthly top-up"]),
+        }
+
+def populate(url: str, users: int = 100, trades: int = 100_000, deposits_per_user: int = 12,
+             seed: int = 42, symbols: int = 500, open_ratio: float = 0.1, quiet: bool = False) -> dict:
+    """Create the schema at `url` and fill it, returns what was written"""
+    log = (lambda *args, **kwargs: None) if quiet else print
+    engine = create_db_engine(url)
+    Base.metadata.create_all(bind=engine)
+    gen = Generator(seed=seed, symbols=symbols, open_ratio=open_ratio)
+    start = time.perf_counter()
+
+    hashed = get_password_hash(PASSWORD)
+    with engine.begin() as conn:
+        user_ids = conn.execute(
+            models.User.__table__.insert().returning(models.User.id, sort_by_parameter_order=True),
+            [{"email": f"user{i}@bench.test", "hashed_password": hashed} for i in range(1, users + 1)]
+        ).scalars().all()
+
+    trade_table, deposit_table = models.Trade.__table__, models.Deposit.__table__
+    batch, written = [], 0
+    with engine.begin() as conn:
+        for user_id, count in zip(user_ids, split_counts(gen.rng, trades, users)):
+            for _ in range(count):
+                batch.append(gen.trade(user_id))
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    conn.execute(trade_table.insert(), batch)
+                    written += len(batch)
+                    batch.clear()
+                    log(f"  {written:,} trades", end="\r")
+        if batch:
+            conn.execute(trade_table.insert(), batch)
+        conn.execute(deposit_table.insert(), [
+            gen.deposit(user_id) for user_id in user_ids for _ in range(deposits_per_user)
+        ])
+    log(f"  {trades:,} trades, {users * deposits_per_user:,} deposits in {time.perf_counter() - start:.1f}s")
+
+    Session = sessionmaker(bind=engine, autoflush=False)
+    db = Session()
+    try:
+        for user_id in user_ids:
+            stats.rebuild_user_stats(db, user_id)
+            rollups.rebuild_user(db, user_id)
+        db.commit()
+    finally:
+        db.close()
+    engine.dispose()
+    log(f"  aggregates built, {time.perf_counter() - start:.1f}s total")
+
+    return {"users": users, "trades": trades, "deposits": users * deposits_per_user,
+            "seed": seed, "symbols": symbols, "open_ratio": open_ratio}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="SQLite file to create (must not exist)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--trades", type=int, default=100_000, help="Total trades across all users")
+    parser.add_argument("--deposits-per-user", type=int, default=12)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--open-ratio", type=float, default=0.1, help="Share of the last 30 days' trades left open")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+
+    populate(f"sqlite:///{args.path}", users=args.users, trades=args.trades,
+             deposits_per_user=args.deposits_per_user, seed=args.seed,
+             symbols=args.symbols, open_ratio=args.open_ratio)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+import hashlib
+import orjson
+import threading
+import models
+
+# Byte budget for cached response bodies across all users
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Browsers keep the body but must revalidate with If-None-Match every time
+CACHE_CONTROL = "private, no-cache"
+
+def bump(db: Session, user_id: int, *collections: str):
+    """Increment a user's version counters ("trades", "deposits") in the current transaction"""
+    table = models.DataVersion.__table__
+    stmt = insert(table).values(user_id=user_id, **{col: 1 for col in collections})
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={col: table.c[col] + 1 for col in collections},
+    )
+    db.execute(stmt)
+
+def get_versions(db: Session, user_id: int) -> tuple:
+    """(trades, deposits) version counters for a user"""
+    row = db.query(models.DataVersion.trades, models.DataVersion.deposits).filter(
+        models.DataVersion.user_id == user_id
+    ).first()
+    return tuple(row) if row else (0, 0)
+
+class ResponseCache:
+    """Thread-safe LRU of serialized response bodies, bounded by total bytes"""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag: str, body: bytes, headers: dict):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[key] = (etag, body, headers)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+response_cache = ResponseCache()
+
+class ConditionalGet:
+    """
+    ETag handling for a per-user GET endpoint.
+    `hit` is a ready 304 or cached 200 response when nothing changed;
+    otherwise build the data and return `respond(adapter, data)`.
+    The versions are read again once the data is built: if a change was
+    committed in between (a route's own commit ends its transaction, and
+    SQLite reads outside one see every commit), the data may not match the
+    ETag, so it is returned untagged and not cached.
+    """
+
+    def __init__(self, request: Request, db: Session, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.versions = get_versions(db, user_id)
+        self.key = (user_id, request.url.path, request.url.query)
+        raw = f"{self.key}|{self.versions}".encode()
+        self.etag = f'"{hashlib.sha1(raw).hexdigest()}"'
+        self.hit = self._lookup(request)
+
+    def _lookup(self, request: Request) -> Optional[Response]:
+        if_none_match = request.headers.get("if-none-match", "")
+        if self.etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers={"ETag": self.etag, "Cache-Control": CACHE_CONTROL})
+
+        entry = response_cache.get(self.key)
+        if entry is not None and entry[0] == self.etag:
+            return self._response(entry[1], entry[2])
+        return None
+
+    def _response(self, body: bytes, headers: dict) -> Response:
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"ETag": self.etag, "Cache-Control": CACHE_CONTROL, **headers},
+        )
+
+    def respond(self, adapter, data, headers: Optional[dict] = None) -> Response:
+        """Validate/serialize `data` with a pydantic TypeAdapter, cache and return it"""
+        return self._store(adapter.dump_json(adapter.validate_python(data, from_attributes=True)), headers or {})
+
+    def respond_rows(self, columns: list, rows, headers: Optional[dict] = None) -> Response:
+        """
+        Serialize column-only query rows as a JSON array of {column: value},
+        cache and return it. Rows may carry extra trailing columns, which are
+        left out. Skips model validation, so the query must already select
+        the response schema's columns and types.
+        """
+        return self._store(orjson.dumps([dict(zip(columns, row)) for row in rows]), headers or {})
+
+    def _store(self, body: bytes, headers: dict) -> Response:
+        if get_versions(self.db, self.user_id) != self.versions:
+            return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-store", **headers})
+        response_cache.put(self.key, self.etag, body, headers)
+        return self._response(body, headers)
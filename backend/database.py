@@ -1,26 +1,240 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.util import find_tables
+from starlette.concurrency import run_in_threadpool
+from collections import OrderedDict
+import os
+import threading
+import metrics
 
-# SQLite database file
-SQLALCHEMY_DATABASE_URL = "sqlite:///./tradetracker.db"
+# SQLite database file (override with TRADETRACKER_DATABASE_URL, e.g. for benchmarks)
+SQLALCHEMY_DATABASE_URL = os.getenv("TRADETRACKER_DATABASE_URL", "sqlite:///./tradetracker.db")
+
+# Serve route sessions from an asyncio engine (AsyncSession + aiosqlite) instead of
+# sync sessions on the threadpool. Background jobs and CLIs always use the sync engine.
+ASYNC_DB = os.getenv("TRADETRACKER_ASYNC_DB", "").lower() in ("1", "true", "yes")
+
+# Optional per-user storage: "user" (one SQLite file per user) or a shard count
+# (user_id % N picks the file). Unset keeps every user in the main database.
+SHARDS = os.getenv("TRADETRACKER_SHARDS", "").strip().lower()
+SHARD_DIR = os.getenv("TRADETRACKER_SHARD_DIR", "./shards")
+
+# Shard engines kept open; the least recently used one is disposed beyond this
+SHARD_ENGINES = int(os.getenv("TRADETRACKER_SHARD_ENGINES", "64"))
+
+# Tables shared by all users, kept in the main (directory) database when sharded
+DIRECTORY_TABLES = {"users", "fx_rates"}
+
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",  # Readers no longer block the writer (or vice versa)
+    "synchronous": "NORMAL",  # Safe with WAL, fsync at checkpoints instead of every commit
+    "busy_timeout": 5000,  # Wait up to 5s for the write lock instead of "database is locked"
+    "cache_size": -64000,  # 64 MB page cache per connection
+    "mmap_size": 268435456,  # Read through a 256 MB memory map instead of read() calls
+}
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Connection event hook applying SQLITE_PRAGMAS"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def create_db_engine(url: str, tuned: bool = True):
+    """Create a sync engine; SQLite connections get SQLITE_PRAGMAS unless tuned=False"""
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False} if url.startswith("sqlite") else {}  # Needed for SQLite
+    )
+    if tuned and engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    metrics.instrument_engine(engine)
+    return engine
+
+def create_async_db_engine(url: str, tuned: bool = True, **kwargs):
+    """Create an asyncio engine, using aiosqlite for SQLite URLs, with the same pragmas and instrumentation"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    if url.startswith("sqlite://"):
+        url = url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    engine = create_async_engine(url, **kwargs)
+    if tuned and engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    metrics.instrument_engine(engine.sync_engine)
+    return engine
+
+class ShardPool:
+    """
+    LRU-bounded engines for the shard files. A shard's schema is created or
+    upgraded (schema.prepare) the first time this process opens it.
+    """
+
+    def __init__(self, mode: str, directory: str, max_engines: int = SHARD_ENGINES):
+        if mode != "user" and not (mode.isdigit() and int(mode) > 0):
+            raise ValueError(f'TRADETRACKER_SHARDS must be "user" or a positive shard count, got {mode!r}')
+        self.mode = mode
+        self.directory = directory
+        self.max_engines = max_engines
+        self._engines = OrderedDict()
+        self._async_engines = OrderedDict()
+        self._prepared = set()
+        self._lock = threading.Lock()
+
+    def shard_name(self, user_id: int) -> str:
+        if self.mode == "user":
+            return f"user-{user_id}"
+        return f"shard-{user_id % int(self.mode):03d}"
+
+    def path(self, user_id: int) -> str:
+        return os.path.join(self.directory, self.shard_name(user_id) + ".db")
+
+    def existing(self) -> list:
+        """Paths of the shard files created so far"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.endswith(".db") and name.startswith(("user-", "shard-"))
+        )
+
+    def engine(self, user_id: int):
+        """The shard engine for a user, opening (and preparing) it if needed"""
+        return self.open(self.path(user_id))
+
+    def open(self, path: str):
+        with self._lock:
+            engine = self._engines.get(path)
+            if engine is not None:
+                self._engines.move_to_end(path)
+                return engine
+
+            os.makedirs(self.directory, exist_ok=True)
+            engine = create_db_engine(f"sqlite:///{path}")
+            if path not in self._prepared:
+                import schema
+                schema.prepare(engine)
+                self._prepared.add(path)
+            self._engines[path] = engine
+            while len(self._engines) > self.max_engines:
+                # Sessions still holding the evicted engine keep working, its idle connections close
+                _, evicted = self._engines.popitem(last=False)
+                evicted.dispose()
+            return engine
+
+    def async_engine(self, user_id: int):
+        """
+        The asyncio engine for a user's shard. These use NullPool, so evicting
+        one leaves no pooled aiosqlite connections (and their threads) to close.
+        """
+        path = self.path(user_id)
+        with self._lock:
+            engine = self._async_engines.get(path)
+            if engine is not None:
+                self._async_engines.move_to_end(path)
+                return engine
+
+        self.open(path)  # Creates and migrates the file through a sync engine
+        with self._lock:
+            engine = self._async_engines.get(path)
+            if engine is None:
+                engine = self._async_engines[path] = create_async_db_engine(f"sqlite:///{path}", poolclass=NullPool)
+            self._async_engines.move_to_end(path)
+            while len(self._async_engines) > self.max_engines:
+                self._async_engines.popitem(last=False)
+            return engine
+
+    @property
+    def open_engines(self) -> int:
+        return len(self._engines) + len(self._async_engines)
+
+    def dispose(self):
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+            self._async_engines.clear()
+
+def _directory_statement(mapper, clause) -> bool:
+    if mapper is not None:
+        return mapper.local_table.name in DIRECTORY_TABLES
+    if clause is not None:
+        return any(table.name in DIRECTORY_TABLES for table in find_tables(clause, include_crud=True))
+    return False
+
+class ShardedSession(Session):
+    """
+    Sends directory tables (users, FX rates) to the main database and
+    everything else to the shard of the user set by route(). Before route()
+    everything goes to the main database (login, registration).
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        shard = self.info.get("shard")
+        if shard is None or _directory_statement(mapper, clause):
+            return self.bind  # The main engine (its sync_engine under an AsyncSession)
+        return shard
 
 # Create engine
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}  # Needed for SQLite
-)
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 
 # Session for database queries
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+shard_pool = ShardPool(SHARDS, SHARD_DIR) if SHARDS else None
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, class_=ShardedSession if shard_pool else Session
+)
+
+# Optional asyncio engine/session for routes (TRADETRACKER_ASYNC_DB=1, requires aiosqlite)
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    async_engine = create_async_db_engine(SQLALCHEMY_DATABASE_URL)
+    # Responses are serialized after run() returns, outside the greenlet that could lazy-load
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False,
+        sync_session_class=ShardedSession if shard_pool else Session,
+    )
+
+def route(db, user_id: int):
+    """Point a session (sync or a route's AsyncSession) at a user's shard (no-op unless TRADETRACKER_SHARDS is set)"""
+    if shard_pool is not None:
+        if AsyncSessionLocal is not None and not isinstance(db, Session):
+            db.info["shard"] = shard_pool.async_engine(user_id).sync_engine
+        else:
+            db.info["shard"] = shard_pool.engine(user_id)
+
+def user_session(user_id: int) -> Session:
+    """New session routed to a user's data, for work outside request dependencies"""
+    db = SessionLocal()
+    route(db, user_id)
+    return db
 
 # Base class for models
 Base = declarative_base()
 
-# Dependency to get database session
-def get_db():
+# Dependency to get a route's database session: an AsyncSession with
+# TRADETRACKER_ASYNC_DB, otherwise a sync session. Routes hand it to run().
+async def get_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await run_in_threadpool(db.close)
+
+async def run(db, func, *args, **kwargs):
+    """
+    Run func(session, *args, **kwargs), plain sync ORM code, for an async
+    route: through AsyncSession.run_sync on the asyncio engine, so its queries
+    are awaited on the event loop, or in the threadpool with a sync session.
+    """
+    if isinstance(db, Session):
+        return await run_in_threadpool(func, db, *args, **kwargs)
+    return await db.run_sync(func, *args, **kwargs)
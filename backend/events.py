@@ -0,0 +1,114 @@
+"""
+Per-user change events for the live dashboard (GET /api/events, SSE).
+
+Routes publish small events after they commit; every open stream holds a
+bounded asyncio.Queue on the process-wide EventHub. An idle stream is one
+suspended coroutine and a queue, so one worker holds thousands of them. A
+stream that falls EVENT_QUEUE_SIZE events behind has its backlog replaced
+by a single "resync" event, and the client refetches instead.
+
+Events only reach streams connected to the worker that published them, so
+run a single worker when clients rely on the stream.
+"""
+from sqlalchemy.orm import Session
+from typing import Optional
+import asyncio
+import json
+import stats
+
+# Undelivered events per stream before it is told to resync
+EVENT_QUEUE_SIZE = 100
+
+# Comment line sent on idle streams so proxies keep them open
+HEARTBEAT_SECONDS = 15
+
+# Client reconnect delay sent with the first message
+RETRY_MILLISECONDS = 5000
+
+class EventHub:
+    """In-process pub/sub: user id -> the queues of that user's open streams"""
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = {}  # user_id -> set of asyncio.Queue
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Open a stream's queue (call on the event loop)"""
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self._subscribers
+
+    @property
+    def connections(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, user_id: int, event_type: str, data=None):
+        """Send an event to every open stream of a user. Safe to call from sync routes' threads"""
+        loop = self._loop
+        if loop is None or user_id not in self._subscribers:
+            return
+        event = {"type": event_type, "data": data}
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(user_id, event)
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, user_id, event)
+        except RuntimeError:
+            pass  # Loop already closed, nobody is listening
+
+    def _deliver(self, user_id: int, event: dict):
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind to catch up event by event
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync", "data": None})
+
+hub = EventHub()
+
+def publish_change(db: Session, user_id: int, event_type: str, data=None):
+    """
+    Publish a committed change followed by the user's new summary. Skipped
+    entirely (no summary query) when the user has no open stream.
+    """
+    if not hub.has_subscribers(user_id):
+        return
+    hub.publish(user_id, event_type, data)
+    hub.publish(user_id, "summary", stats.summary(stats.get_user_stats(db, user_id)))
+
+def format_event(event: dict) -> str:
+    """One SSE message"""
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+async def stream(user_id: int, heartbeat: float = HEARTBEAT_SECONDS):
+    """SSE body for one connection, unsubscribes when the client goes away"""
+    queue = hub.subscribe(user_id)
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        hub.unsubscribe(user_id, queue)
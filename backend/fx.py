@@ -0,0 +1,195 @@
+"""
+Conversion of trade and deposit amounts to each user's base currency.
+
+There is no live FX service: rates come from a local file and are stored in
+models.FxRate as the USD value of one unit of a currency (USD itself needs no
+rows). A rate applies from its date until the next one, and the earliest rate
+also covers older dates. Load or refresh them from backend/:
+
+    python -m fx load rates.csv      # date,currency,rate
+    python -m fx load rates.ndjson   # {"date": ..., "currency": ..., "rate": ...}
+
+Aggregates and the daily rollup hold base-currency amounts converted at the
+realization/deposit date, so loading rates rebuilds them for every user.
+Amounts are converted in exactly these places: stats (aggregate deltas and
+rebuilds), rollups (daily rows), the export ledger's running P&L, open
+positions, and the risk metrics' snapshot P&L. Every other analytics read
+is served from the aggregates or the rollup.
+"""
+from datetime import date, datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+import argparse
+import csv
+import json
+import threading
+import numpy as np
+import models
+
+# Currency the rates are quoted in
+PIVOT_CURRENCY = "USD"
+
+# Rows per executemany when loading a rates file
+LOAD_BATCH_SIZE = 1000
+
+class FxError(ValueError):
+    """No rate available for a conversion"""
+
+def day_numbers(dates) -> np.ndarray:
+    """date objects (or day numbers) -> int64 days since 1970-01-01, the analytics day scale"""
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+class RateTable:
+    """Sorted day numbers and USD rates per currency, looked up by binary search"""
+
+    def __init__(self, rows):
+        grouped = {}
+        for currency, day, rate in rows:
+            days, rates = grouped.setdefault(currency, ([], []))
+            days.append(day)
+            rates.append(rate)
+        self._series = {
+            currency: (day_numbers(days), np.array(rates, dtype=np.float64))
+            for currency, (days, rates) in grouped.items()
+        }
+
+    def has(self, currency: str) -> bool:
+        return currency == PIVOT_CURRENCY or currency in self._series
+
+    def usd_rates(self, currency: str, days: np.ndarray) -> np.ndarray:
+        """USD value of one unit of `currency` on each day"""
+        if currency == PIVOT_CURRENCY:
+            return np.ones(len(days))
+        series = self._series.get(currency)
+        if series is None:
+            raise FxError(f"No FX rates loaded for {currency}")
+        series_days, rates = series
+        index = np.searchsorted(series_days, days, side="right") - 1
+        return rates[np.maximum(index, 0)]
+
+    def factors(self, currencies, days: np.ndarray, base: str) -> np.ndarray:
+        """Multipliers converting amounts in `currencies` on `days` to `base`"""
+        currencies = np.asarray(currencies, dtype=object)
+        factors = np.ones(len(currencies))
+        foreign = currencies != base
+        if foreign.any():
+            for currency in set(currencies[foreign].tolist()):
+                mask = currencies == currency
+                factors[mask] = self.usd_rates(currency, days[mask])
+            factors[foreign] /= self.usd_rates(base, days[foreign])
+        return factors
+
+_cache_lock = threading.Lock()
+_cache = {"loaded_at": None, "table": None}
+
+def rate_table(db: Session) -> RateTable:
+    """The rates as a RateTable, rebuilt only when fx_rates has been reloaded"""
+    loaded_at = db.query(func.max(models.FxRate.loaded_at)).scalar()
+    with _cache_lock:
+        if _cache["table"] is not None and _cache["loaded_at"] == loaded_at:
+            return _cache["table"]
+
+    rows = db.query(models.FxRate.currency, models.FxRate.date, models.FxRate.rate).order_by(
+        models.FxRate.currency, models.FxRate.date
+    ).all()
+    table = RateTable(rows)
+    with _cache_lock:
+        _cache.update(loaded_at=loaded_at, table=table)
+    return table
+
+def base_currency(db: Session, user_id: int) -> str:
+    """A user's base currency"""
+    return db.query(models.User.base_currency).filter(models.User.id == user_id).scalar() or PIVOT_CURRENCY
+
+def factors(db: Session, user_id: int, currencies, dates) -> np.ndarray:
+    """
+    Multipliers converting amounts (in `currencies`, on `dates`) to the user's
+    base currency. Single-currency users never touch the rates table.
+    """
+    currencies = list(currencies)
+    base = base_currency(db, user_id)
+    if all(currency == base for currency in currencies):
+        return np.ones(len(currencies))
+    return rate_table(db).factors(currencies, day_numbers(dates), base)
+
+def coded_factors(db: Session, user_id: int, codes: np.ndarray, currencies: list, days: np.ndarray) -> np.ndarray:
+    """factors() for dictionary-encoded currencies (`currencies[code]`), checking each distinct currency once"""
+    base = base_currency(db, user_id)
+    if all(currency == base for currency in currencies):
+        return np.ones(len(codes))
+    return rate_table(db).factors(np.asarray(currencies, dtype=object)[codes], days, base)
+
+def parse_rates(path: str):
+    """Yield (currency, date, rate) from a CSV or NDJSON rates file"""
+    with open(path, newline="") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+        for record in records:
+            rate = float(record["rate"])
+            if rate <= 0:
+                raise ValueError(f"Rate must be positive: {record}")
+            yield record["currency"].strip().upper(), date.fromisoformat(record["date"].strip()), rate
+
+def load_rates(db: Session, path: str) -> int:
+    """Upsert the rates from a file, returns the number of rows read"""
+    table = models.FxRate.__table__
+    loaded_at = datetime.utcnow()
+    count, batch = 0, []
+
+    def flush_batch():
+        stmt = insert(table)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["currency", "date"],
+            set_={"rate": stmt.excluded.rate, "loaded_at": stmt.excluded.loaded_at},
+        ), batch)
+        batch.clear()
+
+    for currency, day, rate in parse_rates(path):
+        batch.append({"currency": currency, "date": day, "rate": rate, "loaded_at": loaded_at})
+        count += 1
+        if len(batch) >= LOAD_BATCH_SIZE:
+            flush_batch()
+    if batch:
+        flush_batch()
+    return count
+
+def main():
+    from database import SessionLocal, user_session
+    import caching
+    import rollups
+    import stats
+
+    parser = argparse.ArgumentParser(description="Load FX rates and rebuild base-currency aggregates")
+    parser.add_argument("command", choices=["load"])
+    parser.add_argument("path", help="CSV (date,currency,rate) or NDJSON file")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        count = load_rates(db, args.path)
+        db.commit()
+        print(f"loaded {count} rates")
+
+        user_ids = [user_id for (user_id,) in db.query(models.User.id).all()]
+    finally:
+        db.close()
+
+    for user_id in user_ids:
+        user_db = user_session(user_id)
+        try:
+            stats.rebuild_user_stats(user_db, user_id)
+            rollups.rebuild_user(user_db, user_id)
+            # Cached analytics are keyed on the data versions
+            caching.bump(user_db, user_id, "trades", "deposits")
+            user_db.commit()
+        except ValueError as e:  # FxError, raised from the imported (non-__main__) module
+            user_db.rollback()
+            print(f"user {user_id}: not rebuilt, {e}")
+        finally:
+            user_db.close()
+
+if __name__ == "__main__":
+    main()
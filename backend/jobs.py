@@ -0,0 +1,471 @@
+"""
+Background jobs for work too heavy for a request: CSV imports, recalculating
+every trade's metrics, and ledger exports (POST /api/jobs/*, polled through
+GET /api/jobs/{id}).
+
+A job is a row in the user's own database (their shard when sharded). Its
+work runs on a small thread pool in chunks of CHUNK_ROWS (one symbol for a
+fills import), and each chunk commits together with the job's progress and
+checkpoint, so the write lock is only held for one chunk at a time and a job
+interrupted by a restart resumes after its last committed chunk (exports
+start their file again). Cancellation and shutdown are checked between
+chunks, and each user can only have MAX_ACTIVE_JOBS_PER_USER jobs queued or
+running.
+
+A runner claims a job with a single UPDATE (queued, or running with a
+heartbeat older than JOB_STALE_SECONDS, to this runner), so a job submitted
+twice or seen by several starting workers runs once. Every checkpoint renews
+the heartbeat while the job is still this runner's, and a runner that lost
+its job to another stops without writing. Starting workers submit the
+claimable jobs of every database (resume()) and watch the ones another
+runner is still heartbeating until they finish or go stale.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import islice
+from sqlalchemy import and_, bindparam, func, literal, or_, select, update
+from sqlalchemy.orm import Session
+from types import SimpleNamespace
+from fastapi import HTTPException
+import contextlib
+import csv
+import json
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+from database import engine, shard_pool, user_session
+import models
+import stats
+import rollups
+import caching
+import events
+
+# Threads running jobs, shared by every user
+JOB_WORKERS = int(os.getenv("TRADETRACKER_JOB_WORKERS", "2"))
+
+# Jobs a user can have queued or running at once, more are refused (429)
+MAX_ACTIVE_JOBS_PER_USER = int(os.getenv("TRADETRACKER_JOB_LIMIT", "2"))
+
+# Uploaded CSVs waiting to be imported and finished exports
+JOB_DIR = os.getenv("TRADETRACKER_JOB_DIR", "./jobs")
+
+# Rows per committed work unit (one write transaction); no more than
+# imports.BATCH_SIZE, so an import chunk is validated before it takes the write lock
+CHUNK_ROWS = 1000
+
+# Pause after each work unit, as a fraction of the time it took: request
+# threads get the GIL and the write lock (a waiting SQLite writer polls with
+# growing sleeps, so a short gap is usually missed)
+CHUNK_PAUSE_RATIO = 0.5
+
+# A running job not checkpointed for this long is presumed orphaned (its worker
+# died) and may be claimed by another; keep it well above one chunk's time
+JOB_STALE_SECONDS = int(os.getenv("TRADETRACKER_JOB_STALE_SECONDS", "120"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Trade columns a recalculate job rewrites (calculate_trade_metrics and the fee)
+RECALCULATED_COLUMNS = ("brokerage_fee", "total_cost", "profit_loss", "profit_loss_percent")
+
+log = logging.getLogger("tradetracker.jobs")
+
+class JobCancelled(Exception):
+    pass
+
+class JobInterrupted(Exception):
+    """The worker is shutting down, the job is left queued for the next one"""
+
+class JobLost(Exception):
+    """Another runner claimed the job after this one missed its heartbeats"""
+
+# Job ids are per database, so with per-user shards every user has a job 1:
+# the files are named by user as well
+def spool_path(user_id: int, job_id: int) -> str:
+    return os.path.join(JOB_DIR, f"import-{user_id}-{job_id}.csv")
+
+def export_path(user_id: int, job_id: int, format: str) -> str:
+    return os.path.join(JOB_DIR, f"export-{user_id}-{job_id}.{format}")
+
+def describe(job: models.Job) -> dict:
+    """JSON-ready job status (JobResponse)"""
+    return {
+        "id": job.id, "kind": job.kind, "status": job.status,
+        "done": job.done, "total": job.total,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error, "cancel_requested": bool(job.cancel_requested),
+        "created_at": job.created_at, "started_at": job.started_at, "finished_at": job.finished_at,
+    }
+
+def create_job(db: Session, user_id: int, kind: str, params: dict) -> models.Job:
+    """
+    Add a queued job (uncommitted), refusing it when the user is at their
+    limit. The count is evaluated by the INSERT itself, under the write lock,
+    so concurrent requests cannot both take the last slot.
+    """
+    table = models.Job.__table__
+    active = select(func.count()).select_from(table).where(
+        table.c.user_id == user_id, table.c.status.in_(ACTIVE_STATUSES)
+    ).scalar_subquery()
+    row = select(
+        literal(user_id), literal(kind), literal("queued"), literal(json.dumps(params)),
+        literal(0), literal(0), literal(datetime.utcnow(), models.Job.created_at.type),
+    ).where(active < MAX_ACTIVE_JOBS_PER_USER)
+    job_id = db.execute(table.insert().from_select(
+        ["user_id", "kind", "status", "params", "done", "cancel_requested", "created_at"], row
+    ).returning(table.c.id)).scalar()
+    if job_id is None:
+        raise HTTPException(
+            status_code=429, detail=f"At most {MAX_ACTIVE_JOBS_PER_USER} jobs can be queued or running at once"
+        )
+    return db.get(models.Job, job_id)
+
+def claimable(now: datetime):
+    """Condition on jobs a runner may claim: queued, or running without a recent heartbeat"""
+    stale = now - timedelta(seconds=JOB_STALE_SECONDS)
+    return or_(
+        models.Job.status == "queued",
+        and_(models.Job.status == "running", or_(models.Job.heartbeat.is_(None), models.Job.heartbeat < stale)),
+    )
+
+def _publish(job: models.Job):
+    events.hub.publish(job.user_id, "job.updated", describe(job))
+
+class JobRunner:
+    """Thread pool running queued jobs one chunk at a time"""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        # Unique per process start, a restarted worker may reuse its pid
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._executor = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._local = threading.local()  # chunk_started, per worker thread
+        self.running = 0
+
+    def _call(self, fn, *args):
+        with self._lock:
+            if self._stopping.is_set():
+                return  # Left queued for the next worker's resume()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="job")
+            self._executor.submit(fn, *args)
+
+    def submit(self, user_id: int, job_id: int):
+        """Run a committed queued job"""
+        self._call(self._run, user_id, job_id)
+
+    def resume(self):
+        """Submit the claimable jobs of every database, in a background thread"""
+        if not self._stopping.is_set():
+            threading.Thread(target=self._resume_all, name="job-resume", daemon=True).start()
+
+    def _resume_all(self):
+        """
+        Submit queued and orphaned jobs. Jobs another runner is still
+        heartbeating are checked again every JOB_STALE_SECONDS, and submitted
+        if it stops, until they finish.
+        """
+        watched = []
+        engines = [engine] + ([shard_pool.open(path) for path in shard_pool.existing()] if shard_pool else [])
+        for target in engines:
+            with target.connect() as conn:
+                unfinished = conn.execute(select(
+                    models.Job.user_id, models.Job.id, claimable(datetime.utcnow())
+                ).where(models.Job.status.in_(ACTIVE_STATUSES)).order_by(models.Job.id)).all()
+            watched += unfinished
+
+        while watched:
+            waiting = []
+            for user_id, job_id, ready in watched:
+                if ready:
+                    log.info("resuming job %d of user %d", job_id, user_id)
+                    self.submit(user_id, job_id)
+                else:
+                    waiting.append((user_id, job_id))
+            if not waiting or self._stopping.wait(JOB_STALE_SECONDS):
+                return
+            watched = []
+            for user_id, job_id in waiting:
+                db = user_session(user_id)
+                try:
+                    row = db.query(models.Job.user_id, models.Job.id, claimable(datetime.utcnow())).filter(
+                        models.Job.id == job_id, models.Job.status.in_(ACTIVE_STATUSES)
+                    ).first()
+                finally:
+                    db.close()
+                if row is not None:
+                    watched.append(tuple(row))
+
+    def shutdown(self):
+        """Stop at the running jobs' next chunk boundary, leaving them queued"""
+        self._stopping.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _claim(self, db: Session, job_id: int) -> bool:
+        """Take a claimable job for this runner, False if it is not (or another runner won)"""
+        now = datetime.utcnow()
+        claimed = db.execute(
+            update(models.Job).where(models.Job.id == job_id, claimable(now)).values(
+                status="running", worker=self.worker_id, heartbeat=now,
+                started_at=func.coalesce(models.Job.started_at, now),
+            ),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.commit()
+        return bool(claimed)
+
+    def _renew(self, db: Session, job: models.Job) -> bool:
+        """
+        Refresh the job's heartbeat if this runner still owns it. The UPDATE
+        takes the write lock, so the job stays ours until the commit
+        """
+        return db.execute(
+            update(models.Job).where(models.Job.id == job.id, models.Job.worker == self.worker_id).values(
+                heartbeat=datetime.utcnow()
+            ),
+            execution_options={"synchronize_session": False},
+        ).rowcount == 1
+
+    def checkpoint(self, db: Session, job: models.Job, done: int, state=None):
+        """
+        Commit a finished chunk with the job's progress and heartbeat, then
+        stop if the job was cancelled or the worker is shutting down. A chunk
+        of a job another runner has claimed meanwhile is rolled back (JobLost).
+        """
+        job.done = done
+        if state is not None:
+            job.checkpoint = json.dumps(state)
+        if not self._renew(db, job):
+            db.rollback()
+            raise JobLost()
+        db.commit()
+        _publish(job)
+        if job.cancel_requested:  # Reloaded after the commit
+            raise JobCancelled()
+        if self._stopping.is_set():
+            raise JobInterrupted()
+        time.sleep((time.perf_counter() - self._local.chunk_started) * CHUNK_PAUSE_RATIO)
+        self._local.chunk_started = time.perf_counter()
+
+    def _run(self, user_id: int, job_id: int):
+        db = user_session(user_id)
+        with self._lock:
+            self.running += 1
+        try:
+            if not self._claim(db, job_id):
+                return
+            job = db.get(models.Job, job_id)
+            try:
+                if job.cancel_requested:
+                    raise JobCancelled()
+                _publish(job)
+
+                self._local.chunk_started = time.perf_counter()
+                result = HANDLERS[job.kind](self, db, job, json.loads(job.params or "{}"))
+                job.status = "succeeded"
+                job.result = json.dumps(result)
+            except JobLost:
+                db.rollback()
+                log.warning("job %d of user %d was claimed by another runner", job_id, user_id)
+                return
+            except JobInterrupted:
+                db.rollback()
+                if self._renew(db, job):
+                    job.status = "queued"
+                    job.worker = job.heartbeat = None
+                db.commit()
+                return
+            except JobCancelled:
+                db.rollback()
+                job.status = "cancelled"
+            except Exception as e:
+                db.rollback()
+                log.exception("job %d (%s) of user %d failed", job.id, job.kind, user_id)
+                job.status = "failed"
+                job.error = e.detail if isinstance(e, HTTPException) else str(e) or type(e).__name__
+            if not self._renew(db, job):
+                db.rollback()
+                return
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            _publish(job)
+            if job.kind in ("import", "recalculate") and job.done:
+                # Chunks were committed whatever the outcome
+                events.publish_change(db, user_id, "trades.changed", {"source": job.kind})
+            if job.kind == "import" and os.path.exists(spool_path(user_id, job.id)):
+                os.remove(spool_path(user_id, job.id))
+        finally:
+            with self._lock:
+                self.running -= 1
+            db.close()
+
+def run_import(runner: JobRunner, db: Session, job: models.Job, params: dict) -> dict:
+    """Insert the spooled CSV in chunks, resuming after the last committed one"""
+    # Deferred: the routers import this module
+    from routers.imports import read_headers
+
+    path = spool_path(job.user_id, job.id)
+    if job.total is None:
+        with open(path, "rb") as f:
+            job.total = max(sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b"")) - 1, 0)
+
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            reader = csv.reader(f)
+            headers = read_headers(reader)
+            if "side" in headers:
+                state = _import_fills(runner, db, job, headers, reader)
+            else:
+                state = _import_trades(runner, db, job, headers, reader)
+    except UnicodeDecodeError:
+        raise ValueError("CSV file must be UTF-8 encoded")
+
+    return {"imported": state["imported"], "failed": state["failed"], "errors": state["errors"]}
+
+def _import_trades(runner: JobRunner, db: Session, job: models.Job, headers: list, reader) -> dict:
+    """Trade rows, CHUNK_ROWS records per chunk"""
+    from routers.imports import MAX_REPORTED_ERRORS, import_rows, numbered_rows
+
+    state = json.loads(job.checkpoint) if job.checkpoint else {"records": 0, "imported": 0, "failed": 0, "errors": []}
+    rows = numbered_rows(reader)
+    # Records already imported before a restart
+    for _ in islice(rows, state["records"]):
+        pass
+    while True:
+        chunk = list(islice(rows, CHUNK_ROWS))
+        if not chunk:
+            break
+        counts = import_rows(db, job.user_id, headers, chunk)
+        state["records"] += len(chunk)
+        state["imported"] += counts["imported"]
+        state["failed"] += counts["failed"]
+        state["errors"] = (state["errors"] + counts["errors"])[:MAX_REPORTED_ERRORS]
+        runner.checkpoint(db, job, state["records"], state)
+    return state
+
+def _import_fills(runner: JobRunner, db: Session, job: models.Job, headers: list, reader) -> dict:
+    """
+    Fill rows, one symbol per chunk: fills are matched in date order, so the
+    whole file is sorted first (imports.FillSpool). A restart sorts it again
+    and skips the symbols already committed.
+    """
+    from routers.imports import import_symbol_fills, numbered_rows, spool_fills
+
+    state = json.loads(job.checkpoint) if job.checkpoint else {"symbols": 0, "imported": 0}
+    spool, state["failed"], state["errors"] = spool_fills(headers, numbered_rows(reader))
+    try:
+        for symbol in spool.symbols()[state["symbols"]:]:
+            state["imported"] += import_symbol_fills(db, job.user_id, spool, symbol)
+            state["symbols"] += 1
+            caching.bump(db, job.user_id, "trades")
+            runner.checkpoint(db, job, state["imported"] + state["failed"], state)
+    finally:
+        spool.close()
+    return state
+
+def run_recalculate(runner: JobRunner, db: Session, job: models.Job, params: dict) -> dict:
+    """
+    Recompute every trade's cost and P&L (optionally with a new flat fee), in
+    id order. Trades derived from fills keep their fills' fees: a new fee is
+    not applied to them (counted as skipped), as a replay would undo it.
+    """
+    from routers.trades import calculate_trade_metrics
+
+    table = models.Trade.__table__
+    fee = params.get("brokerage_fee")
+    state = json.loads(job.checkpoint) if job.checkpoint else {"after_id": 0, "trades": 0, "changed": 0, "skipped": 0}
+    if job.total is None:
+        job.total = db.query(models.Trade).filter(models.Trade.user_id == job.user_id).count()
+
+    while True:
+        rows = db.execute(
+            select(table).where(table.c.user_id == job.user_id, table.c.id > state["after_id"])
+            .order_by(table.c.id).limit(CHUNK_ROWS)
+        ).mappings().all()
+        if not rows:
+            break
+        state["after_id"] = rows[-1]["id"]
+        state["trades"] += len(rows)
+        if fee is not None:
+            derived = set(db.scalars(select(models.LotMatch.trade_id).where(
+                models.LotMatch.trade_id.in_([row["id"] for row in rows])
+            )))
+            rows = [row for row in rows if row["id"] not in derived]
+            state["skipped"] += len(derived)
+
+        # Only trades whose metrics change are written (and re-counted in the aggregates)
+        old, new = [], []
+        for row in rows:
+            trade = SimpleNamespace(**row)
+            if fee is not None:
+                trade.brokerage_fee = fee
+            calculate_trade_metrics(trade)
+            if any(getattr(trade, column) != row[column] for column in RECALCULATED_COLUMNS):
+                old.append(SimpleNamespace(**row))
+                new.append(trade)
+
+        if new:
+            # Same delta bookkeeping as a batch update
+            stats.apply_trades(db, job.user_id, old, -1)
+            # Metric columns only, so the notes search triggers do not fire
+            db.execute(
+                table.update().where(table.c.id == bindparam("trade_id")).values(
+                    {column: bindparam(column) for column in RECALCULATED_COLUMNS}
+                ),
+                [{"trade_id": trade.id, **{column: getattr(trade, column) for column in RECALCULATED_COLUMNS}}
+                 for trade in new],
+            )
+            stats.apply_trades(db, job.user_id, new)
+            rollups.recompute_days(db, job.user_id, {trade.exit_date for trade in new})
+            caching.bump(db, job.user_id, "trades")
+            state["changed"] += len(new)
+        runner.checkpoint(db, job, state["trades"], state)
+
+    return {"trades": state["trades"], "changed": state["changed"], "skipped": state["skipped"]}
+
+def run_export(runner: JobRunner, db: Session, job: models.Job, params: dict) -> dict:
+    """Write the ledger export to a file for GET /api/jobs/{id}/download"""
+    from routers.exports import CHUNK_SIZE, ledger, ledger_size, stream_csv, stream_ndjson
+
+    date_from = date.fromisoformat(params["from"]) if params.get("from") else None
+    date_to = date.fromisoformat(params["to"]) if params.get("to") else None
+    columns = params["columns"]
+    job.total = ledger_size(db, job.user_id, date_from, date_to)
+
+    # Counted as the encoder pulls them, it yields once per CHUNK_SIZE rows
+    written = [0]
+    def counted(rows):
+        for written[0], row in enumerate(rows, 1):
+            yield row
+
+    rows = ledger(job.user_id, date_from, date_to, with_notes="notes" in columns)
+    encode = stream_ndjson if params["format"] == "ndjson" else stream_csv
+    path = export_path(job.user_id, job.id, params["format"])
+    os.makedirs(JOB_DIR, exist_ok=True)
+    try:
+        with open(path + ".part", "wb") as f:
+            for chunk in encode(counted(rows), columns):
+                f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+                if written[0] and written[0] % CHUNK_SIZE == 0:
+                    runner.checkpoint(db, job, written[0])
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path + ".part")
+        raise
+    finally:
+        rows.close()  # Closes the ledger's session when stopped early
+    os.replace(path + ".part", path)
+    job.done = written[0]
+
+    return {"rows": written[0], "bytes": os.path.getsize(path), "format": params["format"]}
+
+HANDLERS = {"import": run_import, "recalculate": run_recalculate, "export": run_export}
+
+runner = JobRunner()
@@ -0,0 +1,399 @@
+"""
+Lot matching for partial fills (models.Fill).
+
+Buys open lots, sells close them FIFO, LIFO or against a specific lot. Each
+matched slice becomes a closed trade row and the unmatched remainder of a lot
+an open trade row (linked through models.LotMatch), so the trade list, stats,
+rollups and analytics work on fills unchanged.
+
+New fills are matched incrementally against the open-lot index
+(ix_fills_open_lots). Backdated fills and deletes replay the symbol's
+history through LotBook. Imports match a symbol's fills in a LotBook
+(add_fills) and write them in executemany batches.
+"""
+from itertools import chain, islice
+from sqlalchemy import bindparam, func, select, text, tuple_
+from sqlalchemy.orm import Session
+from types import SimpleNamespace
+import heapq
+import models
+import stats
+import rollups
+from routers.trades import calculate_trade_metrics
+
+METHODS = ("fifo", "lifo", "specific")
+
+# Quantities at or below this count as fully closed
+EPSILON = 1e-9
+
+# Open lots fetched per query while matching a sell
+LOT_PAGE = 16
+
+# Fills per executemany batch in add_fills
+FILL_BATCH_SIZE = 1000
+
+# Fill columns add_fills inserts
+FILL_COLUMNS = ("user_id", "symbol", "side", "quantity", "price", "fee", "currency", "executed_at", "method", "lot_id", "remaining")
+
+# Literal (not a bound parameter) so SQLite can use the partial index
+OPEN_LOT = text("fills.remaining > 0")
+
+class LotError(ValueError):
+    """A sell that cannot be matched against the open lots (add_fills sets `fill` to it)"""
+    fill = None
+
+def take_lots(lots, quantity: float) -> list:
+    """Consume `quantity` from `lots` in order, returns [(lot, quantity taken)]"""
+    taken = []
+    if quantity > EPSILON:
+        for lot in lots:
+            take = min(lot.remaining, quantity)
+            lot.remaining -= take
+            if lot.remaining <= EPSILON:
+                lot.remaining = 0
+            quantity -= take
+            taken.append((lot, take))
+            if quantity <= EPSILON:
+                break
+    if quantity > EPSILON:
+        raise LotError(f"Sell exceeds the open quantity by {quantity:g}")
+    return taken
+
+class LotBook:
+    """
+    Open lots of one (user, symbol): a min-heap per direction plus a dict for
+    specific-lot sells. Closed lots are dropped lazily, so matching costs
+    O(log n) per lot touched instead of a scan of the history.
+    """
+
+    def __init__(self):
+        self.lots = {}
+        self._oldest = []
+        self._newest = []
+        self._seq = 0
+
+    def buy(self, lot, remaining=None):
+        """Open a lot (any object with id/quantity), with `remaining` (default: all of it) still open"""
+        lot.remaining = lot.quantity if remaining is None else remaining
+        self._seq += 1
+        self.lots[lot.id] = lot
+        heapq.heappush(self._oldest, (self._seq, lot))
+        heapq.heappush(self._newest, (-self._seq, lot))
+
+    def _ordered(self, heap):
+        while heap:
+            lot = heap[0][1]
+            if lot.remaining > 0:
+                yield lot
+            if lot.remaining <= 0:
+                heapq.heappop(heap)
+
+    def sell(self, quantity: float, method: str = "fifo", lot_id=None) -> list:
+        """Close `quantity` against the open lots, returns [(lot, quantity taken)]"""
+        if method == "specific":
+            lot = self.lots.get(lot_id)
+            if lot is None:
+                raise LotError(f"Lot {lot_id} is not open")
+            taken = take_lots([lot], quantity)
+        else:
+            taken = take_lots(self._ordered(self._oldest if method == "fifo" else self._newest), quantity)
+
+        for lot, _ in taken:
+            if not lot.remaining:
+                del self.lots[lot.id]
+        return taken
+
+    @property
+    def open_quantity(self) -> float:
+        return sum(lot.remaining for lot in self.lots.values())
+
+def trade_values(user_id: int, symbol: str, lot, quantity: float, sell=None) -> SimpleNamespace:
+    """Trade row for `quantity` of a lot, closed by `sell` or still open, fees pro rata"""
+    fee = lot.fee * quantity / lot.quantity
+    if sell is not None:
+        if sell.currency != lot.currency:
+            raise LotError(f"Sell in {sell.currency} cannot close a {lot.currency} lot")
+        fee += sell.fee * quantity / sell.quantity
+
+    trade = SimpleNamespace(
+        user_id=user_id,
+        symbol=symbol,
+        entry_date=lot.executed_at.date(),
+        exit_date=sell.executed_at.date() if sell else None,
+        entry_price=lot.price,
+        exit_price=sell.price if sell else None,
+        shares=quantity,
+        notes=None,
+        brokerage_fee=fee,
+        currency=lot.currency,
+    )
+    calculate_trade_metrics(trade)
+    return trade
+
+def _open_lots(db: Session, user_id: int, symbol: str, method: str):
+    """Open lots in match order, read a page at a time from ix_fills_open_lots"""
+    fifo = method == "fifo"
+    direction = (lambda c: c.asc()) if fifo else (lambda c: c.desc())
+    position = tuple_(models.Fill.executed_at, models.Fill.id)
+    query = db.query(models.Fill).filter(
+        models.Fill.user_id == user_id,
+        models.Fill.symbol == symbol,
+        OPEN_LOT,
+    ).order_by(direction(models.Fill.executed_at), direction(models.Fill.id))
+
+    # Each page starts after the last lot read (keyset), so lots closed by a
+    # flush in between cannot shift the next page the way an OFFSET would
+    page = query.limit(LOT_PAGE).all()
+    while page:
+        yield from page
+        if len(page) < LOT_PAGE:
+            return
+        last = (page[-1].executed_at, page[-1].id)
+        page = query.filter(position > last if fifo else position < last).limit(LOT_PAGE).all()
+
+def _add_trades(db: Session, user_id: int, symbol: str, rows):
+    """Insert [(buy fill, sell fill or None, trade values)] with their LotMatch links"""
+    if not rows:
+        return
+    trade_table = models.Trade.__table__
+    trade_ids = db.execute(
+        trade_table.insert().returning(trade_table.c.id, sort_by_parameter_order=True),
+        [vars(trade) for _, _, trade in rows]
+    ).scalars().all()
+    db.execute(models.LotMatch.__table__.insert(), [
+        {"user_id": user_id, "symbol": symbol, "buy_fill_id": lot.id,
+         "sell_fill_id": sell.id if sell else None, "trade_id": trade_id}
+        for (lot, sell, _), trade_id in zip(rows, trade_ids)
+    ])
+    for (_, _, trade), trade_id in zip(rows, trade_ids):
+        trade.id = trade_id
+    stats.apply_trades(db, user_id, [trade for _, _, trade in rows])
+
+def add_fill(db: Session, fill: models.Fill):
+    """
+    Record a new fill and update its derived trades, aggregates and rollup
+    days in the caller's transaction. Raises LotError for unmatched sells.
+    """
+    user_id, symbol = fill.user_id, fill.symbol
+    stats.get_user_stats(db, user_id)
+
+    backdated = db.query(models.Fill.id).filter(
+        models.Fill.user_id == user_id,
+        models.Fill.symbol == symbol,
+        models.Fill.executed_at > fill.executed_at,
+    ).first()
+
+    db.add(fill)
+    db.flush()
+    if backdated:
+        replay_symbol(db, user_id, symbol)
+        return
+
+    if fill.side == "buy":
+        fill.remaining = fill.quantity
+        _add_trades(db, user_id, symbol, [(fill, None, trade_values(user_id, symbol, fill, fill.quantity))])
+        return
+
+    if fill.method == "specific":
+        lot = db.get(models.Fill, fill.lot_id)
+        if lot is None or (lot.user_id, lot.symbol, lot.side) != (user_id, symbol, "buy") or not lot.remaining:
+            raise LotError(f"Lot {fill.lot_id} is not open")
+        lots = [lot]
+    else:
+        lots = _open_lots(db, user_id, symbol, fill.method)
+
+    closed = []
+    for lot, quantity in take_lots(lots, fill.quantity):
+        # Swap the lot's open trade row for its smaller remainder
+        match = db.query(models.LotMatch).filter(
+            models.LotMatch.buy_fill_id == lot.id,
+            models.LotMatch.sell_fill_id.is_(None)
+        ).one()
+        open_trade = db.get(models.Trade, match.trade_id)
+        stats.apply_trade(db, open_trade, -1)
+        if lot.remaining:
+            for field, value in vars(trade_values(user_id, symbol, lot, lot.remaining)).items():
+                setattr(open_trade, field, value)
+            stats.apply_trade(db, open_trade)
+        else:
+            db.delete(match)
+            db.delete(open_trade)
+
+        closed.append((lot, fill, trade_values(user_id, symbol, lot, quantity, fill)))
+
+    _add_trades(db, user_id, symbol, closed)
+    db.flush()
+    rollups.recompute_days(db, user_id, {fill.executed_at.date()})
+
+def delete_fill(db: Session, fill: models.Fill):
+    """Delete a fill and replay its symbol. Raises LotError if later sells no longer match"""
+    db.delete(fill)
+    db.flush()
+    replay_symbol(db, fill.user_id, fill.symbol)
+
+def replay_symbol(db: Session, user_id: int, symbol: str):
+    """Rebuild a symbol's lots and fill-derived trades from its full fill history"""
+    stats.get_user_stats(db, user_id)
+
+    matched = select(models.LotMatch.trade_id).where(
+        models.LotMatch.user_id == user_id,
+        models.LotMatch.symbol == symbol
+    )
+    old = db.query(
+        models.Trade.id, models.Trade.symbol, models.Trade.profit_loss, models.Trade.currency,
+        models.Trade.entry_date, models.Trade.exit_date,
+    ).filter(
+        models.Trade.id.in_(matched)
+    ).all()
+    stats.apply_trades(db, user_id, old, -1)
+    days = {trade.exit_date for trade in old}
+
+    db.query(models.Trade).filter(models.Trade.id.in_(matched)).delete(synchronize_session=False)
+    db.query(models.LotMatch).filter(
+        models.LotMatch.user_id == user_id,
+        models.LotMatch.symbol == symbol
+    ).delete(synchronize_session=False)
+
+    fills = db.query(models.Fill).filter(
+        models.Fill.user_id == user_id,
+        models.Fill.symbol == symbol
+    ).order_by(models.Fill.executed_at, models.Fill.id).all()
+
+    book, rows = LotBook(), []
+    for fill in fills:
+        if fill.side == "buy":
+            book.buy(fill)
+        else:
+            try:
+                taken = book.sell(fill.quantity, fill.method, fill.lot_id)
+            except LotError as e:
+                raise LotError(f"Sell of {fill.quantity:g} {symbol} on {fill.executed_at.date()}: {e}")
+            for lot, quantity in taken:
+                rows.append((lot, fill, trade_values(user_id, symbol, lot, quantity, fill)))
+    for lot in book.lots.values():
+        rows.append((lot, None, trade_values(user_id, symbol, lot, lot.remaining)))
+
+    _add_trades(db, user_id, symbol, rows)
+    db.flush()
+    days.update(trade.exit_date for _, _, trade in rows)
+    rollups.recompute_days(db, user_id, days)
+
+def _insert_fills(db: Session, fills: list):
+    """Insert fill objects (FILL_COLUMNS attributes) in one executemany, setting their ids"""
+    table = models.Fill.__table__
+    ids = db.execute(
+        table.insert().returning(table.c.id, sort_by_parameter_order=True),
+        [{column: getattr(fill, column) for column in FILL_COLUMNS} for fill in fills]
+    ).scalars().all()
+    for fill, fill_id in zip(fills, ids):
+        fill.id = fill_id
+
+def _open_trades(db: Session, user_id: int, symbol: str):
+    """Take the open-remainder trade rows of a symbol's lots out of the trades and aggregates"""
+    matched = select(models.LotMatch.trade_id).where(
+        models.LotMatch.user_id == user_id,
+        models.LotMatch.symbol == symbol,
+        models.LotMatch.sell_fill_id.is_(None),
+    )
+    old = db.query(
+        models.Trade.id, models.Trade.symbol, models.Trade.profit_loss, models.Trade.currency,
+        models.Trade.entry_date, models.Trade.exit_date,
+    ).filter(models.Trade.id.in_(matched)).all()
+    stats.apply_trades(db, user_id, old, -1)
+    db.query(models.Trade).filter(models.Trade.id.in_(matched)).delete(synchronize_session=False)
+    db.query(models.LotMatch).filter(
+        models.LotMatch.user_id == user_id,
+        models.LotMatch.symbol == symbol,
+        models.LotMatch.sell_fill_id.is_(None),
+    ).delete(synchronize_session=False)
+
+def add_fills(db: Session, user_id: int, symbol: str, fills, batch_size: int = FILL_BATCH_SIZE) -> int:
+    """
+    Record many fills of one symbol, given in execution order as objects with
+    FILL_COLUMNS attributes, with their derived trades, aggregates and rollup
+    days in the caller's transaction. Returns how many were added.
+
+    Fills later than the symbol's stored history are matched in a LotBook
+    seeded with its open lots, holding only the open lots and one batch;
+    fills, trades, lot matches and lot remainders are written per batch with
+    executemany. Fills that go back before the stored history are inserted
+    and the symbol replayed once. A sell that cannot be matched raises
+    LotError with `fill` set to it.
+    """
+    fills = iter(fills)
+    first = next(fills, None)
+    if first is None:
+        return 0
+    fills = chain([first], fills)
+    stats.get_user_stats(db, user_id)
+
+    latest = db.query(func.max(models.Fill.executed_at)).filter(
+        models.Fill.user_id == user_id,
+        models.Fill.symbol == symbol,
+    ).scalar()
+    if latest is not None and latest > first.executed_at:
+        added = 0
+        while True:
+            batch = list(islice(fills, batch_size))
+            if not batch:
+                break
+            for fill in batch:
+                fill.remaining = None
+            _insert_fills(db, batch)
+            added += len(batch)
+        replay_symbol(db, user_id, symbol)
+        return added
+
+    # Continue from the stored open lots, whose open trade rows are rebuilt at the end
+    book = LotBook()
+    for lot in db.query(
+        models.Fill.id, models.Fill.quantity, models.Fill.remaining, models.Fill.price,
+        models.Fill.fee, models.Fill.currency, models.Fill.executed_at,
+    ).filter(
+        models.Fill.user_id == user_id,
+        models.Fill.symbol == symbol,
+        OPEN_LOT,
+    ).order_by(models.Fill.executed_at, models.Fill.id):
+        book.buy(SimpleNamespace(**lot._mapping), lot.remaining)
+    _open_trades(db, user_id, symbol)
+
+    fill_table = models.Fill.__table__
+    set_remaining = fill_table.update().where(fill_table.c.id == bindparam("b_id")).values(
+        remaining=bindparam("b_remaining")
+    )
+    added, days = 0, set()
+    while True:
+        batch = list(islice(fills, batch_size))
+        if not batch:
+            break
+        for fill in batch:
+            fill.remaining = fill.quantity if fill.side == "buy" else None
+        _insert_fills(db, batch)
+        added += len(batch)
+
+        rows, touched = [], {}
+        for fill in batch:
+            if fill.side == "buy":
+                book.buy(fill)
+                continue
+            try:
+                taken = book.sell(fill.quantity, fill.method, fill.lot_id)
+                for lot, quantity in taken:
+                    rows.append((lot, fill, trade_values(user_id, symbol, lot, quantity, fill)))
+                    touched[lot.id] = lot
+            except LotError as e:
+                e.fill = fill
+                raise
+            days.add(fill.executed_at.date())
+
+        _add_trades(db, user_id, symbol, rows)
+        if touched:
+            db.execute(set_remaining, [
+                {"b_id": lot.id, "b_remaining": lot.remaining} for lot in touched.values()
+            ])
+
+    _add_trades(db, user_id, symbol, [
+        (lot, None, trade_values(user_id, symbol, lot, lot.remaining)) for lot in book.lots.values()
+    ])
+    rollups.recompute_days(db, user_id, days)
+    return added
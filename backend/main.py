@@ -1,11 +1,26 @@
-from fastapi import FastAPI
+import time
+STARTED = time.perf_counter()  # Before the other imports, for the startup metrics
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
-import models
-from routers import auth, trades, deposits
+from fastapi.responses import JSONResponse, PlainTextResponse
+from database import engine, async_engine, shard_pool
+import passwords
+import fx
+import schema
+import metrics
+import caching
+import events as event_hub
+import jobs as job_runner
+import snapshots
+from routers import auth, trades, imports, exports, search, deposits, fills, positions, stats, analytics, events, jobs
+
+IMPORTS_SECONDS = time.perf_counter() - STARTED
 
-# Create all database tables
-Base.metadata.create_all(bind=engine)
+# Apply pending migrations to the main database (shards are migrated when first opened);
+# an up-to-date database costs one PRAGMA read
+schema.prepare(engine)
+SCHEMA_SECONDS = time.perf_counter() - STARTED - IMPORTS_SECONDS
 
 app = FastAPI(title="Trade Tracker API")
 
@@ -16,17 +31,67 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing"],
 )
 
+# Outermost, so it times the whole request including CORS
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.gauge("sse_connections", "Open /api/events streams", lambda: event_hub.hub.connections)
+metrics.gauge("response_cache_bytes", "Bytes of cached GET response bodies", lambda: caching.response_cache.size)
+metrics.gauge("snapshot_cache_bytes", "Bytes of trade snapshots held mapped for analytics", lambda: snapshots.snapshot_cache.size)
+metrics.gauge("startup_import_seconds", "Time this worker spent importing the app", lambda: IMPORTS_SECONDS)
+metrics.gauge("startup_schema_seconds", "Time this worker spent checking/applying schema migrations", lambda: SCHEMA_SECONDS)
+metrics.gauge("jobs_running", "Background jobs running in this worker", lambda: job_runner.runner.running)
+if shard_pool is not None:
+    metrics.gauge("shard_engines_open", "Shard database engines in the LRU pool", lambda: shard_pool.open_engines)
+
 # Include routers
 app.include_router(auth.router)
+# Static /api/trades/* paths must be registered before /api/trades/{trade_id}
+app.include_router(exports.router)
+app.include_router(search.router)
 app.include_router(trades.router)
+app.include_router(imports.router)
 app.include_router(deposits.router)
+app.include_router(fills.router)
+app.include_router(positions.router)
+app.include_router(stats.router)
+app.include_router(analytics.router)
+app.include_router(events.router)
+app.include_router(jobs.router)
+
+@app.exception_handler(fx.FxError)
+async def fx_error(request: Request, exc: fx.FxError):
+    # Amounts in a currency without loaded rates (the transaction is rolled back)
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.on_event("startup")
+def startup():
+    # Jobs left queued or running by a previous worker
+    job_runner.runner.resume()
+
+@app.on_event("shutdown")
+def shutdown():
+    # Running jobs stop after their current chunk and stay queued
+    job_runner.runner.shutdown()
+    passwords.shutdown_pool()
+    if shard_pool is not None:
+        shard_pool.dispose()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    if async_engine is not None:
+        await async_engine.dispose()
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"status": "Trade Tracker API Running"}
 
 @app.get("/api/health")
-def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+async def health_check():
+    return {"status": "healthy"}
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of request, SQL and cache metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -0,0 +1,299 @@
+"""
+Request and SQL instrumentation, exposed in Prometheus text format at /api/metrics.
+
+MetricsMiddleware times every request per route template and attributes the
+SQL run on its behalf (counted by the cursor hooks that database.py installs
+on every engine) through a context variable, which Starlette copies into the
+threadpool and AsyncSession.run_sync carries into its greenlet. Responses carry a Server-Timing header with
+the request's query count and time.
+
+Queries slower than TRADETRACKER_SLOW_QUERY_MS (default 200) are logged to the
+"tradetracker.sql" logger with their route. With TRADETRACKER_PROFILING=1, a
+request sent with `X-Profile: 1` is sampled by SamplingProfiler and answered
+with folded stacks (speedscope / flamegraph.pl input) instead of its body.
+"""
+from bisect import bisect_left
+from collections import Counter as StackCounter
+from contextvars import ContextVar
+from typing import Optional
+import logging
+import os
+import sys
+import threading
+import time
+
+SLOW_QUERY_MS = float(os.getenv("TRADETRACKER_SLOW_QUERY_MS", "200"))
+
+# Off by default: a profile exposes code paths and costs the request its body
+PROFILING_ENABLED = os.getenv("TRADETRACKER_PROFILING", "").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL_SECONDS = 0.002
+
+# Request latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Queries-per-request buckets
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+# Statement text kept in the slow-query log
+SLOW_QUERY_MAX_CHARS = 1000
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+slow_query_log = logging.getLogger("tradetracker.sql")
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """Base for labelled metrics kept in a Registry"""
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_series(labels, value) for labels, value in items)
+        return lines
+
+    def _render_series(self, labels: tuple, value) -> str:
+        return f"{self.name}{_labels(self.label_names, labels)} {value:g}"
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+class Gauge(Metric):
+    """Value read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback):
+        super().__init__(name, help)
+        self.callback = callback
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.callback():g}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket counts (the last is +Inf), sum
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def _render_series(self, labels: tuple, value) -> str:
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            le = f'le="{bound:g}"' if bound != "+Inf" else 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total:g}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return "\n".join(lines)
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+registry = Registry()
+
+requests_total = registry.add(Counter(
+    "http_requests_total", "Requests by route template and status", ("method", "route", "status")))
+request_seconds = registry.add(Histogram(
+    "http_request_duration_seconds", "Request latency until the response is complete", ("method", "route")))
+request_queries = registry.add(Histogram(
+    "http_request_db_queries", "SQL statements per request", ("method", "route"), QUERY_BUCKETS))
+request_db_seconds = registry.add(Counter(
+    "http_request_db_seconds_total", "Time spent in SQL on behalf of requests", ("method", "route")))
+queries_total = registry.add(Counter("db_queries_total", "SQL statements executed (requests and background work)"))
+query_seconds = registry.add(Counter("db_query_seconds_total", "Time spent executing SQL statements"))
+slow_queries_total = registry.add(Counter("db_slow_queries_total", "SQL statements slower than the slow-query threshold"))
+
+def gauge(name: str, help: str, callback):
+    """Register a value computed at scrape time"""
+    registry.add(Gauge(name, help, callback))
+
+def render() -> str:
+    return registry.render()
+
+class RequestStats:
+    """SQL work attributed to one request"""
+    __slots__ = ("scope", "queries", "db_seconds")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def route_label(scope: dict) -> str:
+    """Route template (/api/trades/{trade_id}), so ids don't explode the label set"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's execution context rather than the connection,
+    # so a statement that raises (no after_cursor_execute) leaves nothing behind
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_start", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    queries_total.inc()
+    query_seconds.inc(amount=elapsed)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_queries_total.inc()
+        route = route_label(stats.scope) if stats is not None else "-"
+        slow_query_log.warning(
+            "slow query %.1fms [%s]%s: %s", elapsed * 1000, route,
+            " (executemany)" if executemany else "", " ".join(statement.split())[:SLOW_QUERY_MAX_CHARS],
+        )
+
+def instrument_engine(engine):
+    """Count and time every statement an engine runs"""
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every other thread each `interval` seconds and keeps
+    those running backend code, as folded-stack counts. Process-wide, so
+    concurrent requests show up too: profile on a quiet instance.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.samples = StackCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> StackCounter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack, in_backend = [], False
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename.startswith(BACKEND_DIR) and not code.co_filename.endswith("metrics.py"):
+                        in_backend = True
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if in_backend:
+                    self.samples[";".join(reversed(stack))] += 1
+
+def folded(samples: StackCounter) -> bytes:
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common()).encode()
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL work per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status, streaming = 500, False
+        profiler = None
+        if PROFILING_ENABLED and (b"x-profile", b"1") in scope["headers"]:
+            profiler = SamplingProfiler()
+            profiler.start()
+            original = []
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                streaming = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream") for name, value in headers
+                )
+                headers.append((b"server-timing", (
+                    f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                    f"app;dur={(time.perf_counter() - start) * 1000:.1f}"
+                ).encode()))
+                message = {**message, "headers": headers}
+            if profiler is not None:
+                original.append(message)
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - start
+            labels = (scope["method"], route_label(scope))
+            requests_total.inc(labels + (str(status),))
+            # Event streams stay open for hours, their duration is not latency
+            if not streaming:
+                request_seconds.observe(labels, elapsed)
+            request_queries.observe(labels, stats.queries)
+            request_db_seconds.inc(labels, stats.db_seconds)
+            samples = profiler.stop() if profiler is not None else None
+
+        if samples is not None:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"x-profile-status", str(status).encode()),
+                (b"x-profile-samples", str(sum(samples.values())).encode()),
+                (b"server-timing", f"total;dur={elapsed * 1000:.1f}".encode()),
+            ]})
+            await send({"type": "http.response.body", "body": folded(samples)})
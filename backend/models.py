@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -9,6 +9,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
+    base_currency = Column(String(3), nullable=False, default="USD", server_default="USD")  # Stats/analytics currency
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -29,6 +30,7 @@ class Trade(Base):
     entry_price = Column(Float, nullable=False)
     exit_price = Column(Float)
     shares = Column(Float, nullable=False)
+    stop_price = Column(Float)  # Planned stop, risk per trade (1R) = |entry - stop| * shares
     
     # Calculated fields
     total_cost = Column(Float)  # entry_price * shares
@@ -38,11 +40,23 @@ class Trade(Base):
     # Notes
     notes = Column(Text)
     brokerage_fee = Column(Float)  # Transaction fees
+    currency = Column(String(3), nullable=False, default="USD", server_default="USD")  # Prices, fees and P&L
     
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     owner = relationship("User", back_populates="trades")
+    
+    __table_args__ = (
+        # Keyset pagination on (entry_date, id)
+        Index("ix_trades_user_entry_date_id", "user_id", "entry_date", "id"),
+        # Per-symbol lookups, and the symbol's best/worst trade as one index seek
+        Index("ix_trades_user_symbol_pl", "user_id", "symbol", "profit_loss"),
+        # Best/worst N trades overall without sorting every closed trade
+        Index("ix_trades_user_pl", "user_id", "profit_loss"),
+        # Covers the analytics load of (exit_date, profit_loss) per user
+        Index("ix_trades_user_exit_date", "user_id", "exit_date", "profit_loss"),
+    )
 
 
 class Deposit(Base):
@@ -52,6 +66,7 @@ class Deposit(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
     amount = Column(Float, nullable=False)
+    currency = Column(String(3), nullable=False, default="USD", server_default="USD")
     deposit_date = Column(Date, nullable=False)
     notes = Column(Text)
     
@@ -59,3 +74,171 @@ class Deposit(Base):
     
     # Relationships
     owner = relationship("User", back_populates="deposits")
+
+
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+    
+    # One row per user, maintained through deltas by the trade/deposit routers
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    
+    # Deposit totals
+    total_deposited = Column(Float, nullable=False, default=0)
+    deposit_count = Column(Integer, nullable=False, default=0)
+    
+    # Trade totals
+    trade_count = Column(Integer, nullable=False, default=0)
+    open_trades = Column(Integer, nullable=False, default=0)
+    closed_trades = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)  # profit_loss > 0
+    losses = Column(Integer, nullable=False, default=0)  # profit_loss < 0
+    total_pl = Column(Float, nullable=False, default=0)
+    gross_profit = Column(Float, nullable=False, default=0)  # Sum of winning P&L
+    gross_loss = Column(Float, nullable=False, default=0)  # Sum of losing P&L (negative)
+
+
+class SymbolStats(Base):
+    __tablename__ = "symbol_stats"
+    
+    # One row per (user, symbol), maintained alongside UserStats
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    symbol = Column(String, primary_key=True)
+    
+    trade_count = Column(Integer, nullable=False, default=0)
+    open_trades = Column(Integer, nullable=False, default=0)
+    closed_trades = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+    losses = Column(Integer, nullable=False, default=0)
+    total_pl = Column(Float, nullable=False, default=0)
+    gross_profit = Column(Float, nullable=False, default=0)
+    gross_loss = Column(Float, nullable=False, default=0)
+    
+    # Closed trades with an exit date and their summed entry -> exit days (average holding period)
+    held_trades = Column(Integer, nullable=False, default=0, server_default="0")
+    holding_days = Column(Integer, nullable=False, default=0, server_default="0")
+    
+    # Best/worst closed trade by profit_loss (trade currency). A NULL id with
+    # closed trades left means it was removed or not known yet, see stats.refresh_extremes
+    best_trade_id = Column(Integer)
+    best_pl = Column(Float)
+    worst_trade_id = Column(Integer)
+    worst_pl = Column(Float)
+
+
+class DailyPnl(Base):
+    __tablename__ = "daily_pnl"
+    
+    # Rollup of realized P&L (by exit date) and deposits per user per day
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    
+    realized_pl = Column(Float, nullable=False, default=0)
+    trade_count = Column(Integer, nullable=False, default=0)  # Trades closed that day
+    wins = Column(Integer, nullable=False, default=0)
+    losses = Column(Integer, nullable=False, default=0)
+    deposits = Column(Float, nullable=False, default=0)
+    deposit_count = Column(Integer, nullable=False, default=0)
+
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    
+    # Bumped by every mutation of a user's collections, drives ETags and the response cache
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    trades = Column(Integer, nullable=False, default=0)
+    deposits = Column(Integer, nullable=False, default=0)
+
+
+class Fill(Base):
+    __tablename__ = "fills"
+    
+    # One execution (partial buy or sell); lots.py matches them into trades
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    symbol = Column(String, nullable=False)
+    side = Column(String, nullable=False)  # "buy" or "sell"
+    quantity = Column(Float, nullable=False)
+    price = Column(Float, nullable=False)
+    fee = Column(Float, nullable=False, default=0)
+    currency = Column(String(3), nullable=False, default="USD", server_default="USD")
+    executed_at = Column(DateTime, nullable=False)
+    
+    # Sells: lot matching method ("fifo", "lifo", "specific") and the buy closed by "specific"
+    method = Column(String)
+    lot_id = Column(Integer, ForeignKey("fills.id"))
+    
+    # Buys: quantity still open (the lot)
+    remaining = Column(Float)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_fills_user_symbol_executed_at", "user_id", "symbol", "executed_at", "id"),
+        # Open lots only, in match order, so matching a sell never scans closed lots
+        Index("ix_fills_open_lots", "user_id", "symbol", "executed_at", "id", sqlite_where=text("remaining > 0")),
+    )
+
+
+class LotMatch(Base):
+    __tablename__ = "lot_matches"
+    
+    # Links a trade row derived from fills to its buy lot and (when closed) the sell
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    symbol = Column(String, nullable=False)
+    buy_fill_id = Column(Integer, ForeignKey("fills.id"), nullable=False)
+    sell_fill_id = Column(Integer, ForeignKey("fills.id"))  # None for the open remainder of a lot
+    trade_id = Column(Integer, ForeignKey("trades.id"), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_lot_matches_user_symbol", "user_id", "symbol"),
+        Index("ix_lot_matches_buy_fill", "buy_fill_id", "sell_fill_id"),
+        Index("ix_lot_matches_trade", "trade_id"),  # Is a trade fill-derived (routers.trades)
+    )
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    # Background import/recalculate/export run by jobs.py, polled through /api/jobs
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    kind = Column(String, nullable=False)  # "import", "recalculate" or "export"
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed, cancelled
+    params = Column(Text)  # JSON arguments of the kind
+    
+    # Progress, committed with each chunk of work so a restarted job resumes after it
+    done = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    checkpoint = Column(Text)  # JSON, kind-specific
+    
+    result = Column(Text)  # JSON, once succeeded
+    error = Column(Text)
+    cancel_requested = Column(Integer, nullable=False, default=0)
+    
+    # Runner that claimed the job and when it last checkpointed; a running job
+    # whose heartbeat goes stale can be claimed by another runner
+    worker = Column(String)
+    heartbeat = Column(DateTime)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    __table_args__ = (
+        # Per-user active job limit and the job list
+        Index("ix_jobs_user_status", "user_id", "status"),
+    )
+
+
+class FxRate(Base):
+    __tablename__ = "fx_rates"
+    
+    # USD value of one unit of `currency` from `date` on, loaded from a local file (see fx.py)
+    currency = Column(String(3), primary_key=True)
+    date = Column(Date, primary_key=True)
+    rate = Column(Float, nullable=False)
+    loaded_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
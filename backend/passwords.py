@@ -0,0 +1,88 @@
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
+import secrets
+import threading
+
+# Argon2 runs in worker processes so it never blocks the API worker.
+# HASH_MAX_PENDING caps queued + running jobs; beyond it callers get PoolSaturated.
+HASH_WORKERS = 2
+HASH_MAX_PENDING = 32
+
+class PoolSaturated(Exception):
+    """Raised when too many hash/verify jobs are already queued"""
+
+_executor = None
+_pending = 0
+_pwd_context = None
+_dummy_hash = None  # See verify_unknown_user_async
+_pwd_context_lock = threading.Lock()
+
+def get_pwd_context():
+    """The password hashing context, importing passlib/argon2 on first use rather than at startup"""
+    global _pwd_context
+    if _pwd_context is None:
+        with _pwd_context_lock:
+            if _pwd_context is None:
+                from passlib.context import CryptContext
+                _pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
+    return _pwd_context
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash"""
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+def get_password_hash(password: str) -> str:
+    """Hash a password"""
+    return get_pwd_context().hash(password)
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Whether a stored hash uses a deprecated scheme or outdated parameters"""
+    return get_pwd_context().needs_update(hashed_password)
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: children only import this module, and forking a threaded server is unsafe
+        _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+async def _run(func, *args):
+    """Run a hashing function in the pool, refusing work past HASH_MAX_PENDING"""
+    global _pending
+    if _pending >= HASH_MAX_PENDING:
+        raise PoolSaturated()
+
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the hashing pool"""
+    return await _run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the hashing pool"""
+    return await _run(get_password_hash, password)
+
+async def verify_unknown_user_async(plain_password: str) -> bool:
+    """
+    Verify a password for an email with no account against a throwaway hash,
+    so the response takes as long as a wrong password and does not reveal
+    which emails are registered. Always False.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await get_password_hash_async(secrets.token_urlsafe(16))
+    await verify_password_async(plain_password, _dummy_hash)
+    return False
+
+def shutdown_pool():
+    """Stop the worker processes (called on app shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,143 @@
+"""
+Latest market prices for marking open positions to market.
+
+A PriceSource returns prices for the symbols it knows. There is no market
+data service, so the default is a FilePriceSource over TRADETRACKER_PRICE_FILE
+(CSV `symbol,price` or JSON `{"NVDA": 181.2}`, re-read when it changes), and
+StaticPriceSource is the in-memory stand-in. Every lookup goes through one
+process-wide PriceCache, so all users holding a symbol share one fetch per
+PRICE_TTL_SECONDS. Symbols are looked up upper-case, as trades and fills
+store them.
+"""
+from datetime import datetime
+from typing import Optional, NamedTuple
+import csv
+import json
+import os
+import threading
+import time
+
+PRICE_FILE = os.getenv("TRADETRACKER_PRICE_FILE")
+
+# How long a fetched price is served before the next fetch
+PRICE_TTL_SECONDS = float(os.getenv("TRADETRACKER_PRICE_TTL", "60"))
+
+# Longest a request waits on another request's in-flight fetch
+FETCH_WAIT_SECONDS = 10
+
+class PriceSourceError(Exception):
+    """The source could not be read; cached prices are kept"""
+
+class Quote(NamedTuple):
+    price: Optional[float]  # None when the source has no price for the symbol
+    as_of: datetime
+
+class PriceSource:
+    """Interface for price providers"""
+
+    def fetch(self, symbols) -> dict:
+        """{symbol: price} for the requested symbols the source knows"""
+        raise NotImplementedError
+
+class StaticPriceSource(PriceSource):
+    """Fixed in-memory prices (stand-in for development and tests)"""
+
+    def __init__(self, prices: Optional[dict] = None):
+        self.prices = {symbol.upper(): price for symbol, price in (prices or {}).items()}
+
+    def fetch(self, symbols) -> dict:
+        return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+class FilePriceSource(PriceSource):
+    """Prices from a local CSV (symbol,price) or JSON ({symbol: price}) file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._prices = {}
+
+    def _load(self) -> dict:
+        if self.path.endswith(".json"):
+            with open(self.path) as f:
+                return {symbol.upper(): float(price) for symbol, price in json.load(f).items()}
+        with open(self.path, newline="") as f:
+            return {row["symbol"].strip().upper(): float(row["price"]) for row in csv.DictReader(f)}
+
+    def fetch(self, symbols) -> dict:
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime != self._mtime:
+                self._prices, self._mtime = self._load(), mtime
+        except (OSError, ValueError, KeyError) as e:
+            raise PriceSourceError(f"Cannot read prices from {self.path}: {e}")
+        return {symbol: self._prices[symbol] for symbol in symbols if symbol in self._prices}
+
+class PriceCache:
+    """
+    Thread-safe TTL cache in front of a PriceSource. Misses are fetched in one
+    batch, and concurrent misses for a symbol wait on the in-flight fetch
+    instead of fetching it again.
+    """
+
+    def __init__(self, source: PriceSource, ttl: float = PRICE_TTL_SECONDS):
+        self.source = source
+        self.ttl = ttl
+        self._quotes = {}  # symbol -> (Quote, monotonic fetch time)
+        self._inflight = {}  # symbol -> threading.Event
+        self._lock = threading.Lock()
+
+    def _cached(self, symbol: str) -> Optional[Quote]:
+        entry = self._quotes.get(symbol)
+        return entry[0] if entry else None
+
+    def get_many(self, symbols) -> dict:
+        """{symbol: Quote or None}, None if the symbol has never been priced"""
+        requested = {symbol: symbol.upper() for symbol in symbols}
+        now = time.monotonic()
+        result, to_fetch, to_wait = {}, [], []
+        with self._lock:
+            for symbol in set(requested.values()):
+                entry = self._quotes.get(symbol)
+                if entry is not None and now - entry[1] < self.ttl:
+                    result[symbol] = entry[0]
+                elif symbol in self._inflight:
+                    to_wait.append((symbol, self._inflight[symbol]))
+                else:
+                    self._inflight[symbol] = threading.Event()
+                    to_fetch.append(symbol)
+
+        if to_fetch:
+            fetched = None
+            try:
+                fetched = self.source.fetch(to_fetch)
+            except PriceSourceError:
+                pass  # Serve whatever was cached before
+            finally:
+                # Always release waiters, even if the source blew up
+                with self._lock:
+                    as_of, stamp = datetime.utcnow(), time.monotonic()
+                    for symbol in to_fetch:
+                        if fetched is not None:
+                            self._quotes[symbol] = (Quote(fetched.get(symbol), as_of), stamp)
+                        result[symbol] = self._cached(symbol)
+                        self._inflight.pop(symbol).set()
+
+        for symbol, event in to_wait:
+            event.wait(FETCH_WAIT_SECONDS)
+            with self._lock:
+                result[symbol] = self._cached(symbol)
+        return {symbol: result[key] for symbol, key in requested.items()}
+
+    def clear(self):
+        with self._lock:
+            self._quotes.clear()
+
+def default_source() -> PriceSource:
+    return FilePriceSource(PRICE_FILE) if PRICE_FILE else StaticPriceSource()
+
+price_cache = PriceCache(default_source())
+
+def set_source(source: PriceSource):
+    """Swap the process-wide price source (drops cached prices)"""
+    price_cache.source = source
+    price_cache.clear()
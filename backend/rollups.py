@@ -0,0 +1,146 @@
+"""
+Daily P&L rollup (models.DailyPnl) maintenance.
+
+Routes recompute only the dates a change touched, *after* the change is
+flushed. For existing databases or to check for drift, run from backend/:
+
+    python -m rollups rebuild [--user ID]
+    python -m rollups verify [--user ID]
+"""
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+import argparse
+import models
+import fx
+
+# Max dates per IN (...) clause, stays under SQLite's variable limit
+CHUNK_SIZE = 500
+
+VALUE_COLUMNS = ("realized_pl", "trade_count", "wins", "losses", "deposits", "deposit_count")
+
+def _chunks(items, size: int = CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def compute_days(db: Session, user_id: int, days=None) -> dict:
+    """Aggregate raw trades/deposits per date (all dates, or only `days`) in the base currency"""
+    pl = models.Trade.profit_loss
+    trades = db.query(
+        models.Trade.exit_date,
+        models.Trade.currency,
+        func.sum(pl),
+        func.count(models.Trade.id),
+        func.sum(case((pl > 0, 1), else_=0)),
+        func.sum(case((pl < 0, 1), else_=0)),
+    ).filter(
+        models.Trade.user_id == user_id,
+        models.Trade.exit_date.isnot(None),
+        pl.isnot(None),
+    ).group_by(models.Trade.exit_date, models.Trade.currency)
+
+    deposits = db.query(
+        models.Deposit.deposit_date,
+        models.Deposit.currency,
+        func.sum(models.Deposit.amount),
+        func.count(models.Deposit.id),
+    ).filter(models.Deposit.user_id == user_id).group_by(models.Deposit.deposit_date, models.Deposit.currency)
+
+    if days is None:
+        trade_rows, deposit_rows = trades.all(), deposits.all()
+    else:
+        trade_rows, deposit_rows = [], []
+        for chunk in _chunks(days):
+            trade_rows += trades.filter(models.Trade.exit_date.in_(chunk)).all()
+            deposit_rows += deposits.filter(models.Deposit.deposit_date.in_(chunk)).all()
+
+    # One group per (date, currency), converted together
+    trade_rates = fx.factors(db, user_id, [row[1] for row in trade_rows], [row[0] for row in trade_rows])
+    deposit_rates = fx.factors(db, user_id, [row[1] for row in deposit_rows], [row[0] for row in deposit_rows])
+
+    result = {}
+    for (day, _, realized_pl, trade_count, wins, losses), rate in zip(trade_rows, trade_rates.tolist()):
+        totals = result.setdefault(day, dict.fromkeys(VALUE_COLUMNS, 0))
+        totals["realized_pl"] += realized_pl * rate
+        totals["trade_count"] += trade_count
+        totals["wins"] += wins
+        totals["losses"] += losses
+    for (day, _, amount, deposit_count), rate in zip(deposit_rows, deposit_rates.tolist()):
+        totals = result.setdefault(day, dict.fromkeys(VALUE_COLUMNS, 0))
+        totals["deposits"] += amount * rate
+        totals["deposit_count"] += deposit_count
+    return result
+
+def _write(db: Session, user_id: int, computed: dict):
+    if computed:
+        db.execute(models.DailyPnl.__table__.insert(), [
+            {"user_id": user_id, "date": day, **values} for day, values in computed.items()
+        ])
+
+def recompute_days(db: Session, user_id: int, days):
+    """Recompute the rollup rows for the given dates (None entries are ignored)"""
+    days = {day for day in days if day is not None}
+    if not days:
+        return
+
+    for chunk in _chunks(days):
+        db.query(models.DailyPnl).filter(
+            models.DailyPnl.user_id == user_id,
+            models.DailyPnl.date.in_(chunk)
+        ).delete(synchronize_session=False)
+    _write(db, user_id, compute_days(db, user_id, days))
+
+def rebuild_user(db: Session, user_id: int):
+    """Recompute every rollup row for a user"""
+    db.query(models.DailyPnl).filter(models.DailyPnl.user_id == user_id).delete(synchronize_session=False)
+    _write(db, user_id, compute_days(db, user_id))
+
+def verify_user(db: Session, user_id: int, tolerance: float = 1e-6) -> list:
+    """Dates where the stored rollup differs from the raw tables"""
+    expected = compute_days(db, user_id)
+    stored = {
+        row.date: {col: getattr(row, col) for col in VALUE_COLUMNS}
+        for row in db.query(models.DailyPnl).filter(models.DailyPnl.user_id == user_id)
+    }
+
+    mismatched = []
+    for day in sorted(expected.keys() | stored.keys()):
+        want, have = expected.get(day), stored.get(day)
+        if want is None or have is None or any(abs(want[col] - have[col]) > tolerance for col in VALUE_COLUMNS):
+            mismatched.append(day)
+    return mismatched
+
+def main():
+    from database import SessionLocal, user_session
+
+    parser = argparse.ArgumentParser(description="Rebuild or verify the daily P&L rollup")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    parser.add_argument("--user", type=int, help="Only this user id (default: all users)")
+    args = parser.parse_args()
+
+    with SessionLocal() as directory:
+        user_ids = [args.user] if args.user else [uid for (uid,) in directory.query(models.User.id)]
+
+    bad_users = 0
+    for user_id in user_ids:
+        db = user_session(user_id)
+        try:
+            if args.command == "rebuild":
+                rebuild_user(db, user_id)
+                db.commit()
+                print(f"user {user_id}: rebuilt")
+            else:
+                mismatched = verify_user(db, user_id)
+                if mismatched:
+                    bad_users += 1
+                    print(f"user {user_id}: {len(mismatched)} mismatched dates, first {mismatched[0]}")
+                else:
+                    print(f"user {user_id}: ok")
+        finally:
+            db.close()
+
+    if bad_users:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
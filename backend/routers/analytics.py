@@ -0,0 +1,232 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, TypeAdapter
+from typing import List, Literal, Optional
+from datetime import date
+from database import get_db, run
+from routers.trades import TradeResponse, TRADE_FIELDS, normalize_symbol
+import models
+import auth
+import analytics
+import stats
+import caching
+
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
+
+# Pydantic schemas
+class EquityPoint(BaseModel):
+    date: date
+    realized_pl: float
+    deposits: float
+    trades: int
+    cumulative_pl: float
+    cumulative_deposits: float
+    account_value: float
+    drawdown: float
+    drawdown_pct: float
+    drawdown_days: int
+    win_rate: float
+
+class EquityCurveResponse(BaseModel):
+    interval: str
+    points: List[EquityPoint]
+    max_drawdown: float
+    max_drawdown_pct: float
+    max_drawdown_days: int
+    current_drawdown: float
+
+class BreakdownRow(BaseModel):
+    period: str
+    realized_pl: float
+    deposits: float
+    trades: int
+    wins: int
+    losses: int
+    win_rate: float
+
+class SymbolAnalytics(BaseModel):
+    symbol: str
+    trade_count: int
+    open_trades: int
+    closed_trades: int
+    wins: int
+    losses: int
+    win_rate: float
+    total_pl: float
+    avg_pl: float
+    avg_holding_days: Optional[float]
+    best_trade_id: Optional[int]
+    best_pl: Optional[float]
+    worst_trade_id: Optional[int]
+    worst_pl: Optional[float]
+
+class SymbolAnalyticsResponse(BaseModel):
+    symbols: List[SymbolAnalytics]  # By total P&L, highest first
+    best: List[TradeResponse]  # Top N closed trades by P&L
+    worst: List[TradeResponse]  # Bottom N, worst first
+
+class RMultiples(BaseModel):
+    trades: int  # Closed trades with a stop price
+    expectancy: Optional[float]  # Mean R per trade
+    median: Optional[float]
+    total: float
+    best: Optional[float]
+    worst: Optional[float]
+
+class HoldingBucket(BaseModel):
+    label: str
+    min_days: int
+    max_days: Optional[int]
+    trades: int
+    win_rate: float
+    avg_pl: float
+
+class HoldingPeriods(BaseModel):
+    mean: Optional[float]
+    p25: Optional[float]
+    median: Optional[float]
+    p75: Optional[float]
+    p90: Optional[float]
+    max: Optional[int]
+    buckets: List[HoldingBucket]
+
+class RiskResponse(BaseModel):
+    trades: int
+    wins: int
+    losses: int
+    win_rate: float
+    net_pl: float
+    gross_profit: float
+    gross_loss: float
+    expectancy: float  # Mean P&L per closed trade
+    profit_factor: Optional[float]  # None without losing trades
+    avg_win: float
+    avg_loss: float
+    payoff_ratio: Optional[float]
+    r_multiples: RMultiples
+    sharpe: Optional[float]  # Annualized, daily returns on account value
+    sortino: Optional[float]
+    return_days: int
+    longest_win_streak: int
+    longest_loss_streak: int
+    current_streak: int  # Positive: wins in a row, negative: losses
+    holding: HoldingPeriods
+
+EquityCurveAdapter = TypeAdapter(EquityCurveResponse)
+BreakdownList = TypeAdapter(List[BreakdownRow])
+SymbolAnalyticsAdapter = TypeAdapter(SymbolAnalyticsResponse)
+RiskAdapter = TypeAdapter(RiskResponse)
+
+def equity_curve_response(db: Session, request: Request, user_id: int, interval: str, window: int):
+    """The equity curve as a cached/conditional response"""
+    conditional = caching.ConditionalGet(request, db, user_id)
+    if conditional.hit:
+        return conditional.hit
+
+    stats.get_user_stats(db, user_id)  # Backfills the rollup on first use
+    db.commit()
+    curve = analytics.equity_curve(analytics.load_daily(db, user_id), interval, window)
+    return conditional.respond(EquityCurveAdapter, curve)
+
+@router.get("/equity-curve", response_model=EquityCurveResponse)
+async def get_equity_curve(
+    request: Request,
+    interval: Literal["day", "week", "month"] = "day",
+    window: int = Query(20, ge=1, le=1000),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get cumulative P&L, account value, drawdown and rolling win rate over time"""
+    return await run(db, equity_curve_response, request, current_user.id, interval, window)
+
+def breakdown_response(db: Session, request: Request, user_id: int, period: str,
+                       date_from: Optional[date], date_to: Optional[date]):
+    """Period breakdown rows as a cached/conditional response"""
+    conditional = caching.ConditionalGet(request, db, user_id)
+    if conditional.hit:
+        return conditional.hit
+
+    stats.get_user_stats(db, user_id)
+    db.commit()
+    rows = analytics.breakdown(db, user_id, period, date_from, date_to)
+    return conditional.respond(BreakdownList, rows)
+
+@router.get("/breakdown", response_model=List[BreakdownRow])
+async def get_breakdown(
+    request: Request,
+    period: Literal["month", "year"] = "month",
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get realized P&L, deposits and win rate per month or year"""
+    return await run(db, breakdown_response, request, current_user.id, period, date_from, date_to)
+
+def symbols_response(db: Session, request: Request, user_id: int, top: int):
+    """Per-symbol statistics and best/worst trades as a cached/conditional response"""
+    conditional = caching.ConditionalGet(request, db, user_id)
+    if conditional.hit:
+        return conditional.hit
+
+    stats.get_user_stats(db, user_id)
+    stats.refresh_extremes(db, user_id)
+    db.commit()
+
+    rows = db.query(models.SymbolStats).filter(
+        models.SymbolStats.user_id == user_id,
+        models.SymbolStats.trade_count > 0
+    ).order_by(models.SymbolStats.total_pl.desc()).all()
+
+    # Both ends of ix_trades_user_pl, `top` rows each
+    pl = models.Trade.profit_loss
+    closed = db.query(*(getattr(models.Trade, name) for name in TRADE_FIELDS)).filter(
+        models.Trade.user_id == user_id,
+        pl.isnot(None)
+    )
+    best = closed.order_by(pl.desc(), models.Trade.id.desc()).limit(top).all()
+    worst = closed.order_by(pl, models.Trade.id).limit(top).all()
+
+    return conditional.respond(SymbolAnalyticsAdapter, {
+        "symbols": [stats.symbol_summary(row) for row in rows],
+        "best": [dict(zip(TRADE_FIELDS, trade)) for trade in best],
+        "worst": [dict(zip(TRADE_FIELDS, trade)) for trade in worst],
+    })
+
+@router.get("/symbols", response_model=SymbolAnalyticsResponse)
+async def get_symbol_analytics(
+    request: Request,
+    top: int = Query(5, ge=0, le=100, description="Best and worst trades to return"),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get per-symbol statistics and the best/worst trades from the maintained aggregates"""
+    return await run(db, symbols_response, request, current_user.id, top)
+
+def risk_response(db: Session, request: Request, user_id: int, date_from: Optional[date],
+                  date_to: Optional[date], symbol: Optional[str]):
+    """Risk metrics of closed trades as a cached/conditional response"""
+    conditional = caching.ConditionalGet(request, db, user_id)
+    if conditional.hit:
+        return conditional.hit
+
+    stats.get_user_stats(db, user_id)  # Account values come from the daily rollup
+    db.commit()
+    trades = analytics.load_risk_trades(db, user_id, date_from, date_to, symbol)
+    metrics = analytics.risk_metrics(trades, analytics.load_daily(db, user_id))
+    return conditional.respond(RiskAdapter, metrics)
+
+@router.get("/risk", response_model=RiskResponse)
+async def get_risk(
+    request: Request,
+    date_from: Optional[date] = Query(None, alias="from", description="First exit date"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last exit date"),
+    symbol: Optional[str] = None,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get expectancy, profit factor, R-multiples, Sharpe/Sortino, streaks and holding periods of closed trades"""
+    return await run(
+        db, risk_response, request, current_user.id, date_from, date_to,
+        normalize_symbol(symbol) if symbol else None,
+    )
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from pydantic import BaseModel, EmailStr
-from database import get_db
+from pydantic import BaseModel, EmailStr, Field
+from database import get_db, run, SessionLocal
+from routers.trades import CURRENCY_PATTERN
 import models
 import auth
+import passwords
+import stats
+import rollups
+import caching
+import fx
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
@@ -16,53 +24,150 @@ class UserRegister(BaseModel):
 class UserResponse(BaseModel):
     id: int
     email: str
+    base_currency: str
     
     class Config:
         from_attributes = True
 
+class UserUpdate(BaseModel):
+    base_currency: str = Field(..., pattern=CURRENCY_PATTERN)
+
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+def pool_saturated() -> HTTPException:
+    """503 returned when the password hashing pool is full"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+def email_taken() -> HTTPException:
+    """400 returned when registering an email that already has an account"""
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+
+# The async routes below only await the hashing pool, their queries run through
+# database.run() so they never block the event loop
+
+def find_user(db: Session, email: str):
+    """A user by email, None if not registered"""
+    return db.query(models.User).filter(models.User.email == email).first()
+
+def create_user(db: Session, email: str, hashed_password: str):
+    """Insert and commit a new user, None if the email was registered meanwhile"""
+    user = models.User(email=email, hashed_password=hashed_password)
+    db.add(user)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent registration won the unique email index while we were hashing
+        db.rollback()
+        return None
+    db.refresh(user)
+    return user
+
+def store_password_hash(user_id: int, hashed_password: str):
+    """Replace a user's stored hash in its own session"""
+    db = SessionLocal()
+    try:
+        db.query(models.User).filter(models.User.id == user_id).update({"hashed_password": hashed_password})
+        db.commit()
+    finally:
+        db.close()
+
+async def rehash_password(user_id: int, password: str):
+    """Upgrade a stored hash to the current scheme/parameters (runs after the response)"""
+    try:
+        new_hash = await passwords.get_password_hash_async(password)
+    except passwords.PoolSaturated:
+        return  # Try again on the next login
+    await run_in_threadpool(store_password_hash, user_id, new_hash)
+
 @router.post("/register", response_model=Token)
-def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     """Register a new user"""
-    # Check if user already exists
-    existing_user = db.query(models.User).filter(models.User.email == user_data.email).first()
+    # Check if user already exists (cheap early answer, create_user has the final say)
+    existing_user = await run(db, find_user, user_data.email)
     if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
+        raise email_taken()
     
-    # Create new user
-    hashed_password = auth.get_password_hash(user_data.password)
-    new_user = models.User(email=user_data.email, hashed_password=hashed_password)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    # Create new user (hashing runs in the worker pool)
+    try:
+        hashed_password = await passwords.get_password_hash_async(user_data.password)
+    except passwords.PoolSaturated:
+        raise pool_saturated()
+    new_user = await run(db, create_user, user_data.email, hashed_password)
+    if new_user is None:
+        raise email_taken()
     
     # Create access token
-    access_token = auth.create_access_token(data={"sub": new_user.email})
+    access_token = auth.create_user_token(new_user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(
+    background_tasks: BackgroundTasks,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db)
+):
     """Login and get access token"""
     # Find user
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    user = await run(db, find_user, form_data.username)
+    try:
+        if user is None:
+            valid = await passwords.verify_unknown_user_async(form_data.password)
+        else:
+            valid = await passwords.verify_password_async(form_data.password, user.hashed_password)
+    except passwords.PoolSaturated:
+        raise pool_saturated()
+    
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Transparently upgrade outdated hashes off the request path
+    if passwords.needs_rehash(user.hashed_password):
+        background_tasks.add_task(rehash_password, user.id, form_data.password)
+    
     # Create access token
-    access_token = auth.create_access_token(data={"sub": user.email})
+    access_token = auth.create_user_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: models.User = Depends(auth.get_current_user)):
+async def get_me(
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
     """Get current user info"""
-    return current_user
\ No newline at end of file
+    return await run(db, lambda db: db.get(models.User, current_user.id))
+
+def change_base_currency(db: Session, user_id: int, base_currency: str) -> models.User:
+    """Switch a user's base currency, re-converting their aggregates and rollup"""
+    if not fx.rate_table(db).has(base_currency):
+        raise HTTPException(status_code=400, detail=f"No FX rates loaded for {base_currency}")
+    
+    user = db.get(models.User, user_id)
+    if user.base_currency != base_currency:
+        user.base_currency = base_currency
+        db.flush()
+        stats.rebuild_user_stats(db, user.id)
+        rollups.rebuild_user(db, user.id)
+        caching.bump(db, user.id, "trades", "deposits")
+        db.commit()
+        db.refresh(user)
+    
+    return user
+
+@router.patch("/me", response_model=UserResponse)
+async def update_me(
+    user_data: UserUpdate,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Change the base currency, re-converting the user's aggregates and rollup"""
+    return await run(db, change_base_currency, current_user.id, user_data.base_currency)
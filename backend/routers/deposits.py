@@ -1,23 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal, Union, Annotated
 from datetime import date, datetime
-from database import get_db
+from types import SimpleNamespace
+from database import get_db, run
+from routers.trades import CURRENCY_PATTERN, parse_fields
 import models
 import auth
+import stats
+import rollups
+import caching
+import events
 
 router = APIRouter(prefix="/api/deposits", tags=["Deposits"])
 
 # Pydantic schemas
 class DepositCreate(BaseModel):
     amount: float
+    currency: str = Field("USD", pattern=CURRENCY_PATTERN)
     deposit_date: date
     notes: Optional[str] = None
 
 class DepositResponse(BaseModel):
     id: int
     amount: float
+    currency: str
     deposit_date: date
     notes: Optional[str]
     created_at: datetime
@@ -25,53 +34,211 @@ class DepositResponse(BaseModel):
     class Config:
         from_attributes = True
 
-@router.post("/", response_model=DepositResponse, status_code=status.HTTP_201_CREATED)
-def create_deposit(
-    deposit_data: DepositCreate,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Create a new deposit"""
+# Fields the list endpoint can return (?fields=)
+DEPOSIT_FIELDS = list(DepositResponse.model_fields)
+
+class DepositUpdate(BaseModel):
+    amount: Optional[float] = None
+    currency: Optional[str] = Field(None, pattern=CURRENCY_PATTERN)
+    deposit_date: Optional[date] = None
+    notes: Optional[str] = None
+
+# Max operations per batch request
+MAX_BATCH_SIZE = 1000
+
+class DepositCreateOp(BaseModel):
+    op: Literal["create"]
+    deposit: DepositCreate
+
+class DepositUpdateOp(BaseModel):
+    op: Literal["update"]
+    id: int
+    deposit: DepositUpdate
+
+class DepositDeleteOp(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+DepositOperation = Annotated[Union[DepositCreateOp, DepositUpdateOp, DepositDeleteOp], Field(discriminator="op")]
+
+class DepositBatch(BaseModel):
+    operations: List[DepositOperation] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class DepositBatchResult(BaseModel):
+    op: str
+    id: int
+    deposit: Optional[DepositResponse] = None  # None for deletes
+
+    class Config:
+        from_attributes = True
+
+def deposit_event(deposit) -> dict:
+    """JSON-ready DepositResponse payload for events"""
+    return DepositResponse.model_validate(deposit).model_dump(mode="json")
+
+def add_deposit(db: Session, user_id: int, deposit_data: DepositCreate) -> models.Deposit:
+    """Insert a deposit with its aggregates, rollup day and version bump, commit and publish it"""
     new_deposit = models.Deposit(
-        user_id=current_user.id,
+        user_id=user_id,
         amount=deposit_data.amount,
+        currency=deposit_data.currency,
         deposit_date=deposit_data.deposit_date,
         notes=deposit_data.notes
     )
     
+    # Update aggregates in the same transaction
+    stats.apply_deposit(db, new_deposit)
+    
     db.add(new_deposit)
+    db.flush()
+    rollups.recompute_days(db, user_id, [new_deposit.deposit_date])
+    caching.bump(db, user_id, "deposits")
     db.commit()
     db.refresh(new_deposit)
+    events.publish_change(db, user_id, "deposit.created", deposit_event(new_deposit))
     
     return new_deposit
 
-@router.get("/", response_model=List[DepositResponse])
-def get_deposits(
-    current_user: models.User = Depends(auth.get_current_user),
+@router.post("/", response_model=DepositResponse, status_code=status.HTTP_201_CREATED)
+async def create_deposit(
+    deposit_data: DepositCreate,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all deposits for current user"""
-    deposits = db.query(models.Deposit).filter(
-        models.Deposit.user_id == current_user.id
+    """Create a new deposit"""
+    return await run(db, add_deposit, current_user.id, deposit_data)
+
+def list_deposits(db: Session, request: Request, user_id: int, names: list):
+    """All of a user's deposits as a cached/conditional response"""
+    conditional = caching.ConditionalGet(request, db, user_id)
+    if conditional.hit:
+        return conditional.hit
+
+    rows = db.query(*(getattr(models.Deposit, name) for name in names)).filter(
+        models.Deposit.user_id == user_id
     ).order_by(models.Deposit.deposit_date.desc()).all()
-    return deposits
+    return conditional.respond_rows(names, rows)
 
-@router.delete("/{deposit_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_deposit(
-    deposit_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
+@router.get("/", response_model=List[DepositResponse])
+async def get_deposits(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. to leave out notes"),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a deposit"""
+    """Get all deposits for current user"""
+    names = parse_fields(fields, DEPOSIT_FIELDS)
+    return await run(db, list_deposits, request, current_user.id, names)
+
+def remove_deposit(db: Session, user_id: int, deposit_id: int):
+    """Delete a deposit and its contribution to aggregates and rollups, commit and publish it"""
     deposit = db.query(models.Deposit).filter(
         models.Deposit.id == deposit_id,
-        models.Deposit.user_id == current_user.id
+        models.Deposit.user_id == user_id
     ).first()
     
     if not deposit:
         raise HTTPException(status_code=404, detail="Deposit not found")
     
+    stats.apply_deposit(db, deposit, -1)
     db.delete(deposit)
+    db.flush()
+    rollups.recompute_days(db, user_id, [deposit.deposit_date])
+    caching.bump(db, user_id, "deposits")
     db.commit()
-    
-    return None
\ No newline at end of file
+    events.publish_change(db, user_id, "deposit.deleted", {"id": deposit_id})
+
+@router.delete("/{deposit_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_deposit(
+    deposit_id: int,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete a deposit"""
+    await run(db, remove_deposit, current_user.id, deposit_id)
+    return None
+
+def load_batch_targets(db: Session, user_id: int, operations) -> dict:
+    """Load the deposits targeted by update/delete operations as plain rows, keyed by id"""
+    ids = [operation.id for operation in operations if operation.op != "create"]
+    if len(ids) != len(set(ids)):
+        raise HTTPException(status_code=400, detail="A deposit can only appear in one operation per batch")
+    if not ids:
+        return {}
+
+    table = models.Deposit.__table__
+    rows = db.execute(select(table).where(table.c.user_id == user_id, table.c.id.in_(ids))).mappings()
+    existing = {row["id"]: SimpleNamespace(**row) for row in rows}
+
+    missing = [deposit_id for deposit_id in ids if deposit_id not in existing]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Deposit {missing[0]} not found")
+    return existing
+
+def apply_deposit_batch(db: Session, user_id: int, batch: DepositBatch) -> list:
+    """Apply a batch in the session's transaction and commit it, results in operation order"""
+    table = models.Deposit.__table__
+    existing = load_batch_targets(db, user_id, batch.operations)
+
+    # Remove the old contribution of every touched deposit before anything changes
+    stats.apply_deposits(db, user_id, existing.values(), -1)
+    days = {deposit.deposit_date for deposit in existing.values()}
+
+    results, created, updated, deleted = [], [], [], []
+    for operation in batch.operations:
+        if operation.op == "create":
+            deposit = SimpleNamespace(user_id=user_id, **operation.deposit.dict())
+            created.append(deposit)
+        elif operation.op == "update":
+            deposit = existing[operation.id]
+            for field, value in operation.deposit.dict(exclude_unset=True).items():
+                setattr(deposit, field, value)
+            updated.append(deposit)
+        else:
+            deposit = None
+            deleted.append(operation.id)
+
+        if deposit is not None:
+            days.add(deposit.deposit_date)
+        results.append((operation, deposit))
+
+    # One executemany per kind of operation, inserts first so freed ids are not reused
+    if created:
+        rows = db.execute(
+            table.insert().returning(table.c.id, table.c.created_at, sort_by_parameter_order=True),
+            [vars(deposit) for deposit in created]
+        ).all()
+        for deposit, (deposit_id, created_at) in zip(created, rows):
+            deposit.id, deposit.created_at = deposit_id, created_at
+    if deleted:
+        db.execute(table.delete().where(table.c.user_id == user_id, table.c.id.in_(deleted)))
+    if updated:
+        db.execute(update(models.Deposit), [vars(deposit) for deposit in updated])
+
+    stats.apply_deposits(db, user_id, created + updated)
+    rollups.recompute_days(db, user_id, days)
+    caching.bump(db, user_id, "deposits")
+    db.commit()
+    events.publish_change(db, user_id, "deposits.batch", {
+        "created": [deposit_event(deposit) for deposit in created],
+        "updated": [deposit_event(deposit) for deposit in updated],
+        "deleted": deleted,
+    })
+
+    return [
+        {"op": operation.op, "id": deposit.id if deposit else operation.id, "deposit": deposit}
+        for operation, deposit in results
+    ]
+
+@router.post("/batch", response_model=List[DepositBatchResult])
+async def batch_deposits(
+    batch: DepositBatch,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Create, update and delete many deposits in one transaction.
+    Results are returned in operation order; if any operation targets a
+    missing deposit, nothing is applied.
+    """
+    return await run(db, apply_deposit_batch, current_user.id, batch)
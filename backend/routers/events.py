@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+from typing import Optional
+from database import SessionLocal
+import auth
+import events
+
+router = APIRouter(prefix="/api/events", tags=["Events"])
+
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
+
+def get_stream_user(
+    token: Optional[str] = Query(None, description="Access token, for EventSource which cannot send headers"),
+    bearer: Optional[str] = Depends(optional_oauth2_scheme)
+) -> auth.CurrentUser:
+    """
+    auth.get_current_user with a query-string fallback. Uses its own session
+    so no pooled connection stays checked out for the life of the stream.
+    """
+    db = SessionLocal()
+    try:
+        return auth.authenticate(bearer or token or "", db)
+    finally:
+        db.close()
+
+@router.get("/")
+async def get_events(current_user: auth.CurrentUser = Depends(get_stream_user)):
+    """Stream the user's change events (Server-Sent Events)"""
+    return StreamingResponse(
+        events.stream(current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,151 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from typing import Optional, Literal
+from datetime import date
+import csv
+import heapq
+import io
+import orjson
+from database import user_session
+import models
+import auth
+import fx
+from routers.trades import parse_fields
+
+router = APIRouter(prefix="/api/trades", tags=["Trades"])
+
+# Rows fetched from the cursor (and written to the response) at a time
+CHUNK_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    "type", "date", "id", "symbol", "entry_date", "exit_date", "entry_price", "exit_price",
+    "shares", "stop_price", "total_cost", "brokerage_fee", "profit_loss", "profit_loss_percent",
+    "amount", "currency", "notes", "running_realized_pl",
+]
+
+def trade_rows(db, user_id: int, date_from: Optional[date], date_to: Optional[date], with_notes: bool = True):
+    """Yield trades in ledger order (exit date, or entry date while open)"""
+    ledger_date = func.coalesce(models.Trade.exit_date, models.Trade.entry_date)
+    columns = [
+        ledger_date.label("date"), models.Trade.id, models.Trade.symbol,
+        models.Trade.entry_date, models.Trade.exit_date, models.Trade.entry_price,
+        models.Trade.exit_price, models.Trade.shares, models.Trade.stop_price, models.Trade.total_cost,
+        models.Trade.brokerage_fee, models.Trade.profit_loss,
+        models.Trade.profit_loss_percent, models.Trade.currency,
+    ]
+    if with_notes:
+        columns.append(models.Trade.notes)
+    query = db.query(*columns).filter(models.Trade.user_id == user_id)
+
+    if date_from:
+        query = query.filter(ledger_date >= date_from)
+    if date_to:
+        query = query.filter(ledger_date <= date_to)
+
+    for row in query.order_by(ledger_date, models.Trade.id).yield_per(CHUNK_SIZE):
+        yield (row.date, 1, row.id), dict(row._mapping, type="trade")
+
+def deposit_rows(db, user_id: int, date_from: Optional[date], date_to: Optional[date], with_notes: bool = True):
+    """Yield deposits in date order"""
+    columns = [
+        models.Deposit.deposit_date.label("date"), models.Deposit.id,
+        models.Deposit.amount, models.Deposit.currency,
+    ]
+    if with_notes:
+        columns.append(models.Deposit.notes)
+    query = db.query(*columns).filter(models.Deposit.user_id == user_id)
+
+    if date_from:
+        query = query.filter(models.Deposit.deposit_date >= date_from)
+    if date_to:
+        query = query.filter(models.Deposit.deposit_date <= date_to)
+
+    for row in query.order_by(models.Deposit.deposit_date, models.Deposit.id).yield_per(CHUNK_SIZE):
+        yield (row.date, 0, row.id), dict(row._mapping, type="deposit")
+
+def ledger(user_id: int, date_from: Optional[date], date_to: Optional[date], with_notes: bool = True):
+    """
+    Merge trades and deposits into one date-ordered stream with a running
+    realized P&L in the user's base currency. Opens its own session because
+    it outlives the request handler.
+    """
+    db = user_session(user_id)
+    try:
+        base = fx.base_currency(db, user_id)
+        rates = None
+        running_pl = 0.0
+        merged = heapq.merge(
+            deposit_rows(db, user_id, date_from, date_to, with_notes),
+            trade_rows(db, user_id, date_from, date_to, with_notes),
+            key=lambda item: item[0],
+        )
+        for _, row in merged:
+            pl = row.get("profit_loss") or 0
+            if pl and row["currency"] != base:
+                rates = rates or fx.rate_table(db)
+                pl *= float(rates.factors([row["currency"]], fx.day_numbers([row["date"]]), base)[0])
+            running_pl += pl
+            row["running_realized_pl"] = running_pl
+            yield row
+    finally:
+        db.close()
+
+def ledger_size(db, user_id: int, date_from: Optional[date], date_to: Optional[date]) -> int:
+    """Rows ledger() yields for the same range"""
+    ledger_date = func.coalesce(models.Trade.exit_date, models.Trade.entry_date)
+    trades = db.query(func.count(models.Trade.id)).filter(models.Trade.user_id == user_id)
+    deposits = db.query(func.count(models.Deposit.id)).filter(models.Deposit.user_id == user_id)
+    if date_from:
+        trades = trades.filter(ledger_date >= date_from)
+        deposits = deposits.filter(models.Deposit.deposit_date >= date_from)
+    if date_to:
+        trades = trades.filter(ledger_date <= date_to)
+        deposits = deposits.filter(models.Deposit.deposit_date <= date_to)
+    return trades.scalar() + deposits.scalar()
+
+def stream_csv(rows, columns: list = EXPORT_COLUMNS):
+    """Encode ledger rows as CSV, one chunk of rows per yield"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def stream_ndjson(rows, columns: list = EXPORT_COLUMNS):
+    """Encode ledger rows as newline-delimited JSON, one chunk of rows per yield"""
+    chunk = []
+    for row in rows:
+        chunk.append(orjson.dumps({col: row.get(col) for col in columns}))
+        if len(chunk) >= CHUNK_SIZE:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+@router.get("/export")
+async def export_trades(
+    format: Literal["csv", "ndjson"] = "csv",
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to export, e.g. to leave out notes"),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+):
+    """Stream trades and deposits as CSV or NDJSON with a running realized P&L"""
+    columns = parse_fields(fields, EXPORT_COLUMNS)
+    rows = ledger(current_user.id, date_from, date_to, with_notes="notes" in columns)
+
+    if format == "ndjson":
+        body, media_type = stream_ndjson(rows, columns), "application/x-ndjson"
+    else:
+        body, media_type = stream_csv(rows, columns), "text/csv"
+
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="trades-export.{format}"',
+    })
@@ -0,0 +1,162 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from datetime import datetime
+from database import get_db, run
+from routers.trades import CURRENCY_PATTERN, Symbol, normalize_symbol
+import models
+import auth
+import lots
+import caching
+import events
+
+router = APIRouter(prefix="/api/fills", tags=["Fills"])
+
+# Pydantic schemas
+class FillCreate(BaseModel):
+    symbol: Symbol
+    side: Literal["buy", "sell"]
+    quantity: float = Field(..., gt=0)
+    price: float = Field(..., gt=0)
+    fee: float = Field(0, ge=0)
+    currency: str = Field("USD", pattern=CURRENCY_PATTERN)
+    executed_at: datetime
+    method: Literal["fifo", "lifo", "specific"] = "fifo"  # Sells only
+    lot_id: Optional[int] = None  # Buy fill closed by a "specific" sell
+
+class FillResponse(BaseModel):
+    id: int
+    symbol: str
+    side: str
+    quantity: float
+    price: float
+    fee: float
+    currency: str
+    executed_at: datetime
+    method: Optional[str]
+    lot_id: Optional[int]
+    remaining: Optional[float]
+
+    class Config:
+        from_attributes = True
+
+class LotResponse(BaseModel):
+    id: int
+    symbol: str
+    executed_at: datetime
+    price: float
+    quantity: float
+    remaining: float
+    cost_basis: float  # Remaining shares at cost, including their share of the buy fee
+
+def record_fill(db: Session, user_id: int, fill_data: FillCreate) -> models.Fill:
+    """Insert and match a fill, commit and publish it"""
+    is_sell = fill_data.side == "sell"
+    fill = models.Fill(
+        user_id=user_id,
+        symbol=fill_data.symbol,
+        side=fill_data.side,
+        quantity=fill_data.quantity,
+        price=fill_data.price,
+        fee=fill_data.fee,
+        currency=fill_data.currency,
+        executed_at=fill_data.executed_at,
+        method=fill_data.method if is_sell else None,
+        lot_id=fill_data.lot_id if is_sell and fill_data.method == "specific" else None,
+    )
+
+    try:
+        lots.add_fill(db, fill)
+    except lots.LotError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    caching.bump(db, user_id, "trades")
+    db.commit()
+    db.refresh(fill)
+    events.publish_change(db, user_id, "trades.changed", {"source": "fills"})
+
+    return fill
+
+@router.post("/", response_model=FillResponse, status_code=status.HTTP_201_CREATED)
+async def create_fill(
+    fill_data: FillCreate,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Record a buy or sell fill and match it into trades"""
+    if fill_data.side == "sell" and fill_data.method == "specific" and fill_data.lot_id is None:
+        raise HTTPException(status_code=400, detail="Specific-lot sells need a lot_id")
+
+    return await run(db, record_fill, current_user.id, fill_data)
+
+def list_fills(db: Session, user_id: int, symbol: Optional[str]) -> list:
+    """A user's fills, newest first"""
+    query = db.query(models.Fill).filter(models.Fill.user_id == user_id)
+    if symbol:
+        query = query.filter(models.Fill.symbol == normalize_symbol(symbol))
+    return query.order_by(models.Fill.executed_at.desc(), models.Fill.id.desc()).all()
+
+@router.get("/", response_model=List[FillResponse])
+async def get_fills(
+    symbol: Optional[str] = None,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get fills for current user, newest first"""
+    return await run(db, list_fills, current_user.id, symbol)
+
+def list_open_lots(db: Session, user_id: int, symbol: Optional[str]) -> list:
+    """A user's open lots with their cost basis, oldest first"""
+    query = db.query(models.Fill).filter(models.Fill.user_id == user_id, lots.OPEN_LOT)
+    if symbol:
+        query = query.filter(models.Fill.symbol == normalize_symbol(symbol))
+
+    return [
+        {
+            "id": lot.id, "symbol": lot.symbol, "executed_at": lot.executed_at,
+            "price": lot.price, "quantity": lot.quantity, "remaining": lot.remaining,
+            "cost_basis": lot.remaining * lot.price + lot.fee * lot.remaining / lot.quantity,
+        }
+        for lot in query.order_by(models.Fill.symbol, models.Fill.executed_at, models.Fill.id)
+    ]
+
+@router.get("/lots", response_model=List[LotResponse])
+async def get_open_lots(
+    symbol: Optional[str] = None,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get open lots with their cost basis, oldest first"""
+    return await run(db, list_open_lots, current_user.id, symbol)
+
+def remove_fill(db: Session, user_id: int, fill_id: int):
+    """Delete a fill, re-match its symbol, commit and publish it"""
+    fill = db.query(models.Fill).filter(
+        models.Fill.id == fill_id,
+        models.Fill.user_id == user_id
+    ).first()
+
+    if not fill:
+        raise HTTPException(status_code=404, detail="Fill not found")
+
+    try:
+        lots.delete_fill(db, fill)
+    except lots.LotError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    caching.bump(db, user_id, "trades")
+    db.commit()
+    events.publish_change(db, user_id, "trades.changed", {"source": "fills"})
+
+@router.delete("/{fill_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_fill(
+    fill_id: int,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete a fill and re-match its symbol"""
+    await run(db, remove_fill, current_user.id, fill_id)
+    return None
@@ -0,0 +1,323 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional
+from datetime import datetime, date, time
+from types import SimpleNamespace
+import codecs
+import csv
+import os
+import sqlite3
+import tempfile
+from database import user_session
+from routers.trades import TradeCreate, calculate_trade_metrics
+from routers.fills import FillCreate
+import models
+import lots
+import auth
+import stats
+import rollups
+import caching
+import events
+
+router = APIRouter(prefix="/api/trades", tags=["Trades"])
+
+# Rows per executemany INSERT
+BATCH_SIZE = 1000
+
+# Only the first errors are reported back, the rest are just counted
+MAX_REPORTED_ERRORS = 1000
+
+# Normalized CSV header -> TradeCreate field (TradeCreate names + Stake export names).
+# Stake's trading activity export has one buy or sell per row:
+#   Trade Date,Settlement Date,Symbol,Side,Units,Avg. Price,Value,Fees,GST,Total Value,Currency,AUD/USD rate
+# so a "side" column makes the rows fills (see import_fills), dated by entry_date.
+HEADER_ALIASES = {
+    "symbol": "symbol", "code": "symbol", "ticker": "symbol",
+    "entry_date": "entry_date", "buy_date": "entry_date", "open_date": "entry_date", "trade_date": "entry_date",
+    "exit_date": "exit_date", "sell_date": "exit_date", "close_date": "exit_date",
+    "entry_price": "entry_price", "buy_price": "entry_price", "avg_buy_price": "entry_price", "avg_price": "entry_price",
+    "exit_price": "exit_price", "sell_price": "exit_price", "avg_sell_price": "exit_price",
+    "shares": "shares", "units": "shares", "quantity": "shares", "qty": "shares",
+    "stop_price": "stop_price", "stop": "stop_price", "stop_loss": "stop_price",
+    "brokerage_fee": "brokerage_fee", "brokerage": "brokerage_fee", "fees": "brokerage_fee", "fee": "brokerage_fee",
+    "notes": "notes", "comment": "notes", "comments": "notes",
+    "currency": "currency", "ccy": "currency",
+    "side": "side",
+}
+
+REQUIRED_FIELDS = ("symbol", "entry_date", "entry_price", "shares")
+
+# Pydantic schemas
+class RowError(BaseModel):
+    row: int
+    errors: List[str]
+
+class ImportResponse(BaseModel):
+    imported: int
+    failed: int
+    errors: List[RowError]
+
+def normalize_header(header: str) -> Optional[str]:
+    """Map a CSV header like 'Avg Buy Price' or 'Avg. Price' to a TradeCreate field"""
+    key = header.strip().lower().replace(" ", "_").replace("-", "_")
+    for char in "()./":
+        key = key.replace(char, "")
+    return HEADER_ALIASES.get(key)
+
+def clean_value(field: str, value: str):
+    """Turn a raw CSV cell into something TradeCreate can validate"""
+    value = value.strip()
+    if value == "":
+        return None
+
+    if field in ("entry_date", "exit_date"):
+        # Stake exports use DD/MM/YYYY, everything else should be ISO
+        for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                pass
+        return value  # Let TradeCreate report it
+
+    if field in ("entry_price", "exit_price", "shares", "stop_price", "brokerage_fee"):
+        return value.replace("$", "").replace(",", "")
+
+    return value
+
+def build_trade(user_id: int, trade_data: TradeCreate) -> SimpleNamespace:
+    """Build a lightweight trade row (no ORM instance) with metrics calculated"""
+    trade = SimpleNamespace(user_id=user_id, **trade_data.dict())
+    calculate_trade_metrics(trade)
+    return trade
+
+def read_headers(reader) -> list:
+    """Map the header row to TradeCreate fields, rejecting files without the required columns"""
+    try:
+        headers = [normalize_header(h) for h in next(reader)]
+    except StopIteration:
+        raise HTTPException(status_code=400, detail="CSV file is empty")
+
+    missing = [f for f in REQUIRED_FIELDS if f not in headers]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(missing)}")
+    return headers
+
+def import_rows(db: Session, user_id: int, headers: list, rows) -> dict:
+    """
+    Insert (line number, cells) rows as trades in batches inside the caller's
+    transaction, invalid rows are skipped and reported by line number.
+    """
+    # Make sure aggregates exist before any rows land, so they are only updated by delta
+    stats.get_user_stats(db, user_id)
+    if "side" in headers:
+        return import_fills(db, user_id, headers, rows)
+
+    imported, failed, errors, batch = 0, 0, [], []
+    exit_dates = set()
+
+    def flush_batch():
+        db.execute(models.Trade.__table__.insert(), [vars(trade) for trade in batch])
+        stats.apply_trades(db, user_id, batch)
+        exit_dates.update(trade.exit_date for trade in batch)
+        batch.clear()
+
+    for line_num, cells in rows:
+        if not any(cell.strip() for cell in cells):
+            continue
+
+        row = {field: clean_value(field, cell) for field, cell in zip(headers, cells) if field}
+        try:
+            batch.append(build_trade(user_id, TradeCreate(**row)))
+        except ValidationError as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(row_error(line_num, e))
+            continue
+
+        imported += 1
+        if len(batch) >= BATCH_SIZE:
+            flush_batch()
+
+    if batch:
+        flush_batch()
+    rollups.recompute_days(db, user_id, exit_dates)
+    caching.bump(db, user_id, "trades")
+
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+def row_error(line_num: int, error: ValidationError) -> dict:
+    """RowError for a row that failed validation"""
+    return {
+        "row": line_num,
+        "errors": [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in error.errors()],
+    }
+
+class FillSpool:
+    """
+    Validated fill rows spilled to a temporary SQLite file, so a file of any
+    size is grouped by symbol and sorted by date on disk, not in memory.
+    Within a timestamp a day's buys come before its sells, then file order.
+    """
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix="fills-", suffix=".db")
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            "CREATE TABLE fills (symbol TEXT, executed_at TEXT, is_sell INTEGER, line INTEGER,"
+            " quantity REAL, price REAL, fee REAL, currency TEXT)"
+        )
+        self.count = 0
+        self._sorted = False
+
+    def add(self, rows: list):
+        """Spill [(line number, FillCreate)]"""
+        self.conn.executemany("INSERT INTO fills VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+            (fill.symbol, fill.executed_at.isoformat(), fill.side == "sell", line_num,
+             fill.quantity, fill.price, fill.fee, fill.currency)
+            for line_num, fill in rows
+        ])
+        self.count += len(rows)
+
+    def _sort(self):
+        if not self._sorted:
+            self.conn.execute("CREATE INDEX ix_order ON fills (symbol, executed_at, is_sell, line)")
+            self._sorted = True
+
+    def symbols(self) -> list:
+        self._sort()
+        return [symbol for (symbol,) in self.conn.execute("SELECT DISTINCT symbol FROM fills ORDER BY symbol")]
+
+    def fills(self, user_id: int, symbol: str):
+        """A symbol's fills in execution order, as lots.add_fills input carrying their `line`"""
+        self._sort()
+        cursor = self.conn.execute(
+            "SELECT executed_at, is_sell, line, quantity, price, fee, currency FROM fills"
+            " WHERE symbol = ? ORDER BY executed_at, is_sell, line", (symbol,)
+        )
+        for executed_at, is_sell, line_num, quantity, price, fee, currency in cursor:
+            yield SimpleNamespace(
+                user_id=user_id, symbol=symbol, side="sell" if is_sell else "buy",
+                quantity=quantity, price=price, fee=fee, currency=currency,
+                executed_at=datetime.fromisoformat(executed_at),
+                method="fifo" if is_sell else None, lot_id=None, line=line_num,
+            )
+
+    def close(self):
+        self.conn.close()
+        os.remove(self.path)
+
+def spool_fills(headers: list, rows) -> tuple:
+    """
+    Validate rows with a side column into a FillSpool, BATCH_SIZE at a time.
+    Returns (spool, failed, errors); the caller closes the spool.
+    """
+    spool, failed, errors, batch = FillSpool(), 0, [], []
+    try:
+        for line_num, cells in rows:
+            if not any(cell.strip() for cell in cells):
+                continue
+
+            row = {field: clean_value(field, cell) for field, cell in zip(headers, cells) if field}
+            executed = row.get("entry_date")
+            try:
+                fill_data = FillCreate(
+                    symbol=row.get("symbol"),
+                    side=(row.get("side") or "").lower(),
+                    quantity=row.get("shares"),
+                    price=row.get("entry_price"),
+                    fee=row.get("brokerage_fee") or 0,
+                    currency=row.get("currency") or "USD",
+                    executed_at=datetime.combine(executed, time()) if isinstance(executed, date) else executed,
+                )
+            except ValidationError as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(row_error(line_num, e))
+                continue
+
+            batch.append((line_num, fill_data))
+            if len(batch) >= BATCH_SIZE:
+                spool.add(batch)
+                batch.clear()
+        spool.add(batch)
+    except BaseException:
+        spool.close()
+        raise
+    return spool, failed, errors
+
+def import_symbol_fills(db: Session, user_id: int, spool: FillSpool, symbol: str) -> int:
+    """Match one symbol's spooled fills into trades (lots.add_fills), naming the row of an unmatched sell"""
+    try:
+        return lots.add_fills(db, user_id, symbol, spool.fills(user_id, symbol))
+    except lots.LotError as e:
+        if e.fill is not None:
+            raise lots.LotError(f"Row {e.fill.line}: {e}")
+        raise
+
+def import_fills(db: Session, user_id: int, headers: list, rows) -> dict:
+    """
+    Match rows with a side column (one buy or sell each) into trades, symbol
+    by symbol in date order with a day's buys before its sells, since broker
+    exports usually list the newest first. Rows are sorted through a
+    FillSpool on disk and written in batches, so memory stays flat. Invalid
+    rows are skipped and reported; a sell the earlier rows cannot cover
+    raises lots.LotError naming its line, as the file's history is then
+    incomplete.
+    """
+    spool, failed, errors = spool_fills(headers, rows)
+    try:
+        for symbol in spool.symbols():
+            import_symbol_fills(db, user_id, spool, symbol)
+        imported = spool.count
+    finally:
+        spool.close()
+    caching.bump(db, user_id, "trades")
+
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+def numbered_rows(reader):
+    """(line number, cells) for each remaining record of a csv.reader"""
+    for cells in reader:
+        yield reader.line_num, cells
+
+def import_trades_csv(db: Session, user_id: int, lines) -> dict:
+    """Stream CSV lines into the trades table inside the caller's transaction"""
+    reader = csv.reader(lines)
+    headers = read_headers(reader)
+    return import_rows(db, user_id, headers, numbered_rows(reader))
+
+def import_upload(user_id: int, file: UploadFile) -> dict:
+    """Import an uploaded CSV for a user in one transaction of its own session, and publish it"""
+    db = user_session(user_id)
+    try:
+        lines = codecs.iterdecode(file.file, "utf-8-sig")
+        try:
+            result = import_trades_csv(db, user_id, lines)
+        except UnicodeDecodeError:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+        except lots.LotError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+
+        db.commit()
+        events.publish_change(db, user_id, "trades.changed", {"source": "import"})
+        return result
+    finally:
+        db.close()
+
+@router.post("/import", response_model=ImportResponse)
+async def import_trades(
+    file: UploadFile = File(...),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+):
+    """
+    Import trades from a broker CSV export in a single transaction. Files
+    with a side column (Stake's activity export) are imported as fills
+    """
+    # Parsing and validating every row is CPU work, so it stays on the
+    # threadpool (with a sync session) even with the asyncio engine
+    return await run_in_threadpool(import_upload, current_user.id, file)
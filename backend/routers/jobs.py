@@ -0,0 +1,193 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import Optional, List, Literal, Any
+from datetime import date, datetime
+import csv
+import os
+import shutil
+import tempfile
+from database import get_db, run
+from routers.exports import EXPORT_COLUMNS
+from routers.imports import read_headers
+from routers.trades import parse_fields
+import models
+import auth
+import jobs
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+# Jobs listed by GET /api/jobs, newest first
+LIST_LIMIT = 50
+
+# Pydantic schemas
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    done: int
+    total: Optional[int]
+    result: Optional[Any]
+    error: Optional[str]
+    cancel_requested: bool
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+class RecalculateRequest(BaseModel):
+    brokerage_fee: Optional[float] = None  # Set on every trade not derived from fills before recalculating
+
+def get_job(db: Session, user_id: int, job_id: int) -> models.Job:
+    job = db.query(models.Job).filter(models.Job.id == job_id, models.Job.user_id == user_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def start(db: Session, job: models.Job) -> dict:
+    db.commit()
+    jobs.runner.submit(job.user_id, job.id)
+    return jobs.describe(job)
+
+def spool_upload(file: UploadFile) -> str:
+    """
+    Copy an upload to a temporary file in JOB_DIR and check its header row,
+    before its job takes the write lock. Returns the file's path.
+    """
+    os.makedirs(jobs.JOB_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=jobs.JOB_DIR, prefix="upload-", suffix=".csv")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(file.file, f)
+        # Reject a file without the required columns now rather than as a failed job
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            read_headers(csv.reader(f))
+    except UnicodeDecodeError:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def queue_import(db: Session, user_id: int, filename: str, path: str) -> dict:
+    """Queue the import of a spooled upload, which becomes the job's spool file"""
+    job = jobs.create_job(db, user_id, "import", {"filename": filename})
+    db.commit()
+    os.replace(path, jobs.spool_path(user_id, job.id))
+    return start(db, job)
+
+@router.post("/import", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def start_import(
+    file: UploadFile = File(...),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Import a broker CSV in the background, in committed chunks (see POST /api/trades/import)"""
+    path = await run_in_threadpool(spool_upload, file)
+    try:
+        return await run(db, queue_import, current_user.id, file.filename, path)
+    finally:
+        if os.path.exists(path):  # Not queued
+            os.remove(path)
+
+def queue_job(db: Session, user_id: int, kind: str, params: dict) -> dict:
+    """Create, commit and submit a job"""
+    return start(db, jobs.create_job(db, user_id, kind, params))
+
+@router.post("/recalculate", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def start_recalculate(
+    request: RecalculateRequest,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Recompute cost and P&L of every trade, and the stats and rollups built
+    from them. A new fee skips fill-derived trades (result["skipped"])
+    """
+    return await run(db, queue_job, current_user.id, "recalculate", request.model_dump())
+
+@router.post("/export", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def start_export(
+    format: Literal["csv", "ndjson"] = "csv",
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to export"),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Write the GET /api/trades/export ledger to a file, fetched from /api/jobs/{id}/download"""
+    return await run(db, queue_job, current_user.id, "export", {
+        "format": format,
+        "from": date_from.isoformat() if date_from else None,
+        "to": date_to.isoformat() if date_to else None,
+        "columns": parse_fields(fields, EXPORT_COLUMNS),
+    })
+
+def recent_jobs(db: Session, user_id: int) -> list:
+    """The user's LIST_LIMIT most recent jobs, described"""
+    rows = db.query(models.Job).filter(models.Job.user_id == user_id).order_by(
+        models.Job.id.desc()
+    ).limit(LIST_LIMIT).all()
+    return [jobs.describe(job) for job in rows]
+
+@router.get("/", response_model=List[JobResponse])
+async def list_jobs(
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The user's most recent jobs"""
+    return await run(db, recent_jobs, current_user.id)
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job_status(
+    job_id: int,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Progress (done of total rows) and, once finished, the result or error"""
+    return await run(db, lambda db: jobs.describe(get_job(db, current_user.id, job_id)))
+
+@router.get("/{job_id}/download")
+async def download_export(
+    job_id: int,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The file of a finished export job"""
+    job = await run(db, lambda db: jobs.describe(get_job(db, current_user.id, job_id)))
+    if job["kind"] != "export" or job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail="Only finished export jobs have a download")
+    format = job["result"]["format"]
+    path = jobs.export_path(current_user.id, job_id, format)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export file no longer exists")
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return FileResponse(path, media_type=media_type, filename=f"trades-export.{format}")
+
+def cancel_or_delete(db: Session, user_id: int, job_id: int):
+    """Flag an active job for cancellation, or delete a finished one and its export file"""
+    job = get_job(db, user_id, job_id)
+    if job.status in jobs.ACTIVE_STATUSES:
+        job.cancel_requested = 1
+    else:
+        if job.kind == "export" and job.result:
+            path = jobs.export_path(user_id, job.id, jobs.describe(job)["result"]["format"])
+            if os.path.exists(path):
+                os.remove(path)
+        db.delete(job)
+    db.commit()
+
+@router.delete("/{job_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_or_delete_job(
+    job_id: int,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Cancel a queued or running job (it stops after its current chunk, which
+    stays committed), or delete a finished job and its export file
+    """
+    await run(db, cancel_or_delete, current_user.id, job_id)
+    return None
@@ -0,0 +1,98 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import date, datetime
+from database import get_db, run
+import models
+import auth
+import prices
+import fx
+
+router = APIRouter(prefix="/api/positions", tags=["Positions"])
+
+# Pydantic schemas
+class PositionResponse(BaseModel):
+    trade_id: int
+    symbol: str
+    currency: str
+    entry_date: date
+    entry_price: float
+    shares: float
+    total_cost: float
+    brokerage_fee: Optional[float]
+    price: Optional[float]  # None when no price is available
+    price_as_of: Optional[datetime]
+    market_value: Optional[float]
+    unrealized_pl: Optional[float]  # Net of brokerage, like realized P&L
+    unrealized_pl_percent: Optional[float]
+
+class PositionsResponse(BaseModel):
+    base_currency: str
+    positions: List[PositionResponse]
+    # Totals in the base currency at today's FX rate, priced positions only
+    total_cost: float
+    market_value: float
+    unrealized_pl: float
+    unpriced: int
+    unconverted: List[str]  # Currencies without a rate today, their positions are left out of the totals
+
+def mark_positions(db: Session, user_id: int) -> dict:
+    """A user's open trades marked to market, with totals in the base currency"""
+    trades = db.query(
+        models.Trade.id, models.Trade.symbol, models.Trade.currency, models.Trade.entry_date,
+        models.Trade.entry_price, models.Trade.shares, models.Trade.total_cost, models.Trade.brokerage_fee,
+    ).filter(
+        models.Trade.user_id == user_id,
+        models.Trade.exit_price.is_(None)
+    ).order_by(models.Trade.symbol, models.Trade.entry_date, models.Trade.id).all()
+
+    # One cache lookup for all symbols, shared with every other user
+    quotes = prices.price_cache.get_many(trade.symbol for trade in trades)
+    # Per currency, so one without rates only leaves its own positions unconverted
+    rates = {}
+    for currency in sorted({trade.currency for trade in trades}):
+        try:
+            rates[currency] = fx.factors(db, user_id, [currency], [date.today()])[0]
+        except fx.FxError:
+            rates[currency] = None
+
+    positions = []
+    totals = {"total_cost": 0.0, "market_value": 0.0, "unrealized_pl": 0.0, "unpriced": 0}
+    for trade in trades:
+        rate = rates[trade.currency]
+        quote = quotes.get(trade.symbol)
+        position = {
+            "trade_id": trade.id, "symbol": trade.symbol, "currency": trade.currency,
+            "entry_date": trade.entry_date, "entry_price": trade.entry_price, "shares": trade.shares,
+            "total_cost": trade.total_cost, "brokerage_fee": trade.brokerage_fee,
+            "price": None, "price_as_of": None,
+            "market_value": None, "unrealized_pl": None, "unrealized_pl_percent": None,
+        }
+        if quote is not None and quote.price is not None:
+            market_value = quote.price * trade.shares
+            unrealized = market_value - trade.total_cost - (trade.brokerage_fee or 0)
+            position.update(
+                price=quote.price, price_as_of=quote.as_of, market_value=market_value, unrealized_pl=unrealized,
+                unrealized_pl_percent=(unrealized / trade.total_cost) * 100 if trade.total_cost > 0 else 0,
+            )
+            if rate is not None:
+                totals["total_cost"] += trade.total_cost * rate
+                totals["market_value"] += market_value * rate
+                totals["unrealized_pl"] += unrealized * rate
+        else:
+            totals["unpriced"] += 1
+        positions.append(position)
+
+    return {
+        "base_currency": fx.base_currency(db, user_id), "positions": positions, **totals,
+        "unconverted": [currency for currency, rate in rates.items() if rate is None],
+    }
+
+@router.get("/", response_model=PositionsResponse)
+async def get_positions(
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Mark open trades to market with the shared price cache"""
+    return await run(db, mark_positions, current_user.id)
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, TypeAdapter
+from typing import List
+from database import get_db, run
+from routers.trades import TradeResponse, TRADE_FIELDS
+import models
+import auth
+import search
+import caching
+
+router = APIRouter(prefix="/api/trades", tags=["Trades"])
+
+# Pydantic schemas
+class SearchResult(BaseModel):
+    trade: TradeResponse
+    snippet: str  # HTML-escaped notes excerpt, matches wrapped in <mark>
+    rank: float  # bm25, lower is a better match
+
+SearchResults = TypeAdapter(List[SearchResult])
+
+def search_response(db: Session, request: Request, user_id: int, q: str, limit: int, offset: int):
+    """Matching trades with snippets as a cached/conditional response"""
+    conditional = caching.ConditionalGet(request, db, user_id)
+    if conditional.hit:
+        return conditional.hit
+
+    hits = search.search_trades(db, user_id, q, limit, offset)
+
+    rows = db.query(*(getattr(models.Trade, name) for name in TRADE_FIELDS)).filter(
+        models.Trade.user_id == user_id,
+        models.Trade.id.in_([trade_id for trade_id, _, _ in hits])
+    ).all()
+    trades = {row.id: dict(zip(TRADE_FIELDS, row)) for row in rows}
+
+    return conditional.respond(SearchResults, [
+        {"trade": trades[trade_id], "snippet": snippet, "rank": rank}
+        for trade_id, snippet, rank in hits if trade_id in trades
+    ])
+
+@router.get("/search", response_model=List[SearchResult])
+async def search_trades(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in notes or symbols (prefixes match)"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Search the current user's trade notes and symbols, best match first"""
+    return await run(db, search_response, request, current_user.id, q, limit, offset)
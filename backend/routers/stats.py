@@ -0,0 +1,86 @@
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, TypeAdapter
+from typing import List
+from database import get_db, run
+import models
+import auth
+import stats
+import caching
+
+router = APIRouter(prefix="/api/stats", tags=["Stats"])
+
+# Pydantic schemas
+class SummaryResponse(BaseModel):
+    total_deposited: float
+    deposit_count: int
+    total_pl: float
+    account_value: float
+    roi: float
+    total_trades: int
+    open_trades: int
+    closed_trades: int
+    wins: int
+    losses: int
+    win_rate: float
+    avg_win: float
+    avg_loss: float
+
+class SymbolStatsResponse(BaseModel):
+    symbol: str
+    trade_count: int
+    open_trades: int
+    closed_trades: int
+    wins: int
+    losses: int
+    total_pl: float
+
+    class Config:
+        from_attributes = True
+
+SummaryAdapter = TypeAdapter(SummaryResponse)
+SymbolStatsList = TypeAdapter(List[SymbolStatsResponse])
+
+def summary_response(db: Session, request: Request, user_id: int):
+    """The summary as a cached/conditional response"""
+    conditional = caching.ConditionalGet(request, db, user_id)
+    if conditional.hit:
+        return conditional.hit
+
+    summary = stats.summary(stats.get_user_stats(db, user_id))
+    db.commit()  # Persist the aggregate row if it was built on this request
+
+    return conditional.respond(SummaryAdapter, summary)
+
+@router.get("/summary", response_model=SummaryResponse)
+async def get_summary(
+    request: Request,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get portfolio summary from the user's aggregate row"""
+    return await run(db, summary_response, request, current_user.id)
+
+def by_symbol_response(db: Session, request: Request, user_id: int):
+    """Per-symbol aggregates as a cached/conditional response"""
+    conditional = caching.ConditionalGet(request, db, user_id)
+    if conditional.hit:
+        return conditional.hit
+
+    stats.get_user_stats(db, user_id)
+    db.commit()
+
+    rows = db.query(models.SymbolStats).filter(
+        models.SymbolStats.user_id == user_id,
+        models.SymbolStats.trade_count > 0
+    ).order_by(models.SymbolStats.total_pl.desc()).all()
+    return conditional.respond(SymbolStatsList, rows)
+
+@router.get("/by-symbol", response_model=List[SymbolStatsResponse])
+async def get_stats_by_symbol(
+    request: Request,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get P&L breakdown by ticker symbol"""
+    return await run(db, by_symbol_response, request, current_user.id)
@@ -1,34 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import or_, tuple_, select, update
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Optional, List, Literal, Union, Annotated
 from datetime import date
-from database import get_db
+from types import SimpleNamespace
+import base64
+import json
+from database import get_db, run
 import models
 import auth
+import stats
+import rollups
+import caching
+import events
 
 router = APIRouter(prefix="/api/trades", tags=["Trades"])
 
+# ISO 4217 code, e.g. USD or AUD
+CURRENCY_PATTERN = r"^[A-Z]{3}$"
+
+# Ticker as stored: "aapl " and "AAPL" are one symbol (aggregates, lots, prices)
+Symbol = Annotated[str, StringConstraints(strip_whitespace=True, to_upper=True)]
+
+def normalize_symbol(symbol: str) -> str:
+    """A symbol filter in its stored form"""
+    return symbol.strip().upper()
+
 # Pydantic schemas
 class TradeCreate(BaseModel):
-    symbol: str
+    symbol: Symbol
     entry_date: date
     exit_date: Optional[date] = None
     entry_price: float
     exit_price: Optional[float] = None
     shares: float
+    stop_price: Optional[float] = None
     notes: Optional[str] = None
     brokerage_fee: Optional[float] = None
+    currency: str = Field("USD", pattern=CURRENCY_PATTERN)
 
 class TradeUpdate(BaseModel):
-    symbol: Optional[str] = None
+    symbol: Optional[Symbol] = None
     entry_date: Optional[date] = None
     exit_date: Optional[date] = None
     entry_price: Optional[float] = None
     exit_price: Optional[float] = None
     shares: Optional[float] = None
+    stop_price: Optional[float] = None
     notes: Optional[str] = None
     brokerage_fee: Optional[float] = None
+    currency: Optional[str] = Field(None, pattern=CURRENCY_PATTERN)
 
 class TradeResponse(BaseModel):
     id: int
@@ -38,15 +60,59 @@ class TradeResponse(BaseModel):
     entry_price: float
     exit_price: Optional[float]
     shares: float
+    stop_price: Optional[float]
     total_cost: Optional[float]
     profit_loss: Optional[float]
     profit_loss_percent: Optional[float]
     notes: Optional[str]
     brokerage_fee: Optional[float]
+    currency: str
     
     class Config:
         from_attributes = True
 
+# Fields the list endpoint can return (?fields=)
+TRADE_FIELDS = list(TradeResponse.model_fields)
+
+def parse_fields(fields: Optional[str], names: list) -> list:
+    """Fields picked from `names` with ?fields=a,b (default all), in the order of `names`"""
+    if not fields:
+        return names
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(names)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [name for name in names if name in requested]
+
+# Max operations per batch request
+MAX_BATCH_SIZE = 1000
+
+class TradeCreateOp(BaseModel):
+    op: Literal["create"]
+    trade: TradeCreate
+
+class TradeUpdateOp(BaseModel):
+    op: Literal["update"]
+    id: int
+    trade: TradeUpdate
+
+class TradeDeleteOp(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+TradeOperation = Annotated[Union[TradeCreateOp, TradeUpdateOp, TradeDeleteOp], Field(discriminator="op")]
+
+class TradeBatch(BaseModel):
+    operations: List[TradeOperation] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class TradeBatchResult(BaseModel):
+    op: str
+    id: int
+    trade: Optional[TradeResponse] = None  # None for deletes
+
+    class Config:
+        from_attributes = True
+
 def calculate_trade_metrics(trade: models.Trade):
     """Calculate total cost, P&L, and P&L percentage for a trade"""
     trade.total_cost = trade.entry_price * trade.shares
@@ -67,46 +133,172 @@ def calculate_trade_metrics(trade: models.Trade):
         trade.profit_loss = None
         trade.profit_loss_percent = None
 
-@router.post("/", response_model=TradeResponse, status_code=status.HTTP_201_CREATED)
-def create_trade(
-    trade_data: TradeCreate,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Create a new trade"""
+# Columns the list endpoint can sort on (every TradeResponse field)
+SortColumn = Literal[
+    "id", "symbol", "entry_date", "exit_date", "entry_price", "exit_price", "shares", "stop_price",
+    "total_cost", "profit_loss", "profit_loss_percent", "notes", "brokerage_fee", "currency",
+]
+
+def trade_event(trade) -> dict:
+    """JSON-ready TradeResponse payload for events"""
+    return TradeResponse.model_validate(trade).model_dump(mode="json")
+
+def encode_cursor(sort_by: str, order: str, value, trade_id: int) -> str:
+    """Encode the position after a trade as an opaque cursor string"""
+    if isinstance(value, date):
+        value = value.isoformat()
+    raw = json.dumps([sort_by, order, value, trade_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str, sort_by: str, order: str):
+    """Decode a cursor into (value, id), rejecting cursors from a different sort"""
+    try:
+        cursor_sort, cursor_order, value, trade_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if value is not None and getattr(models.Trade, sort_by).type.python_type is date:
+            value = date.fromisoformat(value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if (cursor_sort, cursor_order) != (sort_by, order):
+        raise HTTPException(status_code=400, detail="Cursor does not match sort order")
+    return value, trade_id
+
+def filter_trades(query, user_id: int, symbol=None, date_from=None, date_to=None,
+                  trade_status=None, pnl=None):
+    """Apply the list filters shared by the trade listing endpoints"""
+    query = query.filter(models.Trade.user_id == user_id)
+
+    if symbol:
+        query = query.filter(models.Trade.symbol == normalize_symbol(symbol))
+    if date_from:
+        query = query.filter(models.Trade.entry_date >= date_from)
+    if date_to:
+        query = query.filter(models.Trade.entry_date <= date_to)
+    if trade_status == "open":
+        query = query.filter(models.Trade.exit_price.is_(None))
+    elif trade_status == "closed":
+        query = query.filter(models.Trade.exit_price.isnot(None))
+    if pnl == "positive":
+        query = query.filter(models.Trade.profit_loss > 0)
+    elif pnl == "negative":
+        query = query.filter(models.Trade.profit_loss < 0)
+    elif pnl == "zero":
+        query = query.filter(models.Trade.profit_loss == 0)
+
+    return query
+
+def paginate_trades(query, sort_by: str, order: str, cursor: Optional[str] = None):
+    """Order by (sort column, id), NULLs last, and seek past the cursor"""
+    column = getattr(models.Trade, sort_by)
+    nullable = models.Trade.__table__.c[sort_by].nullable
+    descending = order == "desc"
+
+    if cursor:
+        value, trade_id = decode_cursor(cursor, sort_by, order)
+        if value is None:
+            # Already inside the trailing NULL block, only the id decides
+            id_after = models.Trade.id < trade_id if descending else models.Trade.id > trade_id
+            query = query.filter(column.is_(None), id_after)
+        else:
+            key, after = tuple_(column, models.Trade.id), tuple_(value, trade_id)
+            seek = key < after if descending else key > after
+            query = query.filter(or_(column.is_(None), seek) if nullable else seek)
+
+    direction = (lambda c: c.desc()) if descending else (lambda c: c.asc())
+    ordering = [direction(column), direction(models.Trade.id)]
+    if nullable:
+        ordering.insert(0, column.is_(None))
+    return query.order_by(*ordering)
+
+# Route bodies are sync ORM code run through database.run(), on the asyncio
+# engine's greenlet or in the threadpool depending on TRADETRACKER_ASYNC_DB
+
+def add_trade(db: Session, user_id: int, trade_data: TradeCreate) -> models.Trade:
+    """Insert a trade with its aggregates, rollup days and version bump, commit and publish it"""
     new_trade = models.Trade(
-        user_id=current_user.id,
+        user_id=user_id,
         **trade_data.dict()
     )
     
     # Calculate metrics
     calculate_trade_metrics(new_trade)
     
+    # Update aggregates in the same transaction
+    stats.apply_trade(db, new_trade)
+    
     db.add(new_trade)
+    db.flush()
+    rollups.recompute_days(db, user_id, [new_trade.exit_date])
+    caching.bump(db, user_id, "trades")
     db.commit()
     db.refresh(new_trade)
+    events.publish_change(db, user_id, "trade.created", trade_event(new_trade))
     
     return new_trade
 
-@router.get("/", response_model=List[TradeResponse])
-def get_trades(
-    current_user: models.User = Depends(auth.get_current_user),
+@router.post("/", response_model=TradeResponse, status_code=status.HTTP_201_CREATED)
+async def create_trade(
+    trade_data: TradeCreate,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all trades for current user"""
-    trades = db.query(models.Trade).filter(models.Trade.user_id == current_user.id).all()
-    return trades
+    """Create a new trade"""
+    return await run(db, add_trade, current_user.id, trade_data)
 
-@router.get("/{trade_id}", response_model=TradeResponse)
-def get_trade(
-    trade_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
+def list_trades(db: Session, request: Request, user_id: int, names: list, limit: int, cursor: Optional[str],
+                sort_by: str, order: str, **filters):
+    """A page of trades as a cached/conditional response (see get_trades)"""
+    conditional = caching.ConditionalGet(request, db, user_id)
+    if conditional.hit:
+        return conditional.hit
+
+    # Plain column rows, not ORM instances; the cursor's columns ride along unreturned
+    selected = names + [name for name in ("id", sort_by) if name not in names]
+    query = filter_trades(db.query(*(getattr(models.Trade, name) for name in selected)), user_id, **filters)
+    query = paginate_trades(query, sort_by, order, cursor)
+    rows = query.limit(limit + 1).all()
+
+    # Fetched one extra row to know whether another page exists
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        headers["X-Next-Cursor"] = encode_cursor(sort_by, order, getattr(last, sort_by), last.id)
+
+    return conditional.respond_rows(names, rows, headers)
+
+@router.get("/", response_model=List[TradeResponse])
+async def get_trades(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort_by: SortColumn = "entry_date",
+    order: Literal["asc", "desc"] = "desc",
+    symbol: Optional[str] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    trade_status: Optional[Literal["open", "closed"]] = Query(None, alias="status"),
+    pnl: Optional[Literal["positive", "negative", "zero"]] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. to leave out notes"),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get a specific trade"""
+    """
+    Get a page of trades for current user.
+    Pages are keyed on (sort column, id); pass the X-Next-Cursor header of
+    one response as `cursor` to fetch the next page.
+    """
+    names = parse_fields(fields, TRADE_FIELDS)
+    return await run(
+        db, list_trades, request, current_user.id, names, limit, cursor, sort_by, order,
+        symbol=symbol, date_from=date_from, date_to=date_to, trade_status=trade_status, pnl=pnl,
+    )
+
+def find_trade(db: Session, user_id: int, trade_id: int) -> models.Trade:
+    """A user's trade, 404 if it does not exist"""
     trade = db.query(models.Trade).filter(
         models.Trade.id == trade_id,
-        models.Trade.user_id == current_user.id
+        models.Trade.user_id == user_id
     ).first()
     
     if not trade:
@@ -114,21 +306,32 @@ def get_trade(
     
     return trade
 
-@router.put("/{trade_id}", response_model=TradeResponse)
-def update_trade(
+@router.get("/{trade_id}", response_model=TradeResponse)
+async def get_trade(
     trade_id: int,
-    trade_data: TradeUpdate,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Update a trade"""
-    trade = db.query(models.Trade).filter(
-        models.Trade.id == trade_id,
-        models.Trade.user_id == current_user.id
-    ).first()
+    """Get a specific trade"""
+    return await run(db, find_trade, current_user.id, trade_id)
+
+def reject_fill_trades(db: Session, trade_ids):
+    """409 if any of the trades is derived from fills, those only change through their fills"""
+    derived = db.query(models.LotMatch.trade_id).filter(models.LotMatch.trade_id.in_(list(trade_ids))).first()
+    if derived:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Trade {derived[0]} is derived from fills, change it through /api/fills"
+        )
+
+def change_trade(db: Session, user_id: int, trade_id: int, trade_data: TradeUpdate) -> models.Trade:
+    """Apply an update to a trade and everything derived from it, commit and publish it"""
+    trade = find_trade(db, user_id, trade_id)
+    reject_fill_trades(db, [trade_id])
     
-    if not trade:
-        raise HTTPException(status_code=404, detail="Trade not found")
+    # Remove old contribution before the fields change
+    stats.apply_trade(db, trade, -1)
+    old_exit_date = trade.exit_date
     
     # Update fields
     for field, value in trade_data.dict(exclude_unset=True).items():
@@ -136,28 +339,133 @@ def update_trade(
     
     # Recalculate metrics
     calculate_trade_metrics(trade)
+    stats.apply_trade(db, trade)
     
+    db.flush()
+    rollups.recompute_days(db, user_id, [old_exit_date, trade.exit_date])
+    caching.bump(db, user_id, "trades")
     db.commit()
     db.refresh(trade)
+    events.publish_change(db, user_id, "trade.updated", trade_event(trade))
     
     return trade
 
-@router.delete("/{trade_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_trade(
+@router.put("/{trade_id}", response_model=TradeResponse)
+async def update_trade(
     trade_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
+    trade_data: TradeUpdate,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a trade"""
-    trade = db.query(models.Trade).filter(
-        models.Trade.id == trade_id,
-        models.Trade.user_id == current_user.id
-    ).first()
-    
-    if not trade:
-        raise HTTPException(status_code=404, detail="Trade not found")
+    """Update a trade"""
+    return await run(db, change_trade, current_user.id, trade_id, trade_data)
+
+def remove_trade(db: Session, user_id: int, trade_id: int):
+    """Delete a trade and its contribution to aggregates and rollups, commit and publish it"""
+    trade = find_trade(db, user_id, trade_id)
+    reject_fill_trades(db, [trade_id])
     
+    stats.apply_trade(db, trade, -1)
     db.delete(trade)
+    db.flush()
+    rollups.recompute_days(db, user_id, [trade.exit_date])
+    caching.bump(db, user_id, "trades")
     db.commit()
-    
-    return None
\ No newline at end of file
+    events.publish_change(db, user_id, "trade.deleted", {"id": trade_id})
+
+@router.delete("/{trade_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_trade(
+    trade_id: int,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete a trade"""
+    await run(db, remove_trade, current_user.id, trade_id)
+    return None
+
+def load_batch_targets(db: Session, user_id: int, operations) -> dict:
+    """Load the trades targeted by update/delete operations as plain rows, keyed by id"""
+    ids = [operation.id for operation in operations if operation.op != "create"]
+    if len(ids) != len(set(ids)):
+        raise HTTPException(status_code=400, detail="A trade can only appear in one operation per batch")
+    if not ids:
+        return {}
+
+    table = models.Trade.__table__
+    rows = db.execute(select(table).where(table.c.user_id == user_id, table.c.id.in_(ids))).mappings()
+    existing = {row["id"]: SimpleNamespace(**row) for row in rows}
+
+    missing = [trade_id for trade_id in ids if trade_id not in existing]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Trade {missing[0]} not found")
+    reject_fill_trades(db, ids)
+    return existing
+
+def apply_trade_batch(db: Session, user_id: int, batch: TradeBatch) -> list:
+    """Apply a batch in the session's transaction and commit it, results in operation order"""
+    table = models.Trade.__table__
+    existing = load_batch_targets(db, user_id, batch.operations)
+
+    # Remove the old contribution of every touched trade before anything changes
+    stats.apply_trades(db, user_id, existing.values(), -1)
+    days = {trade.exit_date for trade in existing.values()}
+
+    results, created, updated, deleted = [], [], [], []
+    for operation in batch.operations:
+        if operation.op == "create":
+            trade = SimpleNamespace(user_id=user_id, **operation.trade.dict())
+            created.append(trade)
+        elif operation.op == "update":
+            trade = existing[operation.id]
+            for field, value in operation.trade.dict(exclude_unset=True).items():
+                setattr(trade, field, value)
+            updated.append(trade)
+        else:
+            trade = None
+            deleted.append(operation.id)
+
+        if trade is not None:
+            calculate_trade_metrics(trade)
+            days.add(trade.exit_date)
+        results.append((operation, trade))
+
+    # One executemany per kind of operation, inserts first so freed ids are not reused
+    if created:
+        ids = db.execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True),
+            [vars(trade) for trade in created]
+        ).scalars().all()
+        for trade, trade_id in zip(created, ids):
+            trade.id = trade_id
+    if deleted:
+        db.execute(table.delete().where(table.c.user_id == user_id, table.c.id.in_(deleted)))
+    if updated:
+        db.execute(update(models.Trade), [vars(trade) for trade in updated])
+
+    stats.apply_trades(db, user_id, created + updated)
+    rollups.recompute_days(db, user_id, days)
+    caching.bump(db, user_id, "trades")
+    db.commit()
+    events.publish_change(db, user_id, "trades.batch", {
+        "created": [trade_event(trade) for trade in created],
+        "updated": [trade_event(trade) for trade in updated],
+        "deleted": deleted,
+    })
+
+    return [
+        {"op": operation.op, "id": trade.id if trade else operation.id, "trade": trade}
+        for operation, trade in results
+    ]
+
+@router.post("/batch", response_model=List[TradeBatchResult])
+async def batch_trades(
+    batch: TradeBatch,
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Create, update and delete many trades in one transaction.
+    Results are returned in operation order; if any operation targets a
+    missing or fill-derived trade, nothing is applied.
+    """
+    return await run(db, apply_trade_batch, current_user.id, batch)
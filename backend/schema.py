@@ -0,0 +1,404 @@
+"""
+Versioned schema migrations for the main database and each shard file.
+
+A database's version is SQLite's PRAGMA user_version. prepare() reads it (one
+pragma, no reflection) and returns straight away when it equals
+SCHEMA_VERSION, which is every start and shard open after the first. Pending
+MIGRATIONS run in order, each in its own BEGIN IMMEDIATE transaction together
+with its version bump: a failed migration leaves the database at the last
+finished version, and workers starting together apply each migration once
+(the others wait for the lock, then see the new version).
+
+SQLite cannot build an index concurrently: writers wait for the build while
+WAL readers carry on. On a large database apply new migrations while the
+previous release is still serving, then restart it. From backend/:
+
+    python -m schema status
+    python -m schema migrate
+
+Migrations must be idempotent, since a database created before versioning
+starts at version 0 and replays them all, and additive, so the previous
+release keeps working on the migrated schema. Each one carries the DDL for
+its own change rather than reading models.py, which only describes the
+latest version.
+"""
+from sqlalchemy import inspect, text
+from typing import Callable, NamedTuple
+import argparse
+import logging
+import time
+from database import SQLITE_PRAGMAS, create_db_engine, engine, shard_pool
+import search
+
+# How long a starting worker waits for another process's migration to finish
+MIGRATION_LOCK_TIMEOUT_MS = 600_000
+
+log = logging.getLogger("tradetracker.schema")
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable  # apply(conn), inside the migration's transaction
+
+# The schema of the last release before versioning (models.create_all at
+# import), frozen: migrations never read models.py, so replaying them builds
+# the tables each version had
+BASELINE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL,
+        email VARCHAR NOT NULL,
+        hashed_password VARCHAR NOT NULL,
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS trades (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        symbol VARCHAR NOT NULL,
+        entry_date DATE NOT NULL,
+        exit_date DATE,
+        entry_price FLOAT NOT NULL,
+        exit_price FLOAT,
+        shares FLOAT NOT NULL,
+        total_cost FLOAT,
+        profit_loss FLOAT,
+        profit_loss_percent FLOAT,
+        notes TEXT,
+        brokerage_fee FLOAT,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS deposits (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        amount FLOAT NOT NULL,
+        deposit_date DATE NOT NULL,
+        notes TEXT,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    "CREATE INDEX IF NOT EXISTS ix_trades_id ON trades (id)",
+    "CREATE INDEX IF NOT EXISTS ix_trades_symbol ON trades (symbol)",
+    "CREATE INDEX IF NOT EXISTS ix_deposits_id ON deposits (id)",
+]
+
+USER_STATS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER NOT NULL,
+        total_deposited FLOAT NOT NULL,
+        deposit_count INTEGER NOT NULL,
+        trade_count INTEGER NOT NULL,
+        open_trades INTEGER NOT NULL,
+        closed_trades INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        losses INTEGER NOT NULL,
+        total_pl FLOAT NOT NULL,
+        gross_profit FLOAT NOT NULL,
+        gross_loss FLOAT NOT NULL,
+        PRIMARY KEY (user_id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+]
+
+DAILY_PNL_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS daily_pnl (
+        user_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        realized_pl FLOAT NOT NULL,
+        trade_count INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        losses INTEGER NOT NULL,
+        deposits FLOAT NOT NULL,
+        deposit_count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, date),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+]
+
+DATA_VERSIONS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS data_versions (
+        user_id INTEGER NOT NULL,
+        trades INTEGER NOT NULL,
+        deposits INTEGER NOT NULL,
+        PRIMARY KEY (user_id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+]
+
+FILLS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS fills (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        symbol VARCHAR NOT NULL,
+        side VARCHAR NOT NULL,
+        quantity FLOAT NOT NULL,
+        price FLOAT NOT NULL,
+        fee FLOAT NOT NULL,
+        executed_at DATETIME NOT NULL,
+        method VARCHAR,
+        lot_id INTEGER,
+        remaining FLOAT,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(lot_id) REFERENCES fills (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS lot_matches (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        symbol VARCHAR NOT NULL,
+        buy_fill_id INTEGER NOT NULL,
+        sell_fill_id INTEGER,
+        trade_id INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(buy_fill_id) REFERENCES fills (id),
+        FOREIGN KEY(sell_fill_id) REFERENCES fills (id),
+        FOREIGN KEY(trade_id) REFERENCES trades (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_fills_id ON fills (id)",
+    "CREATE INDEX IF NOT EXISTS ix_fills_user_symbol_executed_at ON fills (user_id, symbol, executed_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_fills_open_lots ON fills (user_id, symbol, executed_at, id) WHERE remaining > 0",
+    "CREATE INDEX IF NOT EXISTS ix_lot_matches_user_symbol ON lot_matches (user_id, symbol)",
+    "CREATE INDEX IF NOT EXISTS ix_lot_matches_buy_fill ON lot_matches (buy_fill_id, sell_fill_id)",
+    "CREATE INDEX IF NOT EXISTS ix_lot_matches_trade ON lot_matches (trade_id)",
+]
+
+FX_RATES_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS fx_rates (
+        currency VARCHAR(3) NOT NULL,
+        date DATE NOT NULL,
+        rate FLOAT NOT NULL,
+        loaded_at DATETIME NOT NULL,
+        PRIMARY KEY (currency, date)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_fx_rates_loaded_at ON fx_rates (loaded_at)",
+]
+
+SYMBOL_STATS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS symbol_stats (
+        user_id INTEGER NOT NULL,
+        symbol VARCHAR NOT NULL,
+        trade_count INTEGER NOT NULL,
+        open_trades INTEGER NOT NULL,
+        closed_trades INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        losses INTEGER NOT NULL,
+        total_pl FLOAT NOT NULL,
+        gross_profit FLOAT NOT NULL,
+        gross_loss FLOAT NOT NULL,
+        held_trades INTEGER DEFAULT '0' NOT NULL,
+        holding_days INTEGER DEFAULT '0' NOT NULL,
+        best_trade_id INTEGER,
+        best_pl FLOAT,
+        worst_trade_id INTEGER,
+        worst_pl FLOAT,
+        PRIMARY KEY (user_id, symbol),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_trades_user_pl ON trades (user_id, profit_loss)",
+    "CREATE INDEX IF NOT EXISTS ix_trades_user_symbol_pl ON trades (user_id, symbol, profit_loss)",
+]
+
+JOBS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        kind VARCHAR NOT NULL,
+        status VARCHAR NOT NULL,
+        params TEXT,
+        done INTEGER NOT NULL,
+        total INTEGER,
+        checkpoint TEXT,
+        result TEXT,
+        error TEXT,
+        cancel_requested INTEGER NOT NULL,
+        worker VARCHAR,
+        heartbeat DATETIME,
+        created_at DATETIME,
+        started_at DATETIME,
+        finished_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_user_status ON jobs (user_id, status)",
+]
+
+def _execute(statements):
+    """Migration running a list of DDL statements"""
+    def apply(conn):
+        for statement in statements:
+            conn.execute(text(statement))
+    return apply
+
+def _add_column(conn, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists"""
+    if column not in {existing["name"] for existing in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def _add_currencies(conn):
+    """Base currency per user, currency per trade, fill and deposit, and the FX rates table"""
+    _add_column(conn, "users", "base_currency", "VARCHAR(3) DEFAULT 'USD' NOT NULL")
+    for table in ("trades", "deposits", "fills"):
+        _add_column(conn, table, "currency", "VARCHAR(3) DEFAULT 'USD' NOT NULL")
+    _execute(FX_RATES_SCHEMA)(conn)
+
+def _add_daily_pnl(conn):
+    """
+    The daily rollup table. Users whose aggregates were already built have no
+    rollup rows, so their user_stats row is dropped and stats.get_user_stats
+    rebuilds the aggregates and backfills the rollup on next use (it needs the
+    FX rates, which live in the main database when sharded).
+    """
+    _execute(DAILY_PNL_SCHEMA)(conn)
+    conn.execute(text("""
+        DELETE FROM user_stats
+        WHERE user_id NOT IN (SELECT user_id FROM daily_pnl)
+          AND (user_id IN (SELECT user_id FROM trades) OR user_id IN (SELECT user_id FROM deposits))
+    """))
+
+def _add_symbol_stats(conn):
+    """
+    The per-symbol aggregates. They are maintained alongside user_stats, so
+    users whose user_stats row was already built have their row dropped, and
+    stats.get_user_stats rebuilds both on next use (as for the rollup).
+    """
+    _execute(SYMBOL_STATS_SCHEMA)(conn)
+    conn.execute(text("""
+        DELETE FROM user_stats
+        WHERE user_id NOT IN (SELECT user_id FROM symbol_stats)
+          AND user_id IN (SELECT user_id FROM trades)
+    """))
+
+def _add_stop_price(conn):
+    """Optional planned stop per trade (analytics.risk_metrics R-multiples)"""
+    _add_column(conn, "trades", "stop_price", "FLOAT")
+
+def _upper_case_symbols(conn):
+    """
+    Store symbols upper-case, as the API now normalizes them. Users who had a
+    symbol in another case get their aggregates rebuilt on next use
+    (stats.get_user_stats), since its "aapl" and "AAPL" rows have to merge.
+    """
+    mixed = (
+        "SELECT user_id FROM trades WHERE symbol != upper(trim(symbol))"
+        " UNION SELECT user_id FROM fills WHERE symbol != upper(trim(symbol))"
+    )
+    # Cached responses and snapshots of those users must not match afterwards
+    conn.execute(text(f"""
+        INSERT INTO data_versions (user_id, trades, deposits)
+        SELECT user_id, 1, 0 FROM ({mixed}) WHERE true
+        ON CONFLICT (user_id) DO UPDATE SET trades = trades + 1
+    """))
+    conn.execute(text(f"DELETE FROM user_stats WHERE user_id IN ({mixed})"))
+    for table in ("trades", "fills", "lot_matches"):
+        conn.execute(text(f"UPDATE {table} SET symbol = upper(trim(symbol)) WHERE symbol != upper(trim(symbol))"))
+
+MIGRATIONS = [
+    Migration(1, "baseline schema (users, trades, deposits)", _execute(BASELINE_SCHEMA)),
+    Migration(2, "user_stats aggregates", _execute(USER_STATS_SCHEMA)),
+    Migration(3, "trades index for keyset listing",
+              _execute(["CREATE INDEX IF NOT EXISTS ix_trades_user_entry_date_id ON trades (user_id, entry_date, id)"])),
+    Migration(4, "trades index for the equity curve",
+              _execute(["CREATE INDEX IF NOT EXISTS ix_trades_user_exit_date ON trades (user_id, exit_date, profit_loss)"])),
+    Migration(5, "daily_pnl rollup, backfilled on next use", _add_daily_pnl),
+    Migration(6, "data_versions for ETags and the response cache", _execute(DATA_VERSIONS_SCHEMA)),
+    Migration(7, "fills and lot_matches", _execute(FILLS_SCHEMA)),
+    Migration(8, "currencies and fx_rates", _add_currencies),
+    Migration(9, "trade_search full-text index", search.ensure_index),
+    Migration(10, "symbol_stats aggregates and their trades indexes, built on next use", _add_symbol_stats),
+    Migration(11, "trades.stop_price for R-multiples", _add_stop_price),
+    Migration(12, "jobs table for background work", _execute(JOBS_SCHEMA)),
+    Migration(13, "upper-case symbols", _upper_case_symbols),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+def get_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+def _apply(conn, migration: Migration) -> bool:
+    """Run one migration and stamp its version atomically, False if another process already had"""
+    # IMMEDIATE takes the write lock before the version is read
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        if get_version(conn) >= migration.version:
+            conn.exec_driver_sql("COMMIT")
+            return False
+        migration.apply(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {int(migration.version)}")
+        conn.exec_driver_sql("COMMIT")
+        return True
+    except BaseException:
+        if conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql("ROLLBACK")
+        raise
+
+def migrate(engine) -> list:
+    """Apply every pending migration, returns the versions this call applied"""
+    applied = []
+    if engine.dialect.name != "sqlite":
+        # No version stamp to check, every migration is idempotent
+        with engine.begin() as conn:
+            for migration in MIGRATIONS:
+                migration.apply(conn)
+        return applied
+
+    # Autocommit hands transaction control to the BEGIN/COMMIT statements in _apply
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {MIGRATION_LOCK_TIMEOUT_MS}")
+        try:
+            current = get_version(conn)
+            for migration in MIGRATIONS:
+                if migration.version <= current:
+                    continue
+                start = time.perf_counter()
+                if _apply(conn, migration):
+                    applied.append(migration.version)
+                    log.info("%s: migration %d (%s) applied in %.2fs", engine.url.database,
+                             migration.version, migration.description, time.perf_counter() - start)
+        finally:
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {SQLITE_PRAGMAS['busy_timeout']}")
+    return applied
+
+def prepare(engine) -> list:
+    """Bring a database up to SCHEMA_VERSION, returns the versions applied (none when current)"""
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            version = get_version(conn)
+        if version == SCHEMA_VERSION:
+            return []
+        if version > SCHEMA_VERSION:
+            # A rolled-back release: migrations are additive, so this one still works
+            log.warning("%s is at schema version %d, newer than this release's %d",
+                        engine.url.database, version, SCHEMA_VERSION)
+            return []
+    return migrate(engine)
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or apply schema migrations (main database and every shard)")
+    parser.add_argument("command", choices=["status", "migrate"])
+    args = parser.parse_args()
+
+    # Shards are opened directly, the pool would migrate them on open
+    targets = [engine] + ([create_db_engine(f"sqlite:///{path}") for path in shard_pool.existing()] if shard_pool else [])
+    for target in targets:
+        if args.command == "migrate":
+            start = time.perf_counter()
+            applied = migrate(target)
+            done = f"applied {', '.join(map(str, applied))}" if applied else "up to date"
+            print(f"{target.url.database}: {done} ({time.perf_counter() - start:.2f}s)")
+        else:
+            with target.connect() as conn:
+                version = get_version(conn)
+            pending = [m for m in MIGRATIONS if m.version > version]
+            print(f"{target.url.database}: version {version} of {SCHEMA_VERSION}"
+                  + "".join(f"\n  pending {m.version}: {m.description}" for m in pending))
+        target.dispose()
+
+if __name__ == "__main__":
+    main()
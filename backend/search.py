@@ -0,0 +1,113 @@
+"""
+Full-text search over trade notes and symbols (SQLite FTS5).
+
+trade_search holds one row per trade (rowid = trades.id) with the owner as
+a token ("u42"), so a search is an index intersection with the user's rows
+rather than a filter over every user's matches. Triggers on trades keep it
+in sync for every write path (CRUD, batch, import, fill replay). It is
+created and backfilled by a schema migration (schema.py); rebuild it or
+merge its segments from backend/:
+
+    python -m search rebuild
+    python -m search optimize
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+import argparse
+import html
+import re
+
+# Ranking weights for (owner, symbol, notes): a symbol hit beats a word in the notes
+RANK = "bm25(0.0, 4.0, 1.0)"
+
+# Words around the best match in a notes snippet
+SNIPPET_TOKENS = 12
+
+# Private-use markers replaced by <mark> after the snippet is HTML-escaped
+_OPEN, _CLOSE = "\ue000", "\ue001"
+
+SCHEMA = [
+    # prefix indexes make "sto" -> "stop" lookups index scans
+    """CREATE VIRTUAL TABLE IF NOT EXISTS trade_search USING fts5(
+        owner, symbol, notes, prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS trades_search_insert AFTER INSERT ON trades BEGIN
+        INSERT INTO trade_search(rowid, owner, symbol, notes) VALUES (new.id, 'u' || new.user_id, new.symbol, new.notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trades_search_delete AFTER DELETE ON trades BEGIN
+        DELETE FROM trade_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trades_search_update AFTER UPDATE OF user_id, symbol, notes ON trades BEGIN
+        UPDATE trade_search SET owner = 'u' || new.user_id, symbol = new.symbol, notes = new.notes WHERE rowid = old.id;
+    END""",
+]
+
+def _rebuild(conn):
+    conn.execute(text("DELETE FROM trade_search"))
+    conn.execute(text(
+        "INSERT INTO trade_search(rowid, owner, symbol, notes) SELECT id, 'u' || user_id, symbol, notes FROM trades"
+    ))
+    conn.execute(text(f"INSERT INTO trade_search(trade_search, rank) VALUES ('rank', '{RANK}')"))
+
+def ensure_index(conn):
+    """Create the search table and triggers, backfilling from trades the first time (in the caller's transaction)"""
+    if conn.dialect.name != "sqlite":
+        return
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'trade_search'"
+    )).first()
+    for statement in SCHEMA:
+        conn.execute(text(statement))
+    if not exists:
+        _rebuild(conn)
+
+def match_expression(user_id: int, query: str) -> str:
+    """
+    FTS5 query for a user's free text: every word must match the start of a
+    word in the symbol or notes. User input is reduced to quoted words, so
+    FTS5 operators in it are searched for literally.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return ""
+    terms = " ".join(f'"{word}"*' for word in words)
+    return f'owner : "u{user_id}" AND {{symbol notes}} : ({terms})'
+
+def highlight(snippet: str) -> str:
+    """HTML-escape a snippet (notes are user text) and turn the match markers into <mark>"""
+    return html.escape(snippet or "").replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+def search_trades(db: Session, user_id: int, query: str, limit: int = 20, offset: int = 0) -> list:
+    """[(trade id, highlighted notes snippet, rank)] best match first (lower rank is better)"""
+    expression = match_expression(user_id, query)
+    if not expression:
+        return []
+    rows = db.execute(text(f"""
+        SELECT rowid, snippet(trade_search, 2, '{_OPEN}', '{_CLOSE}', '…', {SNIPPET_TOKENS}), rank
+        FROM trade_search
+        WHERE trade_search MATCH :expression
+        ORDER BY rank
+        LIMIT :limit OFFSET :offset
+    """), {"expression": expression, "limit": limit, "offset": offset}).all()
+    return [(trade_id, highlight(snippet), rank) for trade_id, snippet, rank in rows]
+
+def main():
+    from database import engine, shard_pool
+
+    parser = argparse.ArgumentParser(description="Maintain the trade notes search index")
+    parser.add_argument("command", choices=["rebuild", "optimize"])
+    args = parser.parse_args()
+
+    # Every shard has its own index
+    engines = [engine] + ([shard_pool.open(path) for path in shard_pool.existing()] if shard_pool else [])
+    for target in engines:
+        with target.begin() as conn:
+            ensure_index(conn)
+            if args.command == "rebuild":
+                _rebuild(conn)
+            else:
+                conn.execute(text("INSERT INTO trade_search(trade_search) VALUES ('optimize')"))
+        print(f"{target.url.database}: {args.command} done")
+
+if __name__ == "__main__":
+    main()
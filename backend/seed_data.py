@@ -1,4 +1,4 @@
-from database import SessionLocal
+from database import SessionLocal, route
 from models import User, Trade, Deposit
 from auth import get_password_hash
 from datetime import date
@@ -33,6 +33,7 @@ user = User(
 db.add(user)
 db.commit()
 db.refresh(user)
+route(db, user.id)  # Trades and deposits go to the user's shard when sharded
 
 # Add deposits (real USD amounts from Stake)
 deposits = [
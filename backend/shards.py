@@ -0,0 +1,127 @@
+"""
+Moves users' data from the main database into per-user shard files.
+
+With TRADETRACKER_SHARDS set ("user", or a shard count), each user's rows
+live in their own SQLite file under TRADETRACKER_SHARD_DIR, so writes for
+different users no longer queue on one database lock. The main database
+keeps the directory tables (users, FX rates). To move an existing
+monolithic database over, stop the API and run from backend/:
+
+    TRADETRACKER_SHARDS=user python -m shards split [--prune]
+    TRADETRACKER_SHARDS=user python -m shards status
+
+split is re-runnable: a user's rows in their shard are replaced. Rows stay
+in the main database unless --prune is given (after every user verified).
+"""
+from sqlalchemy import select, text
+import argparse
+import os
+import time
+from database import Base, DIRECTORY_TABLES, engine, shard_pool
+import models
+import schema
+
+def user_tables() -> list:
+    """Tables holding per-user rows (every table outside the directory), parents first"""
+    tables = [table for table in Base.metadata.sorted_tables if table.name not in DIRECTORY_TABLES]
+    for table in tables:
+        assert "user_id" in table.columns, f"{table.name} has no user_id to shard by"
+    return tables
+
+def source_path() -> str:
+    if engine.dialect.name != "sqlite":
+        raise SystemExit("Splitting needs a SQLite main database")
+    return os.path.abspath(engine.url.database)
+
+def copy_user(user_id: int, source: str) -> dict:
+    """Replace a user's rows in their shard with the main database's, returns {table: rows}"""
+    shard = shard_pool.engine(user_id)
+    copied = {}
+    with shard.connect() as conn:
+        # ATTACH/DETACH cannot run inside a transaction
+        conn.exec_driver_sql("ATTACH DATABASE ? AS source", (source,))
+        conn.commit()
+        try:
+            with conn.begin():
+                for table in reversed(user_tables()):
+                    conn.execute(text(f"DELETE FROM main.{table.name} WHERE user_id = :user_id"), {"user_id": user_id})
+                for table in user_tables():
+                    columns = ", ".join(column.name for column in table.columns)
+                    # Shard triggers index the copied trades for search
+                    copied[table.name] = conn.execute(text(
+                        f"INSERT INTO main.{table.name} ({columns}) "
+                        f"SELECT {columns} FROM source.{table.name} WHERE user_id = :user_id"
+                    ), {"user_id": user_id}).rowcount
+                for table in user_tables():
+                    expected = conn.execute(text(
+                        f"SELECT count(*) FROM source.{table.name} WHERE user_id = :user_id"
+                    ), {"user_id": user_id}).scalar()
+                    if expected != copied[table.name]:
+                        raise RuntimeError(f"user {user_id}: {table.name} copied {copied[table.name]} of {expected} rows")
+        finally:
+            conn.exec_driver_sql("DETACH DATABASE source")
+            conn.commit()
+    return copied
+
+def prune(user_ids: list):
+    """Delete moved users' rows from the main database and reclaim the space"""
+    with engine.begin() as conn:
+        for table in reversed(user_tables()):
+            for i in range(0, len(user_ids), 500):
+                conn.execute(table.delete().where(table.c.user_id.in_(user_ids[i:i + 500])))
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+
+def split(user_ids: list = None, prune_source: bool = False, quiet: bool = False) -> dict:
+    """Copy every user (or `user_ids`) into their shard, returns total rows per table"""
+    if shard_pool is None:
+        raise SystemExit("Set TRADETRACKER_SHARDS (\"user\" or a shard count) to choose the layout first")
+    schema.prepare(engine)  # Source columns must match the models
+    source = source_path()
+    if user_ids is None:
+        with engine.connect() as conn:
+            user_ids = conn.execute(select(models.User.id).order_by(models.User.id)).scalars().all()
+
+    totals, start = {}, time.perf_counter()
+    for user_id in user_ids:
+        copied = copy_user(user_id, source)
+        for name, count in copied.items():
+            totals[name] = totals.get(name, 0) + count
+        if not quiet:
+            print(f"user {user_id} -> {shard_pool.shard_name(user_id)}: {copied.get('trades', 0):,} trades")
+    if prune_source:
+        prune(list(user_ids))
+    if not quiet:
+        print(f"{len(user_ids)} users moved in {time.perf_counter() - start:.1f}s: "
+              + ", ".join(f"{count:,} {name}" for name, count in totals.items()))
+    return totals
+
+def status():
+    """Row counts per shard, and user rows still in the main database"""
+    for path in shard_pool.existing():
+        shard = shard_pool.open(path)
+        with shard.connect() as conn:
+            users = conn.execute(text("SELECT count(DISTINCT user_id) FROM trades")).scalar()
+            trades = conn.execute(text("SELECT count(*) FROM trades")).scalar()
+        print(f"{os.path.basename(path)}: {users} users with trades, {trades:,} trades, "
+              f"{os.path.getsize(path) / 1e6:.1f} MB")
+    with engine.connect() as conn:
+        left = {table.name: conn.execute(text(f"SELECT count(*) FROM {table.name}")).scalar() for table in user_tables()}
+    print("main database user rows: " + ", ".join(f"{count:,} {name}" for name, count in left.items()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the main database into per-user shard files")
+    parser.add_argument("command", choices=["split", "status"])
+    parser.add_argument("--user", type=int, action="append", help="Only these user ids (repeatable)")
+    parser.add_argument("--prune", action="store_true", help="Delete the moved rows from the main database")
+    args = parser.parse_args()
+
+    if shard_pool is None:
+        raise SystemExit("Set TRADETRACKER_SHARDS (\"user\" or a shard count) to choose the layout first")
+    if args.command == "split":
+        split(args.user, prune_source=args.prune)
+    else:
+        status()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Columnar snapshots of each user's closed trades for analytics reads.
+
+A snapshot holds one typed array per column (exit/entry day numbers,
+prices, shares, stop, P&L, trade ids) plus dictionary-encoded symbols and
+currencies, ordered by (exit date, id). It is written once to a file in a
+"snapshots" directory next to the user's database (their shard when
+sharded) and memory-mapped, so analytics slice it without re-querying rows
+or building Python objects per trade, and a restarted worker reuses it.
+
+A snapshot is stamped with the user's trades version (caching.bump), which
+every trade mutation, FX reload and base currency change increments, and is
+rebuilt by the first read after a change. Mapped snapshots are held in an
+LRU bounded by SNAPSHOT_CACHE_BYTES. P&L is kept in the trade currency and
+converted at read time, so rate reloads only need the version bump.
+
+Snapshot files are a cache and safe to delete at any time:
+
+    python -m snapshots clear
+"""
+from collections import OrderedDict
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import numpy as np
+import models
+import caching
+
+# Byte budget for snapshots held mapped across all users
+SNAPSHOT_CACHE_BYTES = int(os.getenv("TRADETRACKER_SNAPSHOT_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+# File layout version, bump when COLUMNS or the header change
+FORMAT_VERSION = 1
+
+MAGIC = b"TTSNAP\x00\x00"
+
+# Column offsets are aligned for any dtype
+ALIGNMENT = 64
+
+# (name, dtype) of the stored arrays; stop_price is NaN where no stop is set
+COLUMNS = [
+    ("exit_day", "<i4"), ("entry_day", "<i4"), ("id", "<i8"),
+    ("entry_price", "<f8"), ("exit_price", "<f8"), ("shares", "<f8"),
+    ("stop_price", "<f8"), ("profit_loss", "<f8"),
+    ("symbol", "<u4"), ("currency", "<u2"),
+]
+
+# Share of the trades table above which a user's rows are read by a table scan
+SCAN_SHARE = 0.25
+
+# julianday() of 1970-01-01 (as in analytics)
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+class Snapshot:
+    """A user's closed trades as read-only arrays, `symbols`/`currencies` decode the code columns"""
+
+    def __init__(self, version: int, arrays: dict, symbols: list, currencies: list, nbytes: int):
+        self.version = version
+        self.arrays = arrays
+        self.symbols = symbols
+        self.currencies = currencies
+        self.nbytes = nbytes
+        self._symbol_codes = {symbol: code for code, symbol in enumerate(symbols)}
+
+    def __len__(self) -> int:
+        return len(self.arrays["exit_day"])
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.arrays[column]
+
+    def symbol_code(self, symbol: str):
+        """Code of a symbol in the symbol column, None if the user never closed a trade in it"""
+        return self._symbol_codes.get(symbol)
+
+    def exit_range(self, first_day=None, last_day=None) -> slice:
+        """Rows exiting between two day numbers (inclusive), by binary search on the sorted exit days"""
+        exit_days = self.arrays["exit_day"]
+        start = np.searchsorted(exit_days, first_day, side="left") if first_day is not None else 0
+        stop = np.searchsorted(exit_days, last_day, side="right") if last_day is not None else len(exit_days)
+        return slice(int(start), int(stop))
+
+def _encode(values: list, dtype: str) -> tuple:
+    """Dictionary-encode strings: (codes array, distinct values in first-seen order)"""
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=dtype, count=len(values))
+    return codes, list(index)
+
+def build(db: Session, user_id: int) -> tuple:
+    """Query a user's closed trades into ({column: array}, symbols, currencies)"""
+    closed = db.query(models.UserStats.closed_trades).filter(models.UserStats.user_id == user_id).scalar() or 0
+    table_rows = db.query(func.max(models.Trade.id)).scalar() or 0
+    # Most of the table (always in a shard): one sequential pass beats a row lookup per index entry
+    scan = closed > table_rows * SCAN_SHARE
+    result = db.execute(text(f"""
+        SELECT julianday(exit_date), julianday(entry_date), id, entry_price, exit_price, shares,
+               stop_price, profit_loss, symbol, currency
+        FROM trades {"NOT INDEXED" if scan else ""}
+        WHERE user_id = :user_id AND exit_date IS NOT NULL AND profit_loss IS NOT NULL
+        {"" if scan else "ORDER BY exit_date, id"}
+    """), {"user_id": user_id})
+    # Plain sqlite3 tuples, Row objects would cost more than the query
+    rows = result.cursor.fetchall()
+
+    numeric = [name for name, _ in COLUMNS[:8]]
+    # None (no stop) becomes NaN
+    data = np.array([row[:8] for row in rows], dtype=np.float64).reshape(-1, 8)
+    arrays = {name: data[:, i] for i, name in enumerate(numeric)}
+    for name in ("exit_day", "entry_day"):
+        arrays[name] = np.rint(arrays[name] - UNIX_EPOCH_JULIAN_DAY)
+    arrays["symbol"], symbols = _encode([row[8] for row in rows], "<u4")
+    arrays["currency"], currencies = _encode([row[9] for row in rows], "<u2")
+    arrays = {name: np.ascontiguousarray(arrays[name], dtype=dtype) for name, dtype in COLUMNS}
+    if scan:
+        order = np.lexsort((arrays["id"], arrays["exit_day"]))
+        arrays = {name: values[order] for name, values in arrays.items()}
+    return arrays, symbols, currencies
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def write(path: str, identity: str, version: int, arrays: dict, symbols: list, currencies: list):
+    """Write a snapshot file atomically (readers see the old file or the whole new one)"""
+    columns, offset = [], 0
+    for name, dtype in COLUMNS:
+        columns.append([name, dtype, offset])
+        offset = _aligned(offset + arrays[name].nbytes)
+    header = json.dumps({
+        "format": FORMAT_VERSION, "database": identity, "version": version,
+        "rows": len(arrays["exit_day"]), "columns": columns, "symbols": symbols, "currencies": currencies,
+    }).encode()
+    data_start = _aligned(len(MAGIC) + 4 + len(header))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(header)) + header)
+            for (name, _, column_offset) in columns:
+                f.seek(data_start + column_offset)
+                f.write(arrays[name].tobytes())
+            f.truncate(data_start + offset)  # Empty trailing columns still lie inside the file
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def open_file(path: str, identity: str, version: int):
+    """Map a snapshot file, None when it is missing or not for this database and version"""
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            size = struct.unpack("<I", f.read(4))[0]
+            header = json.loads(f.read(size))
+            if (header["format"], header["database"], header["version"]) != (FORMAT_VERSION, identity, version):
+                return None
+            # The mapping stays valid after the file is closed or replaced
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+    data_start = _aligned(len(MAGIC) + 4 + size)
+    rows = header["rows"]
+    arrays = {
+        name: np.frombuffer(mapped, dtype=dtype, count=rows, offset=data_start + offset)
+        for name, dtype, offset in header["columns"]
+    }
+    return Snapshot(version, arrays, header["symbols"], header["currencies"], len(mapped))
+
+class SnapshotCache:
+    """Thread-safe LRU of mapped snapshots by user id, bounded by total bytes"""
+
+    def __init__(self, max_bytes: int = SNAPSHOT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: int):
+        with self._lock:
+            snapshot = self._entries.get(user_id)
+            if snapshot is None or snapshot.version != version:
+                return None
+            self._entries.move_to_end(user_id)
+            return snapshot
+
+    def put(self, user_id: int, snapshot: Snapshot):
+        with self._lock:
+            old = self._entries.pop(user_id, None)
+            if old is not None:
+                self._size -= old.nbytes
+            if snapshot.nbytes > self.max_bytes:
+                return
+            self._entries[user_id] = snapshot
+            self._size += snapshot.nbytes
+            # Evicted mappings are unmapped once no request is still reading them
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+snapshot_cache = SnapshotCache()
+
+def _location(db: Session, user_id: int):
+    """(snapshot file path, database identity) for a user, None for a database without a file"""
+    bind = db.get_bind(mapper=models.Trade.__mapper__)
+    database = bind.url.database if bind.dialect.name == "sqlite" else None
+    if not database or database == ":memory:":
+        return None
+    # Versions restart with a recreated database, the user's creation time tells its snapshots apart
+    created_at = db.query(models.User.created_at).filter(models.User.id == user_id).scalar()
+    identity = created_at.isoformat() if created_at else ""
+    return os.path.join(os.path.dirname(os.path.abspath(database)), "snapshots", f"user-{user_id}.snap"), identity
+
+def get(db: Session, user_id: int) -> Snapshot:
+    """
+    A user's current snapshot: from the LRU, else mapped from its file, else
+    built from the database in the same read transaction as the version it
+    is stamped with, and written for the next reader
+    """
+    # pysqlite sends no BEGIN before a SELECT, so each read would see its own
+    # state. The SAVEPOINT opens a read transaction when none is open (inside
+    # one it nests), so a trade committed between the reads cannot end up in
+    # a snapshot stamped with the previous version.
+    with db.begin_nested():
+        version = caching.get_versions(db, user_id)[0]
+        snapshot = snapshot_cache.get(user_id, version)
+        if snapshot is not None:
+            return snapshot
+
+        location = _location(db, user_id)
+        if location is not None:
+            snapshot = open_file(location[0], location[1], version)
+        if snapshot is None:
+            arrays, symbols, currencies = build(db, user_id)
+
+    if snapshot is None:
+        if location is not None:
+            write(location[0], location[1], version, arrays, symbols, currencies)
+            snapshot = open_file(location[0], location[1], version)
+        if snapshot is None:
+            snapshot = Snapshot(version, arrays, symbols, currencies, sum(a.nbytes for a in arrays.values()))
+    snapshot_cache.put(user_id, snapshot)
+    return snapshot
+
+def main():
+    from database import engine, shard_pool
+
+    parser = argparse.ArgumentParser(description="Manage analytics trade snapshots")
+    parser.add_argument("command", choices=["clear"])
+    parser.parse_args()
+
+    engines = [engine] + ([shard_pool.open(path) for path in shard_pool.existing()] if shard_pool else [])
+    directories = {
+        os.path.join(os.path.dirname(os.path.abspath(target.url.database)), "snapshots")
+        for target in engines if target.dialect.name == "sqlite" and target.url.database
+    }
+    for directory in sorted(directories):
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+            print(f"{directory}: removed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+from sqlalchemy import func, case, and_, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+import numpy as np
+import models
+import rollups
+import fx
+
+# Aggregate columns shared by UserStats and SymbolStats
+TRADE_COLUMNS = (
+    "trade_count", "open_trades", "closed_trades", "wins", "losses",
+    "total_pl", "gross_profit", "gross_loss",
+)
+
+def _trade_delta(pl, sign: int = 1) -> dict:
+    """Column deltas a single trade (with base-currency P&L `pl`) contributes to the aggregates"""
+    delta = {"trade_count": sign}
+
+    if pl is None:
+        delta["open_trades"] = sign
+        return delta
+
+    delta["closed_trades"] = sign
+    delta["total_pl"] = sign * pl
+    if pl > 0:
+        delta["wins"] = sign
+        delta["gross_profit"] = sign * pl
+    elif pl < 0:
+        delta["losses"] = sign
+        delta["gross_loss"] = sign * pl
+    return delta
+
+def _increment(db: Session, model, filters, delta: dict, extra: dict = None) -> int:
+    """Apply deltas (and `extra` column values) as an atomic UPDATE ... SET col = col + ?, returns rows matched"""
+    values = {getattr(model, col): getattr(model, col) + value for col, value in delta.items()}
+    values.update(extra or {})
+    return db.query(model).filter(*filters).update(values, synchronize_session=False)
+
+def _trade_aggregates():
+    """SQL expressions computing the trade aggregates from the raw trades table"""
+    pl = models.Trade.profit_loss
+    return (
+        func.count(models.Trade.id).label("trade_count"),
+        func.coalesce(func.sum(case((pl.is_(None), 1), else_=0)), 0).label("open_trades"),
+        func.coalesce(func.sum(case((pl.isnot(None), 1), else_=0)), 0).label("closed_trades"),
+        func.coalesce(func.sum(case((pl > 0, 1), else_=0)), 0).label("wins"),
+        func.coalesce(func.sum(case((pl < 0, 1), else_=0)), 0).label("losses"),
+        func.coalesce(func.sum(pl), 0).label("total_pl"),
+        func.coalesce(func.sum(case((pl > 0, pl), else_=0)), 0).label("gross_profit"),
+        func.coalesce(func.sum(case((pl < 0, pl), else_=0)), 0).label("gross_loss"),
+    )
+
+# Aggregate columns holding amounts (converted to the base currency)
+MONEY_COLUMNS = ("total_pl", "gross_profit", "gross_loss")
+
+# SymbolStats-only columns maintained through deltas
+HOLDING_COLUMNS = ("held_trades", "holding_days")
+
+def _holding_delta(trade, sign: int = 1) -> dict:
+    """Holding period a closed trade contributes to its symbol's average"""
+    if trade.profit_loss is None or trade.exit_date is None:
+        return {}
+    return {"held_trades": sign, "holding_days": sign * (trade.exit_date - trade.entry_date).days}
+
+def _holding_aggregates():
+    """SQL expressions computing HOLDING_COLUMNS from the raw trades table"""
+    held = and_(models.Trade.profit_loss.isnot(None), models.Trade.exit_date.isnot(None))
+    days = func.julianday(models.Trade.exit_date) - func.julianday(models.Trade.entry_date)
+    return (
+        func.coalesce(func.sum(case((held, 1), else_=0)), 0).label("held_trades"),
+        func.coalesce(func.sum(case((held, days), else_=0)), 0).label("holding_days"),
+    )
+
+def rebuild_user_stats(db: Session, user_id: int) -> models.UserStats:
+    """Recompute a user's aggregates from the raw trades and deposits tables"""
+    db.query(models.SymbolStats).filter(models.SymbolStats.user_id == user_id).delete(synchronize_session=False)
+    db.query(models.UserStats).filter(models.UserStats.user_id == user_id).delete(synchronize_session=False)
+
+    # Aggregate per (symbol, currency, day) in SQL, convert the groups in one pass
+    day = func.coalesce(models.Trade.exit_date, models.Trade.entry_date)
+    groups = db.query(
+        models.Trade.symbol, models.Trade.currency, day, *_trade_aggregates(), *_holding_aggregates()
+    ).filter(models.Trade.user_id == user_id).group_by(models.Trade.symbol, models.Trade.currency, day).all()
+    rates = fx.factors(db, user_id, [g.currency for g in groups], [g[2] for g in groups])
+
+    totals, by_symbol = dict.fromkeys(TRADE_COLUMNS, 0), {}
+    for group, rate in zip(groups, rates.tolist()):
+        symbol_totals = by_symbol.setdefault(group.symbol, dict.fromkeys(TRADE_COLUMNS + HOLDING_COLUMNS, 0))
+        for col in TRADE_COLUMNS:
+            value = getattr(group, col) * rate if col in MONEY_COLUMNS else getattr(group, col)
+            totals[col] += value
+            symbol_totals[col] += value
+        for col in HOLDING_COLUMNS:
+            symbol_totals[col] += int(round(getattr(group, col)))
+
+    deposits = db.query(
+        models.Deposit.currency, models.Deposit.deposit_date, func.sum(models.Deposit.amount), func.count(models.Deposit.id),
+    ).filter(models.Deposit.user_id == user_id).group_by(models.Deposit.currency, models.Deposit.deposit_date).all()
+    rates = fx.factors(db, user_id, [d[0] for d in deposits], [d[1] for d in deposits])
+
+    stats = models.UserStats(
+        user_id=user_id,
+        total_deposited=float(sum(d[2] * rate for d, rate in zip(deposits, rates.tolist()))),
+        deposit_count=sum(d[3] for d in deposits),
+        **totals
+    )
+    db.add(stats)
+
+    for symbol, symbol_totals in by_symbol.items():
+        db.add(models.SymbolStats(user_id=user_id, symbol=symbol, **symbol_totals))
+
+    db.flush()
+    refresh_extremes(db, user_id)
+    return stats
+
+def get_user_stats(db: Session, user_id: int) -> models.UserStats:
+    """Get a user's aggregate row, building it from raw history on first use"""
+    stats = db.get(models.UserStats, user_id)
+    if stats is not None:
+        return stats
+
+    # Claim the row before building: the INSERT takes the write lock, so of two
+    # first requests one builds while the other waits, then finds its row
+    claim = insert(models.UserStats.__table__).values(user_id=user_id).on_conflict_do_nothing(index_elements=["user_id"])
+    if not db.execute(claim).rowcount:
+        return db.get(models.UserStats, user_id, populate_existing=True)
+    stats = rebuild_user_stats(db, user_id)
+    # First touch for this user, backfill the daily rollup from the same state
+    rollups.rebuild_user(db, user_id)
+    return stats
+
+def summary(stats: models.UserStats) -> dict:
+    """Portfolio summary (routers.stats.SummaryResponse) from an aggregate row"""
+    return {
+        "total_deposited": stats.total_deposited,
+        "deposit_count": stats.deposit_count,
+        "total_pl": stats.total_pl,
+        "account_value": stats.total_deposited + stats.total_pl,
+        "roi": (stats.total_pl / stats.total_deposited) * 100 if stats.total_deposited > 0 else 0,
+        "total_trades": stats.trade_count,
+        "open_trades": stats.open_trades,
+        "closed_trades": stats.closed_trades,
+        "wins": stats.wins,
+        "losses": stats.losses,
+        "win_rate": (stats.wins / stats.closed_trades) * 100 if stats.closed_trades > 0 else 0,
+        "avg_win": stats.gross_profit / stats.wins if stats.wins > 0 else 0,
+        "avg_loss": stats.gross_loss / stats.losses if stats.losses > 0 else 0,
+    }
+
+def symbol_summary(row: models.SymbolStats) -> dict:
+    """Per-symbol statistics (routers.analytics.SymbolAnalytics) from an aggregate row"""
+    closed = row.closed_trades > 0
+    return {
+        "symbol": row.symbol,
+        "trade_count": row.trade_count,
+        "open_trades": row.open_trades,
+        "closed_trades": row.closed_trades,
+        "wins": row.wins,
+        "losses": row.losses,
+        "win_rate": (row.wins / row.closed_trades) * 100 if closed else 0,
+        "total_pl": row.total_pl,
+        "avg_pl": row.total_pl / row.closed_trades if closed else 0,
+        "avg_holding_days": row.holding_days / row.held_trades if row.held_trades > 0 else None,
+        "best_trade_id": row.best_trade_id if closed else None,
+        "best_pl": row.best_pl if closed else None,
+        "worst_trade_id": row.worst_trade_id if closed else None,
+        "worst_pl": row.worst_pl if closed else None,
+    }
+
+def _extremes(trades) -> tuple:
+    """The (best, worst) closed trade among `trades` by profit_loss, or (None, None)"""
+    closed = [trade for trade in trades if trade.profit_loss is not None]
+    if not closed:
+        return None, None
+    return max(closed, key=lambda t: t.profit_loss), min(closed, key=lambda t: t.profit_loss)
+
+def _extreme_values(trades, sign: int) -> dict:
+    """
+    Column updates keeping best/worst trade ids current. Adding a trade
+    that beats the stored extreme replaces it (its id is None before the
+    insert is flushed, which marks it unknown); removing the stored extreme
+    clears its id but keeps its P&L as a bound. Unknown ids are recomputed
+    on read by refresh_extremes.
+    """
+    model = models.SymbolStats
+    if sign < 0:
+        removed = [trade.id for trade in trades if trade.profit_loss is not None]
+        if not removed:
+            return {}
+        return {
+            model.best_trade_id: case((model.best_trade_id.in_(removed), None), else_=model.best_trade_id),
+            model.worst_trade_id: case((model.worst_trade_id.in_(removed), None), else_=model.worst_trade_id),
+        }
+
+    best, worst = _extremes(trades)
+    if best is None:
+        return {}
+    # SET expressions see the row before this UPDATE, so closed_trades == 0 means no previous extreme
+    better = or_(model.closed_trades == 0, model.best_pl < best.profit_loss)
+    worse = or_(model.closed_trades == 0, model.worst_pl > worst.profit_loss)
+    return {
+        model.best_trade_id: case((better, getattr(best, "id", None)), else_=model.best_trade_id),
+        model.best_pl: case((better, best.profit_loss), else_=model.best_pl),
+        model.worst_trade_id: case((worse, getattr(worst, "id", None)), else_=model.worst_trade_id),
+        model.worst_pl: case((worse, worst.profit_loss), else_=model.worst_pl),
+    }
+
+def refresh_extremes(db: Session, user_id: int):
+    """Look up the best/worst trade of every symbol whose stored one is unknown (two index seeks each)"""
+    stale = db.query(models.SymbolStats).filter(
+        models.SymbolStats.user_id == user_id,
+        models.SymbolStats.closed_trades > 0,
+        or_(models.SymbolStats.best_trade_id.is_(None), models.SymbolStats.worst_trade_id.is_(None))
+    ).all()
+    pl = models.Trade.profit_loss
+    for row in stale:
+        closed = db.query(models.Trade.id, pl).filter(
+            models.Trade.user_id == user_id,
+            models.Trade.symbol == row.symbol,
+            pl.isnot(None)
+        )
+        row.best_trade_id, row.best_pl = closed.order_by(pl.desc(), models.Trade.id.desc()).first() or (None, None)
+        row.worst_trade_id, row.worst_pl = closed.order_by(pl, models.Trade.id).first() or (None, None)
+    if stale:
+        db.flush()
+
+def apply_trade(db: Session, trade: models.Trade, sign: int = 1):
+    """
+    Add (sign=1) or remove (sign=-1) a trade's contribution to the aggregates.
+    Must be called while the database still reflects the state *before* the
+    change (before add, before delete, before setting new field values).
+    """
+    apply_trades(db, trade.user_id, [trade], sign)
+
+def apply_trades(db: Session, user_id: int, trades, sign: int = 1):
+    """Apply the combined contribution of many trades, one UPDATE per symbol"""
+    get_user_stats(db, user_id)
+
+    trades = list(trades)
+    total, by_symbol, symbol_trades = {}, {}, {}
+    for trade, pl in zip(trades, base_profit_loss(db, user_id, trades)):
+        symbol_delta = by_symbol.setdefault(trade.symbol, {})
+        symbol_trades.setdefault(trade.symbol, []).append(trade)
+        for col, value in _trade_delta(pl, sign).items():
+            total[col] = total.get(col, 0) + value
+            symbol_delta[col] = symbol_delta.get(col, 0) + value
+        for col, value in _holding_delta(trade, sign).items():
+            symbol_delta[col] = symbol_delta.get(col, 0) + value
+    if not total:
+        return
+
+    _increment(db, models.UserStats, (models.UserStats.user_id == user_id,), total)
+
+    for symbol, delta in by_symbol.items():
+        matched = _increment(db, models.SymbolStats, (
+            models.SymbolStats.user_id == user_id,
+            models.SymbolStats.symbol == symbol,
+        ), delta, _extreme_values(symbol_trades[symbol], sign))
+        if not matched:
+            # First trade for this symbol
+            best, worst = _extremes(symbol_trades[symbol])
+            db.add(models.SymbolStats(
+                user_id=user_id,
+                symbol=symbol,
+                best_trade_id=getattr(best, "id", None),
+                best_pl=best.profit_loss if best else None,
+                worst_trade_id=getattr(worst, "id", None),
+                worst_pl=worst.profit_loss if worst else None,
+                **{col: delta.get(col, 0) for col in TRADE_COLUMNS + HOLDING_COLUMNS}
+            ))
+            db.flush()
+
+def base_profit_loss(db: Session, user_id: int, trades) -> list:
+    """Trades' P&L in the user's base currency at their exit date (None while open)"""
+    closed = [trade for trade in trades if trade.profit_loss is not None]
+    rates = iter(fx.factors(
+        db, user_id,
+        [trade.currency for trade in closed],
+        [trade.exit_date or trade.entry_date for trade in closed],
+    ).tolist())
+    return [None if trade.profit_loss is None else trade.profit_loss * next(rates) for trade in trades]
+
+def apply_deposit(db: Session, deposit: models.Deposit, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) a deposit's contribution to the aggregates"""
+    apply_deposits(db, deposit.user_id, [deposit], sign)
+
+def apply_deposits(db: Session, user_id: int, deposits, sign: int = 1):
+    """Apply the combined contribution of many deposits in one UPDATE"""
+    get_user_stats(db, user_id)
+
+    deposits = list(deposits)
+    if not deposits:
+        return
+    rates = fx.factors(db, user_id, [d.currency for d in deposits], [d.deposit_date for d in deposits])
+    _increment(db, models.UserStats, (models.UserStats.user_id == user_id,), {
+        "total_deposited": sign * float(np.dot([d.amount for d in deposits], rates)),
+        "deposit_count": sign * len(deposits),
+    })
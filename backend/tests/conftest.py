@@ -0,0 +1,44 @@
+"""
+Shared fixtures. Settings are read from the environment when backend modules
+are imported, so they are pointed at a scratch directory first.
+"""
+import os
+import sys
+import tempfile
+import uuid
+import pytest
+
+WORK_DIR = tempfile.mkdtemp(prefix="tradetracker-tests-")
+os.environ["TRADETRACKER_DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'tradetracker.db')}"
+os.environ["TRADETRACKER_JOB_DIR"] = os.path.join(WORK_DIR, "jobs")
+os.environ["TRADETRACKER_SHARD_DIR"] = os.path.join(WORK_DIR, "shards")
+for name in ("TRADETRACKER_SHARDS", "TRADETRACKER_PRICE_FILE"):
+    os.environ.pop(name, None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.app)
+
+@pytest.fixture
+def user(client):
+    """A newly registered user: SimpleNamespace(id, email, headers)"""
+    from types import SimpleNamespace
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    response = client.post("/api/auth/register", json={"email": email, "password": "secret"})
+    assert response.status_code == 200, response.text
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    user_id = client.get("/api/auth/me", headers=headers).json()["id"]
+    return SimpleNamespace(id=user_id, email=email, headers=headers)
+
+@pytest.fixture
+def db(client):
+    """A session on the test database, rolled back and closed afterwards"""
+    from database import SessionLocal
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.close()
@@ -0,0 +1,89 @@
+import json
+import os
+import numpy as np
+import pytest
+import analytics
+import fx
+import models
+import snapshots
+from routers.analytics import RiskAdapter
+
+TRADES = [
+    # symbol, entry, exit, entry price, exit price, shares, stop
+    ("AAPL", "2025-01-02", "2025-01-06", 100, 110, 10, 95),
+    ("NVDA", "2025-01-03", "2025-01-07", 50, 45, 20, 48),
+    ("AAPL", "2025-01-06", "2025-01-08", 105, 101, 10, None),
+    ("MSFT", "2025-01-07", "2025-01-13", 300, 330, 2, 290),
+    ("NVDA", "2025-01-08", "2025-01-14", 46, 52, 20, 44),
+    ("AAPL", "2025-01-10", None, 100, None, 5, 90),
+]
+
+def add_trade(client, user, symbol, entry, exit_, entry_price, exit_price, shares, stop=None):
+    response = client.post("/api/trades/", json={
+        "symbol": symbol, "entry_date": entry, "exit_date": exit_, "entry_price": entry_price,
+        "exit_price": exit_price, "shares": shares, "stop_price": stop,
+    }, headers=user.headers)
+    assert response.status_code == 201, response.text
+
+@pytest.fixture
+def trades(client, user):
+    client.post("/api/deposits/", json={"amount": 10000, "deposit_date": "2025-01-01"}, headers=user.headers)
+    for trade in TRADES:
+        add_trade(client, user, *trade)
+
+def db_risk_trades(db, user_id, date_from=None, date_to=None, symbol=None) -> dict:
+    """load_risk_trades' arrays queried from the trades table instead of the snapshot"""
+    query = db.query(models.Trade).filter(models.Trade.user_id == user_id, models.Trade.exit_date.isnot(None))
+    if date_from:
+        query = query.filter(models.Trade.exit_date >= date_from)
+    if date_to:
+        query = query.filter(models.Trade.exit_date <= date_to)
+    if symbol:
+        query = query.filter(models.Trade.symbol == symbol)
+    rows = query.order_by(models.Trade.exit_date, models.Trade.id).all()
+    native = np.array([t.profit_loss for t in rows], dtype=np.float64)
+    exit_dates = [t.exit_date for t in rows]
+    return {
+        "entry_days": fx.day_numbers([t.entry_date for t in rows]),
+        "exit_days": fx.day_numbers(exit_dates),
+        "native_pl": native,
+        "profit_loss": native * fx.factors(db, user_id, [t.currency for t in rows], exit_dates),
+        "risk": np.array([abs(t.entry_price - (t.stop_price or t.entry_price)) * t.shares for t in rows]),
+    }
+
+@pytest.mark.parametrize("params", [{}, {"from": "2025-01-07", "to": "2025-01-13"}, {"symbol": "NVDA"}])
+def test_risk_metrics_from_the_snapshot_match_the_database(client, user, db, trades, params):
+    response = client.get("/api/analytics/risk", params=params, headers=user.headers)
+    assert response.status_code == 200, response.text
+
+    metrics = analytics.risk_metrics(
+        db_risk_trades(db, user.id, params.get("from"), params.get("to"), params.get("symbol")),
+        analytics.load_daily(db, user.id),
+    )
+    db.rollback()
+    assert response.json() == json.loads(RiskAdapter.dump_json(metrics))
+
+def test_risk_metrics_of_known_trades(client, user, trades):
+    risk = client.get("/api/analytics/risk", headers=user.headers).json()
+    assert (risk["trades"], risk["wins"], risk["losses"]) == (5, 3, 2)
+    assert risk["net_pl"] == pytest.approx(100 - 100 - 40 + 60 + 120)
+    # Four of them have a stop: +2R, -2.5R, +3R, +3R
+    assert risk["r_multiples"]["trades"] == 4
+    assert risk["r_multiples"]["expectancy"] == pytest.approx((2 - 2.5 + 3 + 3) / 4)
+    assert risk["r_multiples"]["worst"] == pytest.approx(-2.5)
+
+def test_snapshot_file_is_reused_until_trades_change(client, user, db, trades):
+    first = client.get("/api/analytics/risk", headers=user.headers).json()
+    path = snapshots._location(db, user.id)[0]
+    db.rollback()
+    written = os.stat(path).st_mtime_ns
+
+    # Not in the LRU any more: mapped again from the file rather than rebuilt
+    snapshots.snapshot_cache.clear()
+    assert client.get("/api/analytics/risk", headers=user.headers).json() == first
+    assert os.stat(path).st_mtime_ns == written
+
+    add_trade(client, user, "AMD", "2025-01-14", "2025-01-15", 10, 9, 10)
+    changed = client.get("/api/analytics/risk", headers=user.headers).json()
+    assert (changed["trades"], changed["losses"]) == (6, 3)
+    assert changed["net_pl"] == pytest.approx(first["net_pl"] - 10)
@@ -0,0 +1,40 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import passwords
+import routers.auth
+
+def register(client, email):
+    return client.post("/api/auth/register", json={"email": email, "password": "secret"})
+
+def test_register_rejects_a_taken_email(client, user):
+    response = register(client, user.email)
+    assert response.status_code == 400 and response.json()["detail"] == "Email already registered"
+
+def test_register_race_on_the_same_email(client, monkeypatch):
+    # Both requests pass the existence check before either inserts
+    monkeypatch.setattr(routers.auth, "find_user", lambda db, email: None)
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    with ThreadPoolExecutor(4) as pool:
+        responses = list(pool.map(lambda _: register(client, email), range(4)))
+    assert sorted(r.status_code for r in responses) == [200, 400, 400, 400]
+    assert {r.json()["detail"] for r in responses if r.status_code == 400} == {"Email already registered"}
+
+def test_login_after_register(client, user):
+    response = client.post("/api/auth/login", data={"username": user.email, "password": "secret"})
+    assert response.status_code == 200
+    assert client.post("/api/auth/login", data={"username": user.email, "password": "wrong"}).status_code == 401
+
+def test_login_for_an_unknown_email_still_verifies(client, user, monkeypatch):
+    verified = []
+    real_verify = passwords.verify_password_async
+
+    async def verify(plain_password, hashed_password):
+        verified.append(hashed_password)
+        return await real_verify(plain_password, hashed_password)
+
+    monkeypatch.setattr(passwords, "verify_password_async", verify)
+    unknown = client.post("/api/auth/login", data={"username": f"nobody-{user.email}", "password": "secret"})
+    wrong = client.post("/api/auth/login", data={"username": user.email, "password": "wrong"})
+    assert (unknown.status_code, wrong.status_code) == (401, 401)
+    assert unknown.json() == wrong.json()
+    assert len(verified) == 2 and all(h.startswith("$argon2") for h in verified)
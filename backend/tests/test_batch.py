@@ -0,0 +1,73 @@
+import pytest
+import stats
+
+def create(client, user, **fields):
+    trade = {"symbol": "AAPL", "entry_date": "2025-01-02", "entry_price": 100, "shares": 1, **fields}
+    response = client.post("/api/trades/", json=trade, headers=user.headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+def batch(client, user, kind, operations):
+    return client.post(f"/api/{kind}/batch", json={"operations": operations}, headers=user.headers)
+
+def listed(client, user):
+    return sorted((t["symbol"], t["exit_price"]) for t in client.get("/api/trades/", headers=user.headers).json())
+
+def test_trade_batch_applies_in_one_transaction(client, user, db):
+    kept, removed = create(client, user), create(client, user, symbol="MSFT")
+    response = batch(client, user, "trades", [
+        {"op": "create", "trade": {"symbol": "nvda", "entry_date": "2025-01-03", "entry_price": 50, "shares": 2,
+                                   "exit_date": "2025-01-09", "exit_price": 60}},
+        {"op": "update", "id": kept, "trade": {"exit_date": "2025-01-10", "exit_price": 90}},
+        {"op": "delete", "id": removed},
+    ])
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert [(r["op"], r["trade"] and r["trade"]["profit_loss"]) for r in results] == [
+        ("create", 20.0), ("update", -10.0), ("delete", None),
+    ]
+    assert results[1]["id"] == kept and results[2]["id"] == removed
+    assert listed(client, user) == [("AAPL", 90.0), ("NVDA", 60.0)]
+
+    summary = client.get("/api/stats/summary", headers=user.headers).json()
+    assert (summary["total_trades"], summary["wins"], summary["losses"], summary["total_pl"]) == (2, 1, 1, 10)
+    rebuilt = stats.summary(stats.rebuild_user_stats(db, user.id))
+    db.rollback()
+    assert summary == pytest.approx(rebuilt)
+
+@pytest.mark.parametrize("operations, status", [
+    (lambda kept: [{"op": "delete", "id": 0}], 404),
+    (lambda kept: [{"op": "update", "id": kept, "trade": {"notes": "x"}}, {"op": "delete", "id": kept}], 400),
+])
+def test_rejected_trade_batch_applies_nothing(client, user, operations, status):
+    kept = create(client, user)
+    created = {"op": "create", "trade": {"symbol": "NVDA", "entry_date": "2025-01-03", "entry_price": 50, "shares": 1}}
+    assert batch(client, user, "trades", [created] + operations(kept)).status_code == status
+    assert listed(client, user) == [("AAPL", None)]
+
+def test_fill_derived_trades_are_not_batch_edited(client, user):
+    client.post("/api/fills/", json={"symbol": "AAPL", "side": "buy", "quantity": 5, "price": 100,
+                                     "executed_at": "2025-01-02T10:00:00"}, headers=user.headers)
+    (trade,) = client.get("/api/trades/", headers=user.headers).json()
+    response = batch(client, user, "trades", [{"op": "update", "id": trade["id"], "trade": {"shares": 1}}])
+    assert response.status_code == 409
+    assert client.get("/api/trades/", headers=user.headers).json() == [trade]
+
+def test_deposit_batch(client, user):
+    first = client.post("/api/deposits/", json={"amount": 100, "deposit_date": "2025-01-01"},
+                        headers=user.headers).json()["id"]
+    second = client.post("/api/deposits/", json={"amount": 200, "deposit_date": "2025-01-02"},
+                         headers=user.headers).json()["id"]
+    response = batch(client, user, "deposits", [
+        {"op": "create", "deposit": {"amount": 50, "deposit_date": "2025-01-03"}},
+        {"op": "update", "id": first, "deposit": {"amount": 150}},
+        {"op": "delete", "id": second},
+    ])
+    assert response.status_code == 200, response.text
+    assert [r["op"] for r in response.json()] == ["create", "update", "delete"]
+    deposits = client.get("/api/deposits/", headers=user.headers).json()
+    assert sorted(d["amount"] for d in deposits) == [50, 150]
+    summary = client.get("/api/stats/summary", headers=user.headers).json()
+    assert (summary["total_deposited"], summary["deposit_count"]) == (200, 2)
+
+    assert batch(client, user, "deposits", [{"op": "delete", "id": second}]).status_code == 404
@@ -0,0 +1,52 @@
+import caching
+import routers.trades
+from database import SessionLocal
+
+def create(client, user, symbol="AAPL"):
+    response = client.post("/api/trades/", json={
+        "symbol": symbol, "entry_date": "2025-01-02", "entry_price": 100, "shares": 1,
+    }, headers=user.headers)
+    assert response.status_code == 201, response.text
+
+def test_unchanged_list_is_not_modified(client, user):
+    create(client, user)
+    first = client.get("/api/trades/", headers=user.headers)
+    etag = first.headers["ETag"]
+    cached = client.get("/api/trades/", headers=user.headers)
+    assert (cached.headers["ETag"], cached.content) == (etag, first.content)
+
+    conditional = {**user.headers, "If-None-Match": etag}
+    assert client.get("/api/trades/", headers=conditional).status_code == 304
+    # Another query of the same list has its own tag
+    assert client.get("/api/trades/", params={"limit": 5}, headers=conditional).status_code == 200
+
+    create(client, user, "NVDA")
+    changed = client.get("/api/trades/", headers=conditional)
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert len(changed.json()) == 2
+
+def test_deposits_change_the_summary_tag(client, user):
+    etag = client.get("/api/stats/summary", headers=user.headers).headers["ETag"]
+    client.post("/api/deposits/", json={"amount": 100, "deposit_date": "2025-01-01"}, headers=user.headers)
+    response = client.get("/api/stats/summary", headers={**user.headers, "If-None-Match": etag})
+    assert response.status_code == 200 and response.json()["total_deposited"] == 100
+
+def test_change_committed_while_building_is_not_tagged(client, user, monkeypatch):
+    create(client, user)
+    paginate = routers.trades.paginate_trades
+
+    def paginate_during_a_write(*args, **kwargs):
+        # Another request commits after the versions were read
+        with SessionLocal() as other:
+            caching.bump(other, user.id, "trades")
+            other.commit()
+        return paginate(*args, **kwargs)
+
+    monkeypatch.setattr(routers.trades, "paginate_trades", paginate_during_a_write)
+    raced = client.get("/api/trades/", headers=user.headers)
+    assert raced.status_code == 200 and len(raced.json()) == 1
+    assert "ETag" not in raced.headers and raced.headers["Cache-Control"] == "no-store"
+
+    monkeypatch.setattr(routers.trades, "paginate_trades", paginate)
+    settled = client.get("/api/trades/", headers=user.headers)
+    assert "ETag" in settled.headers and settled.headers["Cache-Control"] != "no-store"
@@ -0,0 +1,33 @@
+import asyncio
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+import database
+import models
+
+def journal_mode(db: Session) -> str:
+    return db.execute(text("PRAGMA journal_mode")).scalar()
+
+def test_run_drives_a_sync_session_in_the_threadpool(db):
+    assert asyncio.run(database.run(db, journal_mode)) == "wal"
+
+def test_run_drives_an_async_session(tmp_path):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async def main():
+        engine = database.create_async_db_engine(f"sqlite:///{tmp_path / 'async.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        async with async_sessionmaker(engine)() as db:
+            def add_user(db: Session, email: str) -> int:
+                user = models.User(email=email, hashed_password="x")
+                db.add(user)
+                db.commit()
+                return user.id
+
+            user_id = await database.run(db, add_user, "async@example.com")
+            mode = await database.run(db, journal_mode)
+            email = await database.run(db, lambda db: db.get(models.User, user_id).email)
+        await engine.dispose()
+        return mode, email
+
+    assert asyncio.run(main()) == ("wal", "async@example.com")
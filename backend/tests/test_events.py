@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import events
+
+def drain(queue) -> list:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait()["type"])
+    return items
+
+def test_full_queue_is_replaced_by_one_resync():
+    async def scenario():
+        hub = events.EventHub(queue_size=3)
+        slow, other = hub.subscribe(1), hub.subscribe(2)
+        for n in range(5):
+            hub.publish(1, f"trade.{n}")
+        hub.publish(2, "trade.x")
+        behind = drain(slow)
+        # A stream that resynced carries on with new events
+        hub.publish(1, "trade.5")
+        return behind, drain(slow), drain(other)
+
+    behind, after, other = asyncio.run(scenario())
+    # trade.3 found the queue full: the backlog became one resync, trade.4 follows it
+    assert behind == ["resync", "trade.4"]
+    assert after == ["trade.5"] and other == ["trade.x"]
+
+def test_publish_from_a_thread_and_stream_cleanup():
+    async def scenario():
+        hub = events.hub
+        body = events.stream(7, heartbeat=0.01)
+        assert (await body.__anext__()).startswith("retry:")
+        assert await body.__anext__() == ": keep-alive\n\n"
+
+        # As a sync route would, from a threadpool thread
+        thread = threading.Thread(target=hub.publish, args=(7, "trade.created", {"id": 1}))
+        thread.start()
+        thread.join()
+        message = await body.__anext__()
+        while message == ": keep-alive\n\n":
+            message = await body.__anext__()
+        subscribed = hub.has_subscribers(7)
+        await body.aclose()
+        return message, subscribed, hub.has_subscribers(7)
+
+    message, subscribed, still_subscribed = asyncio.run(scenario())
+    assert message == 'event: trade.created\ndata: {"id": 1}\n\n'
+    assert subscribed and not still_subscribed
+
+def test_changes_without_streams_skip_the_summary():
+    # No open stream: returns before touching the session
+    events.publish_change(None, 12345, "trade.created", {})
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+import time
+import pytest
+import jobs
+
+def create(client, user, **fields):
+    trade = {"symbol": "AAPL", "entry_date": "2025-01-02", "entry_price": 100, "shares": 1, **fields}
+    response = client.post("/api/trades/", json=trade, headers=user.headers)
+    assert response.status_code == 201, response.text
+
+@pytest.fixture
+def ledger(client, user):
+    client.post("/api/deposits/", json={"amount": 1000, "deposit_date": "2025-01-05"}, headers=user.headers)
+    create(client, user, exit_date="2025-01-05", exit_price=150)   # +50, after the same day's deposit
+    create(client, user, exit_date="2025-01-03", exit_price=80)    # -20
+    create(client, user, entry_date="2025-01-04")                  # Open, dated by its entry
+    create(client, user, exit_date="2025-02-01", exit_price=130, notes="second, half")  # +30
+
+def export(client, user, **params) -> list:
+    response = client.get("/api/trades/export", params={"format": "ndjson", **params}, headers=user.headers)
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_ledger_is_date_ordered_with_running_pl(client, user, ledger):
+    rows = export(client, user)
+    assert [(row["type"], row["date"]) for row in rows] == [
+        ("trade", "2025-01-03"), ("trade", "2025-01-04"), ("deposit", "2025-01-05"),
+        ("trade", "2025-01-05"), ("trade", "2025-02-01"),
+    ]
+    assert [row["running_realized_pl"] for row in rows] == pytest.approx([-20, -20, -20, 30, 60])
+
+def test_csv_export_with_selected_fields_and_range(client, user, ledger):
+    response = client.get("/api/trades/export", params={
+        "from": "2025-01-04", "to": "2025-02-28", "fields": "date,type,notes,running_realized_pl",
+    }, headers=user.headers)
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0]) == ["type", "date", "notes", "running_realized_pl"]
+    assert [row["date"] for row in rows] == ["2025-01-04", "2025-01-05", "2025-01-05", "2025-02-01"]
+    assert rows[-1]["notes"] == "second, half"
+    assert float(rows[-1]["running_realized_pl"]) == pytest.approx(80)
+
+def test_export_job_writes_the_same_ledger(client, user, ledger):
+    response = client.post("/api/jobs/export", params={"format": "ndjson"}, headers=user.headers)
+    assert response.status_code == 202, response.text
+    job_id = response.json()["id"]
+    deadline = time.monotonic() + 10
+    while True:
+        job = client.get(f"/api/jobs/{job_id}", headers=user.headers).json()
+        if job["status"] not in jobs.ACTIVE_STATUSES:
+            break
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert job["status"] == "succeeded" and job["result"]["rows"] == 5
+
+    download = client.get(f"/api/jobs/{job_id}/download", headers=user.headers)
+    assert [json.loads(line) for line in download.text.splitlines()] == export(client, user)
@@ -0,0 +1,70 @@
+from datetime import date
+import json
+import numpy as np
+import pytest
+import fx
+import rollups
+import stats
+
+RATES = [
+    # USD value of one unit
+    ("EUR", date(2025, 1, 1), 1.10), ("EUR", date(2025, 2, 1), 1.20),
+    ("AUD", date(2025, 1, 1), 0.625),
+]
+
+@pytest.fixture(scope="module")
+def rates(client, tmp_path_factory):
+    """RATES loaded into the test database (a CSV rates file through fx.load_rates)"""
+    from database import SessionLocal
+    path = tmp_path_factory.mktemp("fx") / "rates.csv"
+    path.write_text("date,currency,rate\n" + "".join(f"{day},{cur.lower()},{rate}\n" for cur, day, rate in RATES))
+    with SessionLocal() as db:
+        assert fx.load_rates(db, str(path)) == len(RATES)
+        db.commit()
+
+def test_rates_apply_from_their_date_until_the_next():
+    table = fx.RateTable(RATES)
+    days = fx.day_numbers([date(2024, 12, 1), date(2025, 1, 31), date(2025, 2, 1), date(2025, 6, 1)])
+    assert table.usd_rates("EUR", days) == pytest.approx([1.10, 1.10, 1.20, 1.20])
+    # EUR -> AUD goes through USD; base-currency amounts are left alone
+    factors = table.factors(["EUR", "AUD", "USD"], days[:3], "AUD")
+    assert factors == pytest.approx([1.10 / 0.625, 1.0, 1 / 0.625])
+    assert table.factors(np.array(["USD", "USD"]), days[:2], "USD") == pytest.approx([1, 1])
+    with pytest.raises(fx.FxError):
+        table.usd_rates("JPY", days)
+
+def test_amounts_are_converted_to_the_base_currency(client, user, db, rates):
+    client.post("/api/deposits/", json={"amount": 1000, "currency": "EUR", "deposit_date": "2025-01-05"},
+                headers=user.headers)
+    for exit_date in ("2025-01-10", "2025-02-10"):
+        response = client.post("/api/trades/", json={
+            "symbol": "SAP", "currency": "EUR", "entry_date": "2025-01-02", "entry_price": 100, "shares": 1,
+            "exit_date": exit_date, "exit_price": 110,
+        }, headers=user.headers)
+        assert response.status_code == 201, response.text
+
+    summary = client.get("/api/stats/summary", headers=user.headers).json()
+    assert summary["total_deposited"] == pytest.approx(1100)
+    assert summary["total_pl"] == pytest.approx(10 * 1.10 + 10 * 1.20)
+
+    response = client.patch("/api/auth/me", json={"base_currency": "AUD"}, headers=user.headers)
+    assert response.status_code == 200 and response.json()["base_currency"] == "AUD"
+    summary = client.get("/api/stats/summary", headers=user.headers).json()
+    assert summary["total_deposited"] == pytest.approx(1100 / 0.625)
+    assert summary["total_pl"] == pytest.approx((11 + 12) / 0.625)
+    export = client.get("/api/trades/export", params={"format": "ndjson"}, headers=user.headers)
+    assert json.loads(export.text.splitlines()[-1])["running_realized_pl"] == pytest.approx(23 / 0.625)
+
+    rebuilt = stats.summary(stats.rebuild_user_stats(db, user.id))
+    drift = rollups.verify_user(db, user.id)
+    db.rollback()
+    assert summary == pytest.approx(rebuilt) and drift == []
+
+def test_currency_without_rates_is_refused(client, user, rates):
+    response = client.post("/api/trades/", json={
+        "symbol": "SONY", "currency": "JPY", "entry_date": "2025-01-02", "entry_price": 100, "shares": 1,
+        "exit_date": "2025-01-10", "exit_price": 110,
+    }, headers=user.headers)
+    assert response.status_code == 400 and "JPY" in response.json()["detail"]
+    assert client.get("/api/trades/", headers=user.headers).json() == []
+    assert client.patch("/api/auth/me", json={"base_currency": "JPY"}, headers=user.headers).status_code == 400
@@ -0,0 +1,82 @@
+import pytest
+import models
+import rollups
+import stats
+
+FILLS_HEADER = "Trade Date,Symbol,Side,Units,Avg. Price,Fees,Currency\n"
+
+def upload(client, user, text):
+    return client.post(
+        "/api/trades/import", files={"file": ("export.csv", text.encode(), "text/csv")}, headers=user.headers,
+    )
+
+def trade_rows(client, user, symbol):
+    trades = client.get("/api/trades/", params={"symbol": symbol, "limit": 1000}, headers=user.headers).json()
+    return sorted((t["entry_date"], t["exit_date"] or "", t["shares"]) for t in trades)
+
+def assert_aggregates_match_rebuild(db, user_id):
+    """The delta-maintained aggregates and rollups equal a rebuild from the raw tables"""
+    db.expire_all()
+    kept = {col: getattr(stats.get_user_stats(db, user_id), col) for col in stats.TRADE_COLUMNS}
+    rebuilt = stats.rebuild_user_stats(db, user_id)
+    assert kept == pytest.approx({col: getattr(rebuilt, col) for col in stats.TRADE_COLUMNS})
+    assert rollups.verify_user(db, user_id) == []
+
+def test_trades_import_reports_bad_rows(client, user):
+    response = upload(client, user, (
+        "Symbol,Entry Date,Entry Price,Shares\n"
+        "aapl,2025-01-02,150,10\n"
+        "MSFT,not a date,300,5\n"
+        "NVDA,2025-01-03,,5\n"
+        "\n"
+        "AMD,2025-01-06,120,3\n"
+    ))
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["imported"], result["failed"]) == (2, 2)
+    assert [error["row"] for error in result["errors"]] == [3, 4]
+    assert trade_rows(client, user, "AAPL") == [("2025-01-02", "", 10.0)]
+
+def test_fills_import_matches_newest_first_export(client, user, db):
+    response = upload(client, user, FILLS_HEADER + (
+        "2025-01-06,AAPL,Sell,12,120,1,USD\n"
+        "2025-01-03,NVDA,Buy,4,100,0,USD\n"
+        "2025-01-03,AAPL,Buy,5,110,1,USD\n"
+        "2025-01-02,AAPL,Buy,10,100,1,USD\n"
+        "2025-01-02,AAPL,Sideways,1,100,1,USD\n"
+    ))
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["imported"], result["failed"], result["errors"][0]["row"]) == (4, 1, 6)
+
+    assert trade_rows(client, user, "AAPL") == [
+        ("2025-01-02", "2025-01-06", 10.0),
+        ("2025-01-03", "", 3.0),
+        ("2025-01-03", "2025-01-06", 2.0),
+    ]
+    lots = client.get("/api/fills/lots", headers=user.headers).json()
+    assert [(lot["symbol"], lot["remaining"]) for lot in lots] == [("AAPL", 3.0), ("NVDA", 4.0)]
+    assert_aggregates_match_rebuild(db, user.id)
+
+def test_fills_import_continues_and_replays_stored_history(client, user, db):
+    assert upload(client, user, FILLS_HEADER + "2025-01-02,AAPL,Buy,10,100,0,USD\n").status_code == 200
+
+    # Later than the stored fills: matched against the stored open lot
+    assert upload(client, user, FILLS_HEADER + "2025-01-05,AAPL,Sell,4,110,0,USD\n").status_code == 200
+    assert trade_rows(client, user, "AAPL") == [("2025-01-02", "", 6.0), ("2025-01-02", "2025-01-05", 4.0)]
+
+    # Backdated: the symbol is replayed, so the earlier buy closes first
+    assert upload(client, user, FILLS_HEADER + "2025-01-01,AAPL,Buy,3,90,0,USD\n").status_code == 200
+    assert trade_rows(client, user, "AAPL") == [
+        ("2025-01-01", "2025-01-05", 3.0), ("2025-01-02", "", 9.0), ("2025-01-02", "2025-01-05", 1.0),
+    ]
+    assert_aggregates_match_rebuild(db, user.id)
+
+def test_fills_import_with_unmatched_sell_is_rolled_back(client, user, db):
+    response = upload(client, user, FILLS_HEADER + (
+        "2025-01-02,AAPL,Buy,10,100,0,USD\n"
+        "2025-01-03,AAPL,Sell,15,110,0,USD\n"
+    ))
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Row 3:")
+    assert db.query(models.Fill).filter(models.Fill.user_id == user.id).count() == 0
@@ -0,0 +1,165 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import pytest
+import jobs
+import models
+import rollups
+import stats
+
+FILLS = (
+    "Trade Date,Symbol,Side,Units,Avg. Price,Fees,Currency\n"
+    "2025-01-03,NVDA,Sell,2,110,0,USD\n"
+    "2025-01-02,NVDA,Buy,5,100,0,USD\n"
+    "2025-01-02,AAPL,Buy,10,100,0,USD\n"
+    "2025-01-02,AAPL,Sideways,1,100,0,USD\n"
+)
+
+TRADES = (
+    "Symbol,Entry Date,Entry Price,Shares\n"
+    "AAPL,2025-01-02,150,10\n"
+    "MSFT,2025-01-03,300,5\n"
+    "NVDA,2025-01-06,120,3\n"
+)
+
+def wait(client, user, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/api/jobs/{job_id}", headers=user.headers).json()
+        if job["status"] not in jobs.ACTIVE_STATUSES or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+def queued_job(db, user, kind, params, **columns):
+    """A committed queued job, not yet submitted to the runner"""
+    job = jobs.create_job(db, user.id, kind, params)
+    for column, value in columns.items():
+        setattr(job, column, value)
+    db.commit()
+    return job
+
+def symbols(client, user):
+    return sorted({t["symbol"] for t in client.get("/api/trades/", headers=user.headers).json()})
+
+def test_fills_import_job_commits_a_chunk_per_symbol(client, user, db):
+    response = client.post(
+        "/api/jobs/import", files={"file": ("fills.csv", FILLS.encode(), "text/csv")}, headers=user.headers,
+    )
+    assert response.status_code == 202, response.text
+    job = wait(client, user, response.json()["id"])
+    assert job["status"] == "succeeded", job
+    assert (job["result"]["imported"], job["result"]["failed"]) == (3, 1)
+    assert json.loads(db.get(models.Job, job["id"]).checkpoint)["symbols"] == 2
+    assert symbols(client, user) == ["AAPL", "NVDA"]
+    assert not os.path.exists(jobs.spool_path(user.id, job["id"]))
+
+def test_import_job_resumes_after_its_checkpoint(client, user, db):
+    job = queued_job(db, user, "import", {"filename": "trades.csv"}, checkpoint=json.dumps(
+        {"records": 2, "imported": 2, "failed": 0, "errors": []}
+    ))
+    with open(jobs.spool_path(user.id, job.id), "w") as f:
+        f.write(TRADES)
+    jobs.runner.submit(user.id, job.id)
+
+    finished = wait(client, user, job.id)
+    assert finished["status"] == "succeeded", finished
+    assert (finished["done"], finished["result"]["imported"]) == (3, 3)
+    assert symbols(client, user) == ["NVDA"]
+
+def test_fills_import_job_resumes_after_its_last_symbol(client, user, db):
+    job = queued_job(db, user, "import", {"filename": "fills.csv"}, checkpoint=json.dumps(
+        {"symbols": 1, "imported": 1}
+    ))
+    with open(jobs.spool_path(user.id, job.id), "w") as f:
+        f.write(FILLS)
+    jobs.runner.submit(user.id, job.id)
+
+    finished = wait(client, user, job.id)
+    assert finished["status"] == "succeeded", finished
+    assert (finished["result"]["imported"], finished["result"]["failed"]) == (3, 1)
+    assert symbols(client, user) == ["NVDA"]
+
+def test_new_fee_skips_trades_derived_from_fills(client, user, db):
+    for side, day in (("buy", 2), ("sell", 3)):
+        response = client.post("/api/fills/", json={
+            "symbol": "NVDA", "side": side, "quantity": 5, "price": 100, "fee": 1,
+            "executed_at": f"2025-01-0{day}T10:00:00",
+        }, headers=user.headers)
+        assert response.status_code == 201, response.text
+    client.post("/api/trades/", json={
+        "symbol": "AAPL", "entry_date": "2025-01-02", "entry_price": 100, "shares": 1,
+        "exit_date": "2025-01-03", "exit_price": 110,
+    }, headers=user.headers)
+
+    response = client.post("/api/jobs/recalculate", json={"brokerage_fee": 5}, headers=user.headers)
+    finished = wait(client, user, response.json()["id"])
+    assert finished["result"] == {"trades": 2, "changed": 1, "skipped": 1}, finished
+    fees = {t["symbol"]: t["brokerage_fee"] for t in client.get("/api/trades/", headers=user.headers).json()}
+    assert (fees["AAPL"], fees["NVDA"]) == (5, 2)
+
+    kept = stats.summary(stats.get_user_stats(db, user.id))
+    rebuilt = stats.summary(stats.rebuild_user_stats(db, user.id))
+    drift = rollups.verify_user(db, user.id)
+    db.rollback()
+    assert kept == pytest.approx(rebuilt) and drift == []
+
+def test_cancelled_job_does_not_run(client, user, db):
+    job = queued_job(db, user, "recalculate", {"brokerage_fee": 5.0})
+    assert client.delete(f"/api/jobs/{job.id}", headers=user.headers).status_code == 204
+    jobs.runner.submit(user.id, job.id)
+
+    finished = wait(client, user, job.id)
+    assert (finished["status"], finished["cancel_requested"], finished["done"]) == ("cancelled", True, 0)
+
+    # A finished job is deleted
+    assert client.delete(f"/api/jobs/{job.id}", headers=user.headers).status_code == 204
+    assert client.get(f"/api/jobs/{job.id}", headers=user.headers).status_code == 404
+
+def test_rejected_upload_creates_no_job(client, user):
+    before = set(os.listdir(jobs.JOB_DIR)) if os.path.isdir(jobs.JOB_DIR) else set()
+    response = client.post(
+        "/api/jobs/import", files={"file": ("x.csv", b"Foo,Bar\n1,2\n", "text/csv")}, headers=user.headers,
+    )
+    assert response.status_code == 400
+    assert client.get("/api/jobs/", headers=user.headers).json() == []
+    assert set(os.listdir(jobs.JOB_DIR)) == before
+
+SHARDED_EXPORTS = """
+import os, sys, time
+from fastapi.testclient import TestClient
+
+def export(client, email, symbol):
+    token = client.post("/api/auth/register", json={"email": email, "password": "secret"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/api/trades/", json={"symbol": symbol, "entry_date": "2025-01-02", "entry_price": 10, "shares": 1},
+                headers=headers)
+    job_id = client.post("/api/jobs/export", headers=headers).json()["id"]
+    while client.get(f"/api/jobs/{job_id}", headers=headers).json()["status"] != "succeeded":
+        time.sleep(0.05)
+    return job_id, headers
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.getcwd())
+    import main
+    with TestClient(main.app) as client:
+        (first_job, first), (second_job, second) = export(client, "a@example.com", "AAPL"), export(client, "b@example.com", "MSFT")
+        assert first_job == second_job == 1
+        assert "AAPL" in client.get("/api/jobs/1/download", headers=first).text
+        assert client.delete("/api/jobs/1", headers=first).status_code == 204
+        download = client.get("/api/jobs/1/download", headers=second)
+        assert download.status_code == 200 and "MSFT" in download.text and "AAPL" not in download.text
+"""
+
+def test_sharded_users_job_files_stay_apart(tmp_path):
+    # Settings are read at import, so the sharded app runs in its own process
+    script = tmp_path / "sharded_exports.py"
+    script.write_text(SHARDED_EXPORTS)
+    env = dict(
+        os.environ, TRADETRACKER_SHARDS="user", TRADETRACKER_DATABASE_URL=f"sqlite:///{tmp_path / 'main.db'}",
+        TRADETRACKER_SHARD_DIR=str(tmp_path / "shards"), TRADETRACKER_JOB_DIR=str(tmp_path / "jobs"),
+    )
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, str(script)], cwd=backend, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
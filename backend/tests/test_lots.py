@@ -0,0 +1,84 @@
+import pytest
+import rollups
+import stats
+
+def fill(client, user, side, quantity, price, day, **fields):
+    response = client.post("/api/fills/", json={
+        "symbol": "AAPL", "side": side, "quantity": quantity, "price": price,
+        "executed_at": f"2025-01-{day:02d}T10:00:00", **fields,
+    }, headers=user.headers)
+    return response
+
+def buy(client, user, quantity, price, day):
+    response = fill(client, user, "buy", quantity, price, day)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+def sell(client, user, quantity, price, day, **fields):
+    response = fill(client, user, "sell", quantity, price, day, **fields)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+def trades(client, user) -> list:
+    """(entry price, exit price or None, shares) of the fill-derived trades"""
+    rows = client.get("/api/trades/", headers=user.headers).json()
+    return sorted((t["entry_price"], t["exit_price"] or 0, t["shares"]) for t in rows)
+
+def remaining(client, user) -> list:
+    return [(lot["price"], lot["remaining"]) for lot in client.get("/api/fills/lots", headers=user.headers).json()]
+
+def assert_consistent(db, user_id):
+    kept = stats.summary(stats.get_user_stats(db, user_id))
+    rebuilt = stats.summary(stats.rebuild_user_stats(db, user_id))
+    drift = rollups.verify_user(db, user_id)
+    db.rollback()
+    assert kept == pytest.approx(rebuilt) and drift == []
+
+@pytest.fixture
+def lots(client, user):
+    return buy(client, user, 10, 100, 2), buy(client, user, 10, 110, 3)
+
+def test_fifo_sell_closes_the_oldest_lots(client, user, db, lots):
+    sell(client, user, 15, 120, 6)
+    assert trades(client, user) == [(100, 120, 10), (110, 0, 5), (110, 120, 5)]
+    assert remaining(client, user) == [(110, 5)]
+    assert_consistent(db, user.id)
+
+def test_lifo_sell_closes_the_newest_lots(client, user, db, lots):
+    sell(client, user, 15, 120, 6, method="lifo")
+    assert trades(client, user) == [(100, 0, 5), (100, 120, 5), (110, 120, 10)]
+    assert remaining(client, user) == [(100, 5)]
+    assert_consistent(db, user.id)
+
+def test_specific_sell_closes_the_named_lot(client, user, db, lots):
+    first, second = lots
+    sell(client, user, 4, 120, 6, method="specific", lot_id=second)
+    assert remaining(client, user) == [(100, 10), (110, 6)]
+    assert fill(client, user, "sell", 1, 120, 7, method="specific").status_code == 400
+    assert fill(client, user, "sell", 11, 120, 7, method="specific", lot_id=first).status_code == 400
+    assert_consistent(db, user.id)
+
+def test_backdated_fills_replay_the_symbol(client, user, db, lots):
+    sell(client, user, 15, 120, 6)
+    # Bought before every other fill: FIFO now closes it first
+    buy(client, user, 5, 90, 1)
+    assert trades(client, user) == [(90, 120, 5), (100, 120, 10), (110, 0, 10)]
+    assert remaining(client, user) == [(110, 10)]
+    assert_consistent(db, user.id)
+
+    # An earlier sell takes the oldest lot, so the later one reaches further
+    sell(client, user, 5, 130, 2)
+    assert trades(client, user) == [(90, 130, 5), (100, 120, 10), (110, 0, 5), (110, 120, 5)]
+    assert_consistent(db, user.id)
+
+    # One that leaves the later sell uncovered is refused and changes nothing
+    response = fill(client, user, "sell", 6, 130, 3)
+    assert response.status_code == 400 and "on 2025-01-06" in response.json()["detail"]
+    assert remaining(client, user) == [(110, 5)]
+
+def test_deleting_a_covering_buy_is_refused(client, user, lots):
+    first, _ = lots
+    sell(client, user, 15, 120, 6)
+    response = client.delete(f"/api/fills/{first}", headers=user.headers)
+    assert response.status_code == 400 and "exceeds the open quantity" in response.json()["detail"]
+    assert remaining(client, user) == [(110, 5)]
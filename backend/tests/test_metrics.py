@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+import metrics
+
+def test_failed_statement_leaves_no_timing_state():
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    stats = metrics.RequestStats({})
+    token = metrics.current_request.set(stats)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+            assert conn.execute(text("SELECT 1")).scalar() == 1
+            assert "query_start" not in conn.info
+    finally:
+        metrics.current_request.reset(token)
+        engine.dispose()
+    assert stats.queries == 1 and stats.db_seconds > 0
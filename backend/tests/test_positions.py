@@ -0,0 +1,66 @@
+from datetime import date
+import pytest
+import models
+import prices
+
+class CountingSource(prices.StaticPriceSource):
+    def __init__(self, quotes):
+        super().__init__(quotes)
+        self.requested = []
+
+    def fetch(self, symbols):
+        self.requested.append(sorted(symbols))
+        return super().fetch(symbols)
+
+@pytest.fixture
+def source():
+    source = CountingSource({"aapl": 200.0, "NVDA": 100.0})
+    prices.set_source(source)
+    yield source
+    prices.set_source(prices.default_source())
+
+def open_trade(client, user, symbol, shares=1.0):
+    response = client.post("/api/trades/", json={
+        "symbol": symbol, "entry_date": "2025-01-02", "entry_price": 150, "shares": shares,
+    }, headers=user.headers)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+def test_symbols_are_stored_upper_case(client, user, source):
+    assert open_trade(client, user, "aapl")["symbol"] == "AAPL"
+    assert open_trade(client, user, " AAPL ", shares=2)["symbol"] == "AAPL"
+    trade = open_trade(client, user, "nvda")
+    updated = client.put(f"/api/trades/{trade['id']}", json={"symbol": "amd"}, headers=user.headers).json()
+    assert updated["symbol"] == "AMD"
+
+    listed = client.get("/api/trades/", params={"symbol": "aapl"}, headers=user.headers).json()
+    assert sorted(t["shares"] for t in listed) == [1.0, 2.0]
+    by_symbol = client.get("/api/stats/by-symbol", headers=user.headers).json()
+    assert sorted(row["symbol"] for row in by_symbol) == ["AAPL", "AMD"]
+
+def test_positions_share_one_quote_per_symbol(client, user, source):
+    open_trade(client, user, "aapl")
+    open_trade(client, user, "AAPL", shares=2)
+    positions = client.get("/api/positions/", headers=user.headers).json()
+    assert [p["price"] for p in positions["positions"]] == [200.0, 200.0]
+    assert positions["market_value"] == 600.0 and positions["unpriced"] == 0
+    assert source.requested == [["AAPL"]]
+
+def test_currency_without_rates_is_left_out_of_the_totals(client, user, db, source):
+    open_trade(client, user, "AAPL")
+    # Rates can be reloaded without a currency that open trades use
+    db.add(models.Trade(user_id=user.id, symbol="NVDA", currency="JPY", entry_date=date(2025, 1, 2),
+                        entry_price=90, shares=1, total_cost=90))
+    db.commit()
+
+    response = client.get("/api/positions/", headers=user.headers)
+    assert response.status_code == 200, response.text
+    positions = response.json()
+    assert [(p["currency"], p["market_value"]) for p in positions["positions"]] == [("USD", 200.0), ("JPY", 100.0)]
+    assert (positions["market_value"], positions["unconverted"]) == (200.0, ["JPY"])
+
+def test_price_cache_is_case_insensitive(source):
+    quotes = prices.price_cache.get_many(["nvda", "NVDA", "msft"])
+    assert quotes["nvda"] == quotes["NVDA"] and quotes["NVDA"].price == 100.0
+    assert quotes["msft"].price is None
+    assert source.requested == [["MSFT", "NVDA"]]
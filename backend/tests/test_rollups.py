@@ -0,0 +1,54 @@
+import pytest
+import models
+import rollups
+
+def create(client, user, **fields):
+    trade = {"symbol": "AAPL", "entry_date": "2025-01-02", "entry_price": 100, "shares": 1, **fields}
+    response = client.post("/api/trades/", json=trade, headers=user.headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+def assert_rollup_matches(db, user_id):
+    db.expire_all()
+    assert rollups.verify_user(db, user_id) == []
+    db.rollback()
+
+def test_rollup_follows_trade_and_deposit_edits(client, user, db):
+    first = create(client, user, exit_date="2025-01-10", exit_price=120)
+    second = create(client, user, exit_date="2025-01-10", exit_price=90)
+    create(client, user, entry_date="2025-01-05")
+    deposit = client.post("/api/deposits/", json={"amount": 500, "deposit_date": "2025-01-03"},
+                          headers=user.headers).json()["id"]
+    assert_rollup_matches(db, user.id)
+
+    # Moved to another day: both the old and the new day change
+    client.put(f"/api/trades/{first}", json={"exit_date": "2025-01-12", "exit_price": 130}, headers=user.headers)
+    assert_rollup_matches(db, user.id)
+    # Reopened: its exit day loses it
+    client.put(f"/api/trades/{second}", json={"exit_date": None, "exit_price": None}, headers=user.headers)
+    assert_rollup_matches(db, user.id)
+    client.delete(f"/api/deposits/{deposit}", headers=user.headers)
+    response = client.post("/api/trades/batch", json={"operations": [
+        {"op": "create", "trade": {"symbol": "NVDA", "entry_date": "2025-01-02", "entry_price": 50,
+                                   "shares": 2, "exit_date": "2025-01-10", "exit_price": 40}},
+        {"op": "delete", "id": first},
+    ]}, headers=user.headers)
+    assert response.status_code == 200, response.text
+    assert_rollup_matches(db, user.id)
+
+    days = {row.date.isoformat(): row.realized_pl for row in db.query(models.DailyPnl).filter(
+        models.DailyPnl.user_id == user.id)}
+    db.rollback()
+    assert days == {"2025-01-10": pytest.approx(-20)}
+
+    curve = client.get("/api/analytics/equity-curve", headers=user.headers).json()
+    assert [(p["date"], p["cumulative_pl"]) for p in curve["points"]] == [("2025-01-10", pytest.approx(-20))]
+
+def test_verify_reports_a_drifted_day(client, user, db):
+    create(client, user, exit_date="2025-01-10", exit_price=120)
+    db.query(models.DailyPnl).filter(models.DailyPnl.user_id == user.id).update({"realized_pl": 0})
+    drifted = rollups.verify_user(db, user.id)
+    rollups.rebuild_user(db, user.id)
+    repaired = rollups.verify_user(db, user.id)
+    db.rollback()
+    assert [day.isoformat() for day in drifted] == ["2025-01-10"] and repaired == []
@@ -0,0 +1,157 @@
+import sqlite3
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+import models
+import rollups
+import schema
+import search
+import stats
+
+def describe(path) -> dict:
+    """Columns (sorted, ALTER TABLE appends them) and index DDL of a SQLite file"""
+    conn = sqlite3.connect(path)
+    described = {}
+    tables = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'trade_search%' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    for (name,) in tables:
+        described[name] = sorted(tuple(row[1:]) for row in conn.execute(f"PRAGMA table_info({name})"))
+    for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"):
+        described[f"index {name}"] = " ".join(sql.replace("IF NOT EXISTS ", "").split())
+    conn.close()
+    return described
+
+def models_schema(tmp_path) -> dict:
+    path = tmp_path / "models.db"
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+    return describe(path)
+
+def test_fresh_database_matches_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert schema.prepare(engine) == [m.version for m in schema.MIGRATIONS]
+    assert schema.prepare(engine) == []
+    engine.dispose()
+    assert describe(tmp_path / "fresh.db") == models_schema(tmp_path)
+
+def test_pre_versioning_database_is_upgraded_in_place(tmp_path):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    for statement in schema.BASELINE_SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO users (email, hashed_password) VALUES ('old@example.com', 'x')")
+    conn.executemany(
+        "INSERT INTO trades (user_id, symbol, entry_date, exit_date, entry_price, exit_price, shares, total_cost, profit_loss, notes)"
+        " VALUES (1, ?, '2024-01-02', ?, 10, ?, 5, 50, ?, ?)",
+        [("NVDA", "2024-02-01", 12, 10, "breakout"), ("AMD", "2024-03-01", 9, -5, None), ("AMD", None, None, None, None)],
+    )
+    conn.execute("INSERT INTO deposits (user_id, amount, deposit_date) VALUES (1, 1000, '2024-01-01')")
+    conn.commit()
+    conn.close()
+
+    engine = create_engine(f"sqlite:///{path}")
+    assert schema.prepare(engine) == [m.version for m in schema.MIGRATIONS]
+    assert describe(path) == models_schema(tmp_path)
+
+    with Session(engine) as db:
+        # Aggregates are built lazily on first use and match a full rebuild
+        summary = stats.summary(stats.get_user_stats(db, 1))
+        db.commit()
+        assert summary["total_pl"] == 5 and summary["total_trades"] == 3 and summary["total_deposited"] == 1000
+        assert db.get(models.User, 1).base_currency == "USD"
+        assert stats.summary(stats.rebuild_user_stats(db, 1)) == summary
+        assert [row[0] for row in search.search_trades(db, 1, "break")] == [1]
+    engine.dispose()
+
+def test_replaying_migrations_is_idempotent(tmp_path):
+    path = tmp_path / "replay.db"
+    engine = create_engine(f"sqlite:///{path}")
+    schema.prepare(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA user_version = 0")
+    assert schema.migrate(engine) == [m.version for m in schema.MIGRATIONS]
+    engine.dispose()
+    assert describe(path) == models_schema(tmp_path)
+
+def test_mixed_case_symbols_are_merged(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'symbols.db'}")
+    schema.prepare(engine)
+    with Session(engine) as db:
+        db.add(models.User(id=1, email="case@example.com", hashed_password="x"))
+        db.flush()
+        for symbol, pl in (("aapl", 10.0), ("AAPL", -4.0)):
+            db.add(models.Trade(user_id=1, symbol=symbol, entry_date=date(2024, 1, 2), exit_date=date(2024, 2, 1),
+                                entry_price=10, exit_price=11, shares=1, total_cost=10, profit_loss=pl))
+        db.flush()
+        stats.get_user_stats(db, 1)
+        db.commit()
+        assert db.query(models.SymbolStats).count() == 2
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA user_version = 12")
+    assert schema.prepare(engine)[0] == 13
+
+    with Session(engine) as db:
+        assert {symbol for (symbol,) in db.query(models.Trade.symbol)} == {"AAPL"}
+        stats.get_user_stats(db, 1)
+        db.commit()
+        (row,) = db.query(models.SymbolStats).all()
+        assert (row.symbol, row.trade_count, row.total_pl) == ("AAPL", 2, 6.0)
+        assert db.get(models.DataVersion, 1).trades >= 1
+    engine.dispose()
+
+def test_rollup_is_backfilled_for_existing_aggregates(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollup.db'}")
+    schema.prepare(engine)
+    with Session(engine) as db:
+        db.add(models.User(id=1, email="rollup@example.com", hashed_password="x"))
+        db.flush()
+        db.add(models.Trade(user_id=1, symbol="NVDA", entry_date=date(2024, 1, 2), exit_date=date(2024, 2, 1),
+                            entry_price=10, exit_price=12, shares=5, total_cost=50, profit_loss=10))
+        db.add(models.Deposit(user_id=1, amount=1000, deposit_date=date(2024, 1, 1)))
+        db.flush()
+        stats.get_user_stats(db, 1)
+        db.commit()
+
+    # Aggregates built before the rollup existed
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM daily_pnl")
+        conn.exec_driver_sql("PRAGMA user_version = 4")
+    assert schema.prepare(engine)[0] == 5
+
+    with Session(engine) as db:
+        assert db.get(models.UserStats, 1) is None
+        assert stats.get_user_stats(db, 1).total_pl == 10
+        db.commit()
+        assert db.query(models.DailyPnl).count() == 2
+        assert rollups.verify_user(db, 1) == []
+    engine.dispose()
+
+def test_symbol_stats_are_built_for_existing_aggregates(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'symbols.db'}")
+    schema.prepare(engine)
+    with Session(engine) as db:
+        db.add(models.User(id=1, email="symbols@example.com", hashed_password="x"))
+        db.flush()
+        for symbol, pl in (("NVDA", 10.0), ("AMD", -5.0), ("AMD", 2.0)):
+            db.add(models.Trade(user_id=1, symbol=symbol, entry_date=date(2024, 1, 2), exit_date=date(2024, 2, 1),
+                                entry_price=10, exit_price=11, shares=1, total_cost=10, profit_loss=pl))
+        db.flush()
+        stats.get_user_stats(db, 1)
+        db.commit()
+
+    # Aggregates built before symbol_stats existed
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE symbol_stats")
+        conn.exec_driver_sql("PRAGMA user_version = 9")
+    assert schema.prepare(engine)[0] == 10
+
+    with Session(engine) as db:
+        assert db.get(models.UserStats, 1) is None
+        stats.get_user_stats(db, 1)
+        db.commit()
+        rows = db.query(models.SymbolStats).order_by(models.SymbolStats.symbol).all()
+        assert [(row.symbol, row.trade_count, row.total_pl) for row in rows] == [("AMD", 2, -3.0), ("NVDA", 1, 10.0)]
+    engine.dispose()
@@ -0,0 +1,65 @@
+import sqlite3
+from datetime import date
+import pytest
+from sqlalchemy import select
+import models
+import schema
+from database import ShardPool, ShardedSession, create_db_engine
+
+def scalar(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchone()[0]
+    finally:
+        conn.close()
+
+def count(path, table) -> int:
+    return scalar(path, f"SELECT count(*) FROM {table}")
+
+def test_shard_names():
+    assert ShardPool("user", "shards").path(7).endswith("user-7.db")
+    assert ShardPool("4", "shards").shard_name(7) == "shard-003"
+    for mode in ("0", "users", "-2"):
+        with pytest.raises(ValueError):
+            ShardPool(mode, "shards")
+
+def test_session_routes_user_data_to_the_shard(tmp_path):
+    main_path = tmp_path / "main.db"
+    main = create_db_engine(f"sqlite:///{main_path}")
+    schema.prepare(main)
+    pool = ShardPool("2", str(tmp_path / "shards"))
+
+    db = ShardedSession(bind=main)
+    # Before routing (login, registration) everything is in the main database
+    user = models.User(email="shard@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    db.info["shard"] = pool.engine(user.id)
+    db.add(models.Trade(user_id=user.id, symbol="AAPL", entry_date=date(2025, 1, 2), entry_price=10, shares=1))
+    db.add(models.FxRate(currency="EUR", date=date(2025, 1, 1), rate=1.1))
+    db.commit()
+    # Joins within a shard, and directory tables from the main database, on the same session
+    assert db.execute(select(models.Trade.symbol)).scalars().all() == ["AAPL"]
+    assert db.get(models.User, user.id).email == "shard@example.com"
+    db.close()
+
+    shard_path = pool.path(user.id)
+    assert pool.existing() == [shard_path]
+    assert (count(main_path, "trades"), count(shard_path, "trades")) == (0, 1)
+    assert (count(main_path, "users"), count(main_path, "fx_rates")) == (1, 1)
+    # Shards are migrated when first opened
+    assert scalar(shard_path, "PRAGMA user_version") == schema.SCHEMA_VERSION
+    pool.dispose()
+    main.dispose()
+
+def test_least_recently_used_shard_engine_is_evicted(tmp_path):
+    pool = ShardPool("user", str(tmp_path), max_engines=2)
+    first, second = pool.engine(1), pool.engine(2)
+    assert pool.engine(1) is first  # Now the most recent
+    pool.engine(3)
+    assert pool.open_engines == 2
+    assert pool.engine(1) is first and pool.engine(2) is not second
+    assert len(pool.existing()) == 3
+    pool.dispose()
+    assert pool.open_engines == 0
@@ -0,0 +1,27 @@
+import snapshots
+
+def close_trade(client, user, symbol, exit_price):
+    response = client.post("/api/trades/", json={
+        "symbol": symbol, "entry_date": "2025-01-02", "exit_date": "2025-01-10",
+        "entry_price": 100, "exit_price": exit_price, "shares": 1,
+    }, headers=user.headers)
+    assert response.status_code == 201, response.text
+
+def test_snapshot_matches_the_version_it_is_stamped_with(client, user, db, monkeypatch):
+    close_trade(client, user, "AAPL", 110)
+    real_build = snapshots.build
+
+    def build_after_a_write(db, user_id):
+        # Committed by another request after this snapshot read its version
+        close_trade(client, user, "NVDA", 90)
+        return real_build(db, user_id)
+
+    monkeypatch.setattr(snapshots, "build", build_after_a_write)
+    stale = snapshots.get(db, user.id)
+    assert [stale.symbols[code] for code in stale["symbol"]] == ["AAPL"]
+    db.commit()
+
+    monkeypatch.setattr(snapshots, "build", real_build)
+    current = snapshots.get(db, user.id)
+    assert current.version > stale.version
+    assert sorted(current.symbols[code] for code in current["symbol"]) == ["AAPL", "NVDA"]
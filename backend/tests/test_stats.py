@@ -0,0 +1,72 @@
+import pytest
+import models
+import stats
+
+USER_COLUMNS = stats.TRADE_COLUMNS + ("total_deposited", "deposit_count")
+SYMBOL_COLUMNS = stats.TRADE_COLUMNS + stats.HOLDING_COLUMNS
+
+def aggregates(db, user_id) -> tuple:
+    totals = db.get(models.UserStats, user_id)
+    # Emptied symbol rows are kept (by-symbol skips them), a rebuild drops them
+    by_symbol = {
+        row.symbol: {col: getattr(row, col) for col in SYMBOL_COLUMNS}
+        for row in db.query(models.SymbolStats).filter(
+            models.SymbolStats.user_id == user_id, models.SymbolStats.trade_count > 0
+        )
+    }
+    return {col: getattr(totals, col) for col in USER_COLUMNS}, by_symbol
+
+def assert_matches_rebuild(db, user_id):
+    """The delta-maintained rows equal a rebuild from the raw tables (rolled back)"""
+    db.expire_all()
+    kept_user, kept_symbols = aggregates(db, user_id)
+    stats.rebuild_user_stats(db, user_id)
+    db.expire_all()
+    rebuilt_user, rebuilt_symbols = aggregates(db, user_id)
+    db.rollback()
+    assert kept_user == pytest.approx(rebuilt_user)
+    assert kept_symbols.keys() == rebuilt_symbols.keys()
+    for symbol, values in rebuilt_symbols.items():
+        assert kept_symbols[symbol] == pytest.approx(values), symbol
+
+def create(client, user, **fields):
+    trade = {"symbol": "AAPL", "entry_date": "2025-01-02", "entry_price": 100, "shares": 10, **fields}
+    response = client.post("/api/trades/", json=trade, headers=user.headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+def test_summary_deltas_match_rebuild(client, user, db):
+    assert client.get("/api/stats/summary", headers=user.headers).json()["total_trades"] == 0
+    win = create(client, user, exit_date="2025-01-10", exit_price=120, brokerage_fee=5)
+    loss = create(client, user, symbol="NVDA", exit_date="2025-01-20", exit_price=90)
+    create(client, user, symbol="MSFT")
+    deposit = client.post("/api/deposits/", json={"amount": 5000, "deposit_date": "2025-01-01"}, headers=user.headers)
+    assert deposit.status_code == 201, deposit.text
+    assert_matches_rebuild(db, user.id)
+
+    summary = client.get("/api/stats/summary", headers=user.headers).json()
+    assert (summary["total_trades"], summary["open_trades"], summary["wins"], summary["losses"]) == (3, 1, 1, 1)
+    assert summary["total_pl"] == pytest.approx(195 - 100)
+    assert summary["account_value"] == pytest.approx(5095)
+
+    # A loss turned into a win under another symbol, then a winner deleted
+    response = client.put(f"/api/trades/{loss}", json={"symbol": "AMD", "exit_price": 95, "entry_price": 80},
+                          headers=user.headers)
+    assert response.status_code == 200, response.text
+    assert_matches_rebuild(db, user.id)
+    assert client.delete(f"/api/trades/{win}", headers=user.headers).status_code == 204
+    assert_matches_rebuild(db, user.id)
+
+    summary = client.get("/api/stats/summary", headers=user.headers).json()
+    assert (summary["total_trades"], summary["wins"], summary["losses"]) == (2, 1, 0)
+    assert summary["total_pl"] == pytest.approx(150)
+    by_symbol = client.get("/api/stats/by-symbol", headers=user.headers).json()
+    assert sorted(row["symbol"] for row in by_symbol) == ["AMD", "MSFT"]
+
+def test_reopening_a_trade_moves_it_back_to_open(client, user, db):
+    trade = create(client, user, exit_date="2025-01-10", exit_price=80)
+    response = client.put(f"/api/trades/{trade}", json={"exit_date": None, "exit_price": None}, headers=user.headers)
+    assert response.status_code == 200, response.text
+    assert_matches_rebuild(db, user.id)
+    summary = client.get("/api/stats/summary", headers=user.headers).json()
+    assert (summary["open_trades"], summary["closed_trades"], summary["total_pl"]) == (1, 0, 0)
@@ -0,0 +1,54 @@
+import pytest
+
+def create(client, user, **fields):
+    trade = {"symbol": "AAPL", "entry_date": "2025-01-02", "entry_price": 100, "shares": 1, **fields}
+    response = client.post("/api/trades/", json=trade, headers=user.headers)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+def pages(client, user, limit, **params):
+    """Every page of the listing, following X-Next-Cursor"""
+    collected, cursor = [], None
+    while True:
+        query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/trades/", params=query, headers=user.headers)
+        assert response.status_code == 200, response.text
+        collected.append([trade["id"] for trade in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return collected
+
+@pytest.fixture
+def trades(client, user):
+    """Trades with exit prices that repeat or are NULL (open), in creation (id) order"""
+    exits = [110, None, 90, 110, None, 120, 90]
+    return [
+        create(client, user, exit_date="2025-01-10" if exit_price else None, exit_price=exit_price)
+        for exit_price in exits
+    ]
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_keyset_pages_keep_null_sort_keys_last(client, user, trades, order):
+    closed = sorted((t for t in trades if t["exit_price"] is not None),
+                    key=lambda t: (t["exit_price"], t["id"]), reverse=order == "desc")
+    open_ = sorted((t for t in trades if t["exit_price"] is None), key=lambda t: t["id"], reverse=order == "desc")
+    expected = [t["id"] for t in closed + open_]
+
+    for limit in (1, 2, 3):
+        collected = pages(client, user, limit, sort_by="exit_price", order=order)
+        assert [trade_id for page in collected for trade_id in page] == expected
+        assert all(len(page) == limit for page in collected[:-1])
+
+def test_pages_respect_filters(client, user, trades):
+    create(client, user, symbol="NVDA", exit_date="2025-01-10", exit_price=100)
+    collected = pages(client, user, 2, sort_by="exit_price", status="closed", symbol="aapl")
+    ids = [trade_id for page in collected for trade_id in page]
+    assert sorted(ids) == sorted(t["id"] for t in trades if t["exit_price"] is not None)
+
+def test_cursor_must_match_its_sort(client, user, trades):
+    response = client.get("/api/trades/", params={"limit": 2, "sort_by": "exit_price"}, headers=user.headers)
+    cursor = response.headers["X-Next-Cursor"]
+    mismatched = client.get("/api/trades/", params={"limit": 2, "cursor": cursor}, headers=user.headers)
+    assert mismatched.status_code == 400
+    garbage = client.get("/api/trades/", params={"cursor": "not-a-cursor"}, headers=user.headers)
+    assert garbage.status_code == 400
@@ -9,6 +9,7 @@ function TradeForm({ trade, onTradeAdded, onClose }) {
         entry_price: '',
         exit_price: '',
         shares: '',
+        stop_price: '',
         brokerage_fee: '',
         notes: ''
     });
@@ -24,6 +25,7 @@ function TradeForm({ trade, onTradeAdded, onClose }) {
                 entry_price: trade.entry_price || '',
                 exit_price: trade.exit_price || '',
                 shares: trade.shares || '',
+                stop_price: trade.stop_price || '',
                 brokerage_fee: trade.brokerage_fee || '',
                 notes: trade.notes || ''
             });
@@ -50,6 +52,7 @@ function TradeForm({ trade, onTradeAdded, onClose }) {
                 entry_price: parseFloat(formData.entry_price),
                 exit_price: formData.exit_price ? parseFloat(formData.exit_price) : null,
                 shares: parseFloat(formData.shares),
+                stop_price: formData.stop_price ? parseFloat(formData.stop_price) : null,
                 brokerage_fee: formData.brokerage_fee ? parseFloat(formData.brokerage_fee) : null,
                 notes: formData.notes || null
             };
@@ -169,6 +172,19 @@ function TradeForm({ trade, onTradeAdded, onClose }) {
                             />
                         </div>
 
+                        <div>
+                            <label className="block text-gray-300 mb-2">Stop Price</label>
+                            <input
+                                type="number"
+                                name="stop_price"
+                                value={formData.stop_price}
+                                onChange={handleChange}
+                                step="0.01"
+                                placeholder="145.00"
+                                className="w-full px-4 py-2 bg-gray-700 text-white rounded border border-gray-600 focus:border-blue-500 focus:outline-none"
+                            />
+                        </div>
+
                         <div>
                             <label className="block text-gray-300 mb-2">Brokerage Fee</label>
                             <input
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getTrades, getCurrentUser, getDeposits } from '../services/api';
+import { getCurrentUser, getStatsSummary, getSymbolAnalytics, getRiskMetrics } from '../services/api';
 import Navbar from '../components/Navbar';
 
 /**
@@ -9,8 +9,9 @@ import Navbar from '../components/Navbar';
  */
 function Analytics() {
     const [user, setUser] = useState(null);
-    const [trades, setTrades] = useState([]);
-    const [deposits, setDeposits] = useState([]);
+    const [summary, setSummary] = useState(null);
+    const [symbolStats, setSymbolStats] = useState({ symbols: [], best: [], worst: [] });
+    const [risk, setRisk] = useState(null);
     const [loading, setLoading] = useState(true);
     const navigate = useNavigate();
 
@@ -20,17 +21,20 @@ function Analytics() {
 
     /**
      * Fetch all data from API
+     * Per-ticker stats, best/worst trades and risk metrics come precomputed from the server
      */
     const loadData = async () => {
         try {
-            const [userRes, tradesRes, depositsRes] = await Promise.all([
+            const [userRes, summaryRes, symbolsRes, riskRes] = await Promise.all([
                 getCurrentUser(),
-                getTrades(),
-                getDeposits()
+                getStatsSummary(),
+                getSymbolAnalytics(5),
+                getRiskMetrics()
             ]);
             setUser(userRes.data);
-            setTrades(tradesRes.data);
-            setDeposits(depositsRes.data);
+            setSummary(summaryRes.data);
+            setSymbolStats(symbolsRes.data);
+            setRisk(riskRes.data);
         } catch (err) {
             console.error('Failed to load data:', err);
             if (err.response?.status === 401) {
@@ -42,71 +46,6 @@ function Analytics() {
         }
     };
 
-    /**
-     * Calculate P&L breakdown by ticker symbol
-     */
-    const calculatePLByTicker = () => {
-        const plByTicker = {};
-
-        trades.forEach(trade => {
-            if (trade.profit_loss !== null) {
-                if (!plByTicker[trade.symbol]) {
-                    plByTicker[trade.symbol] = {
-                        symbol: trade.symbol,
-                        totalPL: 0,
-                        tradeCount: 0,
-                        wins: 0,
-                        losses: 0
-                    };
-                }
-
-                plByTicker[trade.symbol].totalPL += trade.profit_loss;
-                plByTicker[trade.symbol].tradeCount += 1;
-
-                if (trade.profit_loss > 0) {
-                    plByTicker[trade.symbol].wins += 1;
-                } else {
-                    plByTicker[trade.symbol].losses += 1;
-                }
-            }
-        });
-
-        return Object.values(plByTicker).sort((a, b) => b.totalPL - a.totalPL);
-    };
-
-    /**
-     * Find best and worst trades
-     */
-    const getBestWorstTrades = () => {
-        const closedTrades = trades.filter(t => t.profit_loss !== null);
-
-        const sorted = [...closedTrades].sort((a, b) => b.profit_loss - a.profit_loss);
-
-        return {
-            best: sorted.slice(0, 5),
-            worst: sorted.slice(-5).reverse()
-        };
-    };
-
-    /**
-     * Calculate average win/loss
-     */
-    const calculateAvgWinLoss = () => {
-        const closedTrades = trades.filter(t => t.profit_loss !== null);
-        const wins = closedTrades.filter(t => t.profit_loss > 0);
-        const losses = closedTrades.filter(t => t.profit_loss < 0);
-
-        const avgWin = wins.length > 0
-            ? wins.reduce((sum, t) => sum + t.profit_loss, 0) / wins.length
-            : 0;
-
-        const avgLoss = losses.length > 0
-            ? losses.reduce((sum, t) => sum + t.profit_loss, 0) / losses.length
-            : 0;
-
-        return { avgWin, avgLoss };
-    };
-
     if (loading) {
         return (
             <div className="min-h-screen bg-gray-900 flex items-center justify-center">
@@ -115,10 +54,21 @@ function Analytics() {
         );
     }
 
-    const plByTicker = calculatePLByTicker();
-    const { best, worst } = getBestWorstTrades();
-    const { avgWin, avgLoss } = calculateAvgWinLoss();
-    const closedTrades = trades.filter(t => t.profit_loss !== null);
+    const plByTicker = symbolStats.symbols.filter(ticker => ticker.closed_trades > 0);
+    const { best, worst } = symbolStats;
+    const avgWin = summary?.avg_win ?? 0;
+    const avgLoss = summary?.avg_loss ?? 0;
+    const ratio = (value) => (value === null || value === undefined ? 'N/A' : value.toFixed(2));
+    const riskCards = risk ? [
+        { label: 'Expectancy', value: `$${risk.expectancy.toFixed(2)}`, hint: 'per trade' },
+        { label: 'Profit Factor', value: ratio(risk.profit_factor) },
+        { label: 'Avg R', value: risk.r_multiples.expectancy === null ? 'N/A' : `${risk.r_multiples.expectancy.toFixed(2)}R`, hint: `${risk.r_multiples.trades} trades with a stop` },
+        { label: 'Sharpe', value: ratio(risk.sharpe), hint: 'annualized' },
+        { label: 'Sortino', value: ratio(risk.sortino), hint: 'annualized' },
+        { label: 'Longest Win Streak', value: risk.longest_win_streak },
+        { label: 'Longest Loss Streak', value: risk.longest_loss_streak },
+        { label: 'Median Hold', value: risk.holding.median === null ? 'N/A' : `${risk.holding.median.toFixed(0)}d` },
+    ] : [];
 
     return (
         <div className="min-h-screen bg-gray-900">
@@ -153,6 +103,46 @@ function Analytics() {
                     </div>
                 </div>
 
+                {/* Risk & Reward */}
+                {risk && risk.trades > 0 && (
+                    <div className="bg-gray-800 rounded-lg p-6 mb-8">
+                        <h3 className="text-2xl font-bold text-white mb-6">Risk & Reward</h3>
+                        <div className="grid grid-cols-2 md:grid-cols-4 gap-6 mb-6">
+                            {riskCards.map(card => (
+                                <div key={card.label}>
+                                    <h4 className="text-gray-400 text-sm mb-1">{card.label}</h4>
+                                    <p className="text-2xl font-bold text-white">{card.value}</p>
+                                    {card.hint && <p className="text-gray-500 text-xs">{card.hint}</p>}
+                                </div>
+                            ))}
+                        </div>
+                        <div className="overflow-x-auto">
+                            <table className="w-full">
+                                <thead>
+                                    <tr className="text-left text-gray-400 border-b border-gray-700">
+                                        <th className="pb-3 font-semibold">Holding Period</th>
+                                        <th className="pb-3 font-semibold">Trades</th>
+                                        <th className="pb-3 font-semibold">Win Rate</th>
+                                        <th className="pb-3 font-semibold">Avg P&L</th>
+                                    </tr>
+                                </thead>
+                                <tbody>
+                                    {risk.holding.buckets.filter(bucket => bucket.trades > 0).map((bucket) => (
+                                        <tr key={bucket.label} className="border-b border-gray-700 text-white hover:bg-gray-750 transition">
+                                            <td className="py-3 font-semibold">{bucket.label}</td>
+                                            <td className="py-3 text-gray-300">{bucket.trades}</td>
+                                            <td className="py-3 text-gray-300">{bucket.win_rate.toFixed(1)}%</td>
+                                            <td className={`py-3 font-bold ${bucket.avg_pl >= 0 ? 'text-green-500' : 'text-red-500'}`}>
+                                                ${bucket.avg_pl.toFixed(2)}
+                                            </td>
+                                        </tr>
+                                    ))}
+                                </tbody>
+                            </table>
+                        </div>
+                    </div>
+                )}
+
                 {/* P&L by Ticker */}
                 <div className="bg-gray-800 rounded-lg p-6 mb-8">
                     <h3 className="text-2xl font-bold text-white mb-6">P&L by Ticker</h3>
@@ -170,24 +160,25 @@ function Analytics() {
                                         <th className="pb-3 font-semibold">Wins</th>
                                         <th className="pb-3 font-semibold">Losses</th>
                                         <th className="pb-3 font-semibold">Win Rate</th>
+                                        <th className="pb-3 font-semibold">Avg Hold</th>
                                     </tr>
                                 </thead>
                                 <tbody>
-                                    {plByTicker.map((ticker) => {
-                                        const winRate = (ticker.wins / ticker.tradeCount) * 100;
-                                        return (
-                                            <tr key={ticker.symbol} className="border-b border-gray-700 text-white hover:bg-gray-750 transition">
-                                                <td className="py-3 font-semibold">{ticker.symbol}</td>
-                                                <td className={`py-3 font-bold ${ticker.totalPL >= 0 ? 'text-green-500' : 'text-red-500'}`}>
-                                                    ${ticker.totalPL.toFixed(2)}
-                                                </td>
-                                                <td className="py-3 text-gray-300">{ticker.tradeCount}</td>
-                                                <td className="py-3 text-green-400">{ticker.wins}</td>
-                                                <td className="py-3 text-red-400">{ticker.losses}</td>
-                                                <td className="py-3 text-gray-300">{winRate.toFixed(1)}%</td>
-                                            </tr>
-                                        );
-                                    })}
+                                    {plByTicker.map((ticker) => (
+                                        <tr key={ticker.symbol} className="border-b border-gray-700 text-white hover:bg-gray-750 transition">
+                                            <td className="py-3 font-semibold">{ticker.symbol}</td>
+                                            <td className={`py-3 font-bold ${ticker.total_pl >= 0 ? 'text-green-500' : 'text-red-500'}`}>
+                                                ${ticker.total_pl.toFixed(2)}
+                                            </td>
+                                            <td className="py-3 text-gray-300">{ticker.closed_trades}</td>
+                                            <td className="py-3 text-green-400">{ticker.wins}</td>
+                                            <td className="py-3 text-red-400">{ticker.losses}</td>
+                                            <td className="py-3 text-gray-300">{ticker.win_rate.toFixed(1)}%</td>
+                                            <td className="py-3 text-gray-300">
+                                                {ticker.avg_holding_days !== null ? `${ticker.avg_holding_days.toFixed(1)}d` : '-'}
+                                            </td>
+                                        </tr>
+                                    ))}
                                 </tbody>
                             </table>
                         </div>
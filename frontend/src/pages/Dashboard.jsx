@@ -1,6 +1,6 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getTrades, getCurrentUser, deleteTrade, getDeposits, deleteDeposit } from '../services/api';
+import { getAllTrades, getCurrentUser, deleteTrade, getDeposits, deleteDeposit, getPositions, subscribeEvents } from '../services/api';
 import Navbar from '../components/Navbar';
 import StatCard from '../components/StatCard';
 import TradeTable from '../components/TradeTable';
@@ -15,29 +15,98 @@ function Dashboard() {
     const [user, setUser] = useState(null);
     const [trades, setTrades] = useState([]);
     const [deposits, setDeposits] = useState([]);
+    const [positions, setPositions] = useState(null);
     const [loading, setLoading] = useState(true);
     const [showTradeForm, setShowTradeForm] = useState(false);
     const [showDepositForm, setShowDepositForm] = useState(false);
     const [editingTrade, setEditingTrade] = useState(null);
+    const events = useRef(null);
     const navigate = useNavigate();
 
     useEffect(() => {
         loadData();
+        // Apply pushed changes instead of refetching everything after each edit
+        events.current = subscribeEvents(applyEvent, loadData);
+        return () => events.current.close();
     }, []);
 
+    /**
+     * Whether the event stream is connected (changes arrive through it)
+     */
+    const isLive = () => events.current?.readyState === EventSource.OPEN;
+
+    const loadPositions = async () => {
+        try {
+            const res = await getPositions();
+            setPositions(res.data);
+        } catch (err) {
+            console.error('Failed to load positions:', err);
+        }
+    };
+
+    /**
+     * Merge a server event into local state
+     */
+    const applyEvent = (type, data) => {
+        const upsert = (items, item) => [item, ...items.filter(i => i.id !== item.id)];
+        const applyBatch = (items, batch) => {
+            const removed = new Set(batch.deleted);
+            const changed = new Map([...batch.created, ...batch.updated].map(item => [item.id, item]));
+            const kept = items
+                .filter(item => !removed.has(item.id))
+                .map(item => changed.get(item.id) || item);
+            const known = new Set(kept.map(item => item.id));
+            return [...batch.created.filter(item => !known.has(item.id)), ...kept];
+        };
+
+        switch (type) {
+            case 'trade.created':
+                setTrades(prev => upsert(prev, data));
+                break;
+            case 'trade.updated':
+                setTrades(prev => prev.map(t => (t.id === data.id ? data : t)));
+                break;
+            case 'trade.deleted':
+                setTrades(prev => prev.filter(t => t.id !== data.id));
+                break;
+            case 'trades.batch':
+                setTrades(prev => applyBatch(prev, data));
+                break;
+            case 'deposit.created':
+                setDeposits(prev => upsert(prev, data));
+                return;
+            case 'deposit.deleted':
+                setDeposits(prev => prev.filter(d => d.id !== data.id));
+                return;
+            case 'deposits.batch':
+                setDeposits(prev => applyBatch(prev, data));
+                return;
+            case 'trades.changed':
+            case 'resync':
+                loadData();
+                return;
+            default:
+                // 'summary': the dashboard derives its metrics from the lists
+                return;
+        }
+        loadPositions();
+    };
+
     /**
      * Fetch all data from API
      */
     const loadData = async () => {
         try {
-            const [userRes, tradesRes, depositsRes] = await Promise.all([
+            const [userRes, tradesRes, depositsRes, positionsRes] = await Promise.all([
                 getCurrentUser(),
-                getTrades(),
-                getDeposits()
+                getAllTrades(),
+                getDeposits(),
+                getPositions()
             ]);
             setUser(userRes.data);
             setTrades(tradesRes.data);
             setDeposits(depositsRes.data);
+            setPositions(positionsRes.data);
         } catch (err) {
             console.error('Failed to load data:', err);
             if (err.response?.status === 401) {
@@ -73,7 +142,7 @@ function Dashboard() {
 
         try {
             await deleteTrade(tradeId);
-            await loadData();
+            if (!isLive()) await loadData();
         } catch (err) {
             console.error('Failed to delete trade:', err);
             alert('Failed to delete trade');
@@ -88,7 +157,7 @@ function Dashboard() {
 
         try {
             await deleteDeposit(depositId);
-            await loadData();
+            if (!isLive()) await loadData();
         } catch (err) {
             console.error('Failed to delete deposit:', err);
             alert('Failed to delete deposit');
@@ -104,16 +173,17 @@ function Dashboard() {
     };
 
     /**
-     * Reload data after adding/editing trade or deposit
+     * Reload data after adding/editing trade or deposit, unless the event stream delivers it
      */
     const handleDataAdded = async () => {
-        await loadData();
+        if (!isLive()) await loadData();
     };
 
     // Calculate metrics
     const totalPL = trades.reduce((sum, t) => sum + (t.profit_loss || 0), 0);
     const totalDeposited = deposits.reduce((sum, d) => sum + d.amount, 0);
-    const accountValue = totalDeposited + totalPL;
+    const unrealizedPL = positions ? positions.unrealized_pl : 0;
+    const accountValue = totalDeposited + totalPL + unrealizedPL;
     const roi = totalDeposited > 0 ? (totalPL / totalDeposited) * 100 : 0;
 
     const closedTrades = trades.filter(t => t.profit_loss !== null);
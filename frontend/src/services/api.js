@@ -29,8 +29,25 @@ export const login = (username, password) => {
 
 export const getCurrentUser = () => api.get('/auth/me');
 
+export const updateCurrentUser = (data) => api.patch('/auth/me', data);
+
 // Trades
-export const getTrades = () => api.get('/trades/');
+export const getTrades = (params = {}) => api.get('/trades/', { params });
+
+/**
+ * Fetch every trade by following the X-Next-Cursor header page by page
+ * Resolves with the same { data } shape as a single request
+ */
+export const getAllTrades = async (params = {}) => {
+  const trades = [];
+  let cursor;
+  do {
+    const res = await getTrades({ ...params, limit: 1000, cursor });
+    trades.push(...res.data);
+    cursor = res.headers['x-next-cursor'];
+  } while (cursor);
+  return { data: trades };
+};
 
 export const createTrade = (tradeData) => api.post('/trades/', tradeData);
 
@@ -38,6 +55,36 @@ export const updateTrade = (id, tradeData) => api.put(`/trades/${id}`, tradeData
 
 export const deleteTrade = (id) => api.delete(`/trades/${id}`);
 
+// operations: [{ op: 'create', trade }, { op: 'update', id, trade }, { op: 'delete', id }]
+export const batchTrades = (operations) => api.post('/trades/batch', { operations });
+
+export const importTrades = (file) => {
+  const formData = new FormData();
+  formData.append('file', file);
+  return api.post('/trades/import', formData);
+};
+
+export const exportTrades = (params = {}) =>
+  api.get('/trades/export', { params, responseType: 'blob' });
+
+// Background jobs: start returns { id, status, done, total }, poll getJob until it finishes
+export const startImportJob = (file) => {
+  const formData = new FormData();
+  formData.append('file', file);
+  return api.post('/jobs/import', formData);
+};
+
+export const startRecalculateJob = (brokerageFee = null) =>
+  api.post('/jobs/recalculate', { brokerage_fee: brokerageFee });
+
+export const startExportJob = (params = {}) => api.post('/jobs/export', null, { params });
+
+export const getJob = (id) => api.get(`/jobs/${id}`);
+
+export const cancelJob = (id) => api.delete(`/jobs/${id}`);
+
+export const downloadJob = (id) => api.get(`/jobs/${id}/download`, { responseType: 'blob' });
+
 // Deposits
 export const getDeposits = () => api.get('/deposits/');
 
@@ -45,4 +92,55 @@ export const createDeposit = (depositData) => api.post('/deposits/', depositData
 
 export const deleteDeposit = (id) => api.delete(`/deposits/${id}`);
 
+export const batchDeposits = (operations) => api.post('/deposits/batch', { operations });
+
+// Stats
+export const getStatsSummary = () => api.get('/stats/summary');
+
+export const getStatsBySymbol = () => api.get('/stats/by-symbol');
+
+// Open positions marked to market
+export const getPositions = () => api.get('/positions/');
+
+// Live updates (Server-Sent Events)
+const EVENT_TYPES = [
+  'trade.created', 'trade.updated', 'trade.deleted', 'trades.batch', 'trades.changed',
+  'deposit.created', 'deposit.deleted', 'deposits.batch', 'summary', 'resync',
+];
+
+/**
+ * Subscribe to the current user's change events
+ * EventSource cannot send headers, so the token goes in the query string.
+ * onReconnect runs when the stream comes back after a drop (events may have
+ * been missed). Returns the EventSource; call close() to unsubscribe.
+ */
+export const subscribeEvents = (onEvent, onReconnect) => {
+  const source = new EventSource(`${API_URL}/events/?token=${encodeURIComponent(getToken())}`);
+  let dropped = false;
+  source.onerror = () => {
+    dropped = true;
+  };
+  source.onopen = () => {
+    if (dropped && onReconnect) onReconnect();
+    dropped = false;
+  };
+  EVENT_TYPES.forEach((type) =>
+    source.addEventListener(type, (event) => onEvent(type, JSON.parse(event.data)))
+  );
+  return source;
+};
+
+// Analytics
+export const getEquityCurve = (interval = 'day') =>
+  api.get('/analytics/equity-curve', { params: { interval } });
+
+export const getBreakdown = (period = 'month') =>
+  api.get('/analytics/breakdown', { params: { period } });
+
+export const getSymbolAnalytics = (top = 5) =>
+  api.get('/analytics/symbols', { params: { top } });
+
+export const getRiskMetrics = (params = {}) =>
+  api.get('/analytics/risk', { params });
+
 export default api;
\ No newline at end of file